@@ -7,6 +7,7 @@ from src.database import DatabaseManager
 from src.ingestion import SensorSimulator, MqttMock
 from src.processor import DataProcessor
 from src.assistant import SmartAssistant
+from src.datalake import PYARROW_AVAILABLE
 
 # Configuration
 NUM_DEVICES = 3
@@ -31,7 +32,7 @@ def main():
     
     # 2. Configurar Dispositivos e Sensores
     devices = []
-    mqtt = MqttMock()
+    mqtt = MqttMock(tick_interval=SIMULATION_SPEED)
     sensors = [] # Keep track for scenario updates
     
     for i in range(NUM_DEVICES):
@@ -55,7 +56,7 @@ def main():
     assistant = SmartAssistant(db, kpi_calc)
     
     # Inicializar Sistema de Alertas
-    alert_manager = AlertManager(db, predictor)
+    alert_manager = AlertManager(db, predictor, state=processor)
     notification_service = NotificationService()
     dashboard_capture = DashboardCapture()
     
@@ -81,6 +82,7 @@ def main():
     try:
         tick = 0
         scenario_timer = 0
+        lake_buffer = []
         
         for packet in mqtt.listen():
             tick += 1
@@ -143,14 +145,21 @@ def main():
                  response_pred = assistant.ask(f"predict {query_target}")
                  print(f"[ASSISTENTE] << {response_pred}\n")
 
-            # Simular salvamento em lote no Data Lake a cada ~20 ticks
+            # Salvamento em lote no Data Lake a cada ~20 ticks
+            lake_buffer.append(packet)
             if tick % 20 == 0:
-                 print("[SISTEMA] Agregando dados ao Data Lake (CSV Histórico)...")
-                 # Lógica para pegar buffer recente iria aqui
-                 pass
+                 print(f"[SISTEMA] Agregando {len(lake_buffer)} leituras ao Data Lake (Parquet)...")
+                 db.save_historical(lake_buffer, "sensor_history")
+                 lake_buffer = []
+
+            # Compactar arquivos pequenos do Data Lake periodicamente
+            if tick % 1000 == 0 and PYARROW_AVAILABLE:
+                 db.get_datalake("sensor_history").compact()
 
     except KeyboardInterrupt:
         print("Parando Simulação...")
+    finally:
+        db.close()
 
 if __name__ == "__main__":
     main()
@@ -23,9 +23,13 @@ class AlertManager:
     - Tendências anormais
     """
     
-    def __init__(self, db_manager, analytics):
+    def __init__(self, db_manager, analytics, clock=datetime.now, state=None):
         self.db = db_manager
         self.analytics = analytics
+        self.clock = clock  # Relógio do cooldown/timestamps (o replay usa o horário das leituras)
+        # DataProcessor cujas janelas e escores por dispositivo alimentam a avaliação
+        # (sem leituras do banco); None = consulta as leituras recentes e roda o modelo
+        self.state = state
         
         # Thresholds configuráveis via env vars
         self.PRE_ALERT_THRESHOLD = float(os.getenv('PRE_ALERT_THRESHOLD', '0.60'))
@@ -44,21 +48,28 @@ class AlertManager:
         Returns:
             (AlertLevel, alert_data): Nível de alerta e dados do alerta (se houver)
         """
-        # Buscar leituras recentes
-        readings = self.db.get_recent_readings(device_id, limit=20)
-        if readings.empty:
+        # Buscar leituras recentes (colunas NumPy, mais recente primeiro; sem DataFrame)
+        if self.state is not None:
+            readings = self.state.get_window(device_id, 20)
+        else:
+            readings = self.db.get_recent_window(device_id, 20)
+        if len(readings['vibration']) == 0:
             return AlertLevel.NORMAL, None
         
-        # Buscar informações do dispositivo
+        # Buscar informações do dispositivo (registro em memória)
         device_info = self.db.get_device_info(device_id)
         if not device_info:
             return AlertLevel.NORMAL, None
         
-        # 1. Calcular risco via IA
-        risk_score, rul_hours, energy_waste = self.analytics.predict_failure_risk(readings)
+        # 1. Calcular risco via IA (já calculado pelo processador para a leitura mais recente)
+        scores = self.state.get_scores(device_id) if self.state is not None else None
+        if scores is not None:
+            risk_score, rul_hours, energy_waste = scores
+        else:
+            risk_score, rul_hours, energy_waste = self.analytics.predict_failure_risk(readings)
         
         # 2. Calcular proximidade aos limites operacionais
-        last_reading = readings.iloc[0]  # Mais recente (ORDER BY DESC)
+        last_reading = {name: values[0] for name, values in readings.items()}  # Mais recente (ORDER BY DESC)
         temp_limit = device_info.get('operational_limit_temp', 100)
         vib_limit = device_info.get('operational_limit_vibration', 10)
         
@@ -102,7 +113,7 @@ class AlertManager:
                 'device_id': device_id,
                 'device_name': device_info.get('name', device_id),
                 'alert_level': alert_level.value,
-                'timestamp': datetime.now().isoformat(),
+                'timestamp': self.clock().isoformat(),
                 'risk_score': risk_score,
                 'temperature': float(last_reading['temperature']),
                 'vibration': float(last_reading['vibration']),
@@ -120,7 +131,7 @@ class AlertManager:
             # Atualizar rastreamento
             self.active_alerts[device_id] = {
                 'level': alert_level,
-                'timestamp': datetime.now()
+                'timestamp': self.clock()
             }
             
             return alert_level, alert_data
@@ -134,14 +145,14 @@ class AlertManager:
         Returns:
             'increasing_abnormal', 'decreasing', 'stable'
         """
-        if len(readings) < 5:
+        if len(readings['vibration']) < 5:
             return 'stable'
         
         # Analisar últimas 5 leituras (ordem DESC, então invertemos)
-        recent = readings.head(5)[::-1]
+        recent = {name: values[:5][::-1] for name, values in readings.items()}
         
         # Verificar tendência de vibração (mais crítico)
-        vib_values = recent['vibration'].values
+        vib_values = recent['vibration']
         
         # Calcular diferenças consecutivas
         diffs = [vib_values[i+1] - vib_values[i] for i in range(len(vib_values)-1)]
@@ -152,7 +163,7 @@ class AlertManager:
             return 'increasing_abnormal'
         
         # Verificar tendência de temperatura
-        temp_values = recent['temperature'].values
+        temp_values = recent['temperature']
         temp_diffs = [temp_values[i+1] - temp_values[i] for i in range(len(temp_values)-1)]
         positive_temp_diffs = [d for d in temp_diffs if d > 1.0]
         
@@ -169,7 +180,7 @@ class AlertManager:
             return False
         
         last_alert = self.active_alerts[device_id]
-        time_since_alert = datetime.now() - last_alert['timestamp']
+        time_since_alert = self.clock() - last_alert['timestamp']
         
         # Se o nível aumentou (PRE_ALERT -> CRITICAL), sempre permitir
         if alert_level == AlertLevel.CRITICAL and last_alert['level'] == AlertLevel.PRE_ALERT:
@@ -1,83 +1,46 @@
 import pandas as pd
+import numpy as np
 import random
 import joblib
 import os
 
 class KpiCalculator:
+    """
+    OEE / MTBF / MTTR a partir dos acumuladores incrementais (src/kpi.py), sem ler leituras.
+    start/end (ISO, datetime ou epoch ms) escolhem a janela; o padrão são as últimas
+    KPI_WINDOW_HOURS até a leitura mais recente do dispositivo.
+    """
     def __init__(self, db_manager):
         self.db = db_manager
 
-    def calculate_oee(self, device_id):
+    def calculate_kpis(self, device_id, start=None, end=None):
+        """Every KPI plus the raw counters of the window (see DatabaseManager.get_kpis)."""
+        return self.db.get_kpis(device_id, start, end)
+
+    def calculate_oee(self, device_id, start=None, end=None):
         """
         Simplistic OEE calculation:
-        Availability = (Total Time - Downtime) / Total Time
-        Performance = (Actual Output / Target Output) -- Simulated here
-        Quality = (Good Parts / Total Parts) -- Simulated here
+        Availability = Running readings / Total readings
+        Performance = 1 - avg vibration / 10 -- Simulated here
+        Quality = 98% if avg vibration < 5 else 85% -- Simulated here
         """
-        # Get last 100 readings
-        df = self.db.get_recent_readings(device_id, limit=100)
-        if df.empty:
-            return 0, 0, 0, 0
-        
-        total_points = len(df)
-        running_points = len(df[df['status'] == 'running'])
-        
-        availability = running_points / total_points if total_points > 0 else 0
-        
-        # Simulate performance/quality based on sensor health (e.g., lower vibration = higher quality)
-        avg_vib = df['vibration'].mean()
-        performance = max(0, 1 - (avg_vib / 10)) # Arbitrary formula
-        quality = 0.98 if avg_vib < 5 else 0.85
-
-        oee = availability * performance * quality
-        return round(oee * 100, 2), round(availability * 100, 2), round(performance * 100, 2), round(quality * 100, 2)
-
-    def calculate_mtbf(self, device_id):
+        k = self.db.get_kpis(device_id, start, end)
+        return k['oee'], k['availability'], k['performance'], k['quality']
+
+    def calculate_mtbf(self, device_id, start=None, end=None):
         """
-        Mean Time Between Failures = (Total Uptime) / (Number of Breakdowns)
+        Mean Time Between Failures = (Total Uptime) / (Number of Breakdowns), in minutes.
+        Uptime is the time between readings while running; a breakdown is a running -> parado transition.
+        Without breakdowns, returns the total uptime (theoretical infinity).
         """
-        df = self.db.get_recent_readings(device_id, limit=1000) # Need more history
-        if df.empty: return 0
-        
-        # Simple estimation: Count transitions from running to stopped
-        # limiting to what we have in the window
-        failures = 0
-        uptime_minutes = 0
-        
-        # Sort by time
-        df = df.sort_values('timestamp')
-        
-        # Calculate uptime (approximate based on rows * interval or actual timestamps)
-        # Assuming 1 row = 1 unit of time if simulated, or diff timestamps
-        uptime_minutes = len(df[df['status'] == 'running']) # driven by simulation tick ~ 1s/1min?
-        
-        # Detect state changes 'running' -> 'parado'
-        df['prev_status'] = df['status'].shift(1)
-        failures = len(df[(df['status'] == 'parado') & (df['prev_status'] == 'running')])
-        
-        if failures == 0:
-            return uptime_minutes # Theoretical infinity, return total time
-            
-        return round(uptime_minutes / failures, 1)
+        return self.db.get_kpis(device_id, start, end)['mtbf']
 
-    def calculate_mttr(self, device_id):
+    def calculate_mttr(self, device_id, start=None, end=None):
         """
-        Mean Time To Repair = (Total Downtime) / (Number of Repairs)
+        Mean Time To Repair = (Total Downtime) / (Number of Repairs), in minutes.
+        A repair is a parado -> running transition.
         """
-        df = self.db.get_recent_readings(device_id, limit=1000)
-        if df.empty: return 0
-        
-        downtime_minutes = len(df[df['status'] == 'parado'])
-        
-        # Repairs = transitions from parado -> running
-        df = df.sort_values('timestamp')
-        df['prev_status'] = df['status'].shift(1)
-        repairs = len(df[(df['status'] == 'running') & (df['prev_status'] == 'parado')])
-        
-        if repairs == 0:
-            return 0 
-            
-        return round(downtime_minutes / repairs, 1)
+        return self.db.get_kpis(device_id, start, end)['mttr']
 
 class FailurePredictor:
     def __init__(self, model_path="modelo_falha.pkl"):
@@ -91,20 +54,32 @@ class FailurePredictor:
         else:
             print(f"⚠️ Modelo {model_path} não encontrado. Usando mock.")
 
+    @staticmethod
+    def _column(readings, name):
+        """Column as a NumPy array from a DataFrame, NumPy structured array or dict of columns."""
+        return np.asarray(readings[name])
+
+    @staticmethod
+    def _has_column(readings, name):
+        names = getattr(getattr(readings, 'dtype', None), 'names', None)
+        return name in names if names is not None else name in readings
+
     def predict_failure_risk(self, readings_df):
         """
         Uses the loaded Random Forest model to predict failure risk.
         Expected features: ['temperatura', 'vibracao']
+        Accepts a DataFrame, a NumPy structured array or a dict of column arrays
+        (oldest first: the last row is treated as the current reading).
         """
-        if readings_df.empty:
+        vib_history = self._column(readings_df, 'vibration')
+        if len(vib_history) == 0:
             return 0.0, 0, 0
             
         # Prepare input features
         try:
-            last_reading = readings_df.iloc[-1:] 
             X_input = pd.DataFrame({
-                'temperatura': last_reading['temperature'].values,
-                'vibracao': last_reading['vibration'].values
+                'temperatura': self._column(readings_df, 'temperature')[-1:],
+                'vibracao': vib_history[-1:]
             })
 
             risk = 0.0
@@ -124,10 +99,8 @@ class FailurePredictor:
             # 1. RUL (Remaining Useful Life) Estimation
             # Simple assumption: Failure happens at Vibration > 10.0
             # We calculate the slope (rate of change) of the last few points
-            vib_history = readings_df['vibration'].values
             if len(vib_history) > 3:
                 # Linear regression on last 5 points to find trend
-                import numpy as np
                 y = vib_history[-5:]
                 x = np.arange(len(y))
                 slope, intercept = np.polyfit(x, y, 1)
@@ -146,8 +119,8 @@ class FailurePredictor:
             # 2. Energy Waste
             # Need 'power' column. If not present (old mock), assume 0
             energy_waste = 0.0
-            if 'power' in readings_df.columns:
-                current_power = readings_df.iloc[-1]['power']
+            if self._has_column(readings_df, 'power'):
+                current_power = self._column(readings_df, 'power')[-1]
                 # Baseline for optimal machine is ~500-600W
                 if current_power > 600:
                     energy_waste = current_power - 600
@@ -157,3 +130,69 @@ class FailurePredictor:
         except Exception as e:
             print(f"Erro na predição: {e}")
             return 0.0, 0, 0
+
+    @staticmethod
+    def estimate_rul_batch(vib_history):
+        """
+        RUL for many windows at once: same linear trend as predict_failure_risk (last 5 points),
+        vectorized. vib_history: (n, k) vibrations, oldest first, NaN-padded on the left for
+        shorter windows. Windows with 3 points or fewer are considered stable (999).
+        """
+        y = np.asarray(vib_history, dtype=np.float64)
+        valid = ~np.isnan(y)
+        count = valid.sum(axis=1)
+        x = np.cumsum(valid, axis=1) - 1  # Posição entre os pontos válidos
+        n = np.maximum(count, 1)
+        x_mean = (count - 1) / 2
+        y_mean = np.where(valid, y, 0.0).sum(axis=1) / n
+        dx = np.where(valid, x - x_mean[:, None], 0.0)
+        dy = np.where(valid, y - y_mean[:, None], 0.0)
+        sxx = (dx * dx).sum(axis=1)
+        slope = np.divide((dx * dy).sum(axis=1), sxx, out=np.zeros(len(y)), where=sxx > 0)
+
+        limit_vib = 10.0
+        current_vib = y[:, -1]
+        trending = (count > 3) & (slope > 0.01)
+        remaining_steps = np.divide(limit_vib - current_vib, slope, out=np.zeros(len(y)), where=trending)
+        return np.where(trending, np.maximum(0, remaining_steps * 0.1), 999.0)
+
+    def predict_batch(self, temperature, vibration, power=None):
+        """
+        Current-reading scores for many packets with a single model call.
+        Same results as predict_failure_risk on a one-row window (no trend, so RUL = 999).
+        If the model rejects the batch, rows with missing temperature/vibration get the
+        per-packet error result (0, 0, 0) and the rest are scored again.
+        Returns (risk, rul, waste) float arrays.
+        """
+        temperature = np.asarray(temperature, dtype=np.float64)
+        vibration = np.asarray(vibration, dtype=np.float64)
+        n = len(temperature)
+        risk = np.zeros(n)
+        rul = np.full(n, 999.0)
+        waste = np.zeros(n)
+        if power is not None:
+            power = np.asarray(power, dtype=np.float64)
+            waste = np.where(power > 600, power - 600, 0.0)  # NaN (sem medição) -> 0
+        if n == 0:
+            return risk, rul, waste
+
+        if not self.model:
+            # Fallback Mock
+            risk = np.minimum(0.5 * (temperature > 90) + 0.4 * (vibration > 5), 1.0)
+            return risk, rul, waste
+
+        try:
+            X_input = pd.DataFrame({'temperatura': temperature, 'vibracao': vibration})
+            risk = self.model.predict_proba(X_input)[:, 1]
+        except Exception:
+            valid = np.isfinite(temperature) & np.isfinite(vibration)
+            rul[~valid] = 0
+            waste[~valid] = 0
+            try:
+                if valid.any():
+                    X_input = pd.DataFrame({'temperatura': temperature[valid], 'vibracao': vibration[valid]})
+                    risk[valid] = self.model.predict_proba(X_input)[:, 1]
+            except Exception as e:
+                print(f"Erro na predição em lote: {e}")
+                return np.zeros(n), np.zeros(n), np.zeros(n)
+        return risk, rul, waste
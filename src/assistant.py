@@ -77,20 +77,21 @@ class SmartAssistant:
                 prefix = f"📜 [HISTÓRICO {target_date}]"
                 if readings.empty:
                     return f"⚠️ Não encontrei registros para {device_id} em {target_date}. Verifique a data."
+                readings = readings.to_dict('records')
             else:
-                # Current Status
-                readings = self.db.get_recent_readings(device_id, limit=1)
+                # Current Status (lista de dicts, sem DataFrame)
+                readings = self.db.get_recent_readings(device_id, limit=1, result='dicts')
                 prefix = "🟢 [AGORA]"
 
             info = self.db.get_device_info(device_id)
             if not info:
                  return f"Dispositivo {device_id} não encontrado."
             
-            if readings.empty:
+            if not readings:
                 return f"Sem dados recentes para {device_id}."
 
-            current_status = readings.iloc[0]['status']
-            temp = readings.iloc[0]['temperature']
+            current_status = readings[0]['status']
+            temp = readings[0]['temperature']
             
             # Simple status line as requested, without complicating it
             return f"{prefix} {info['name']} ({device_id}): {current_status}. Temperatura: {temp:.1f}°C."
@@ -103,8 +104,8 @@ class SmartAssistant:
             device_id = self._extract_device_id(query, parts)
             if not device_id: return "Informe o ID para previsão (ex: predict DEV-100)."
 
-            readings = self.db.get_recent_readings(device_id, limit=5)
-            if readings.empty: return "Dados insuficientes para gerar previsão."
+            readings = self.db.get_recent_window(device_id, 5)
+            if len(readings['vibration']) == 0: return "Dados insuficientes para gerar previsão."
 
             risk, rul, waste = self.predictor.predict_failure_risk(readings)
             risk_pct = risk * 100
@@ -142,10 +143,10 @@ class SmartAssistant:
             device_id = self._extract_device_id(query, parts)
             if not device_id: return "Qual dispositivo você quer que eu analise? (ex: explicar DEV-100)"
             
-            readings = self.db.get_recent_readings(device_id, limit=1)
-            if readings.empty: return f"Sem dados para explicar a situação de {device_id}."
+            readings = self.db.get_recent_readings(device_id, limit=1, result='dicts')
+            if not readings: return f"Sem dados para explicar a situação de {device_id}."
             
-            last = readings.iloc[0]
+            last = readings[0]
             reasons = []
             if last['temperature'] > 80: reasons.append(f"Temperatura alta ({last['temperature']}°C)")
             if last['vibration'] > 4: reasons.append(f"Vibração excessiva ({last['vibration']}mm/s)")
@@ -0,0 +1,154 @@
+"""
+Async Database - Camada de Acesso Assíncrona (asyncio)
+Espelha a API do DatabaseManager com métodos awaitable. As leituras rodam num pool de
+threads (cada thread tem sua conexão SQLite; o WAL permite leitores em paralelo) e todas
+as escritas passam por um único writer serializado, evitando disputa pelo lock do SQLite.
+"""
+
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+import numpy as np
+
+from src.database import DatabaseManager
+
+
+class AsyncDatabaseManager:
+    """
+    Fachada assíncrona sobre um DatabaseManager.
+
+    Uso:
+        async with AsyncDatabaseManager() as db:
+            await db.queue_reading(packet)
+            df = await db.get_recent_readings("DEV-100", limit=20)
+    """
+
+    def __init__(self, db_path=None, history_path="history_data", read_workers: Optional[int] = None,
+                 db_manager: Optional[DatabaseManager] = None):
+        # Aceita um DatabaseManager já aberto (ex: compartilhado com código síncrono)
+        self.db = db_manager if db_manager is not None else DatabaseManager(db_path, history_path)
+        self._owns_db = db_manager is None
+
+        if read_workers is None:
+            read_workers = int(os.getenv("DB_READ_WORKERS", "4"))
+        # Leitores nunca gravam: o flush de read-your-writes passa pelo writer (_flushed_read)
+        self._reader = ThreadPoolExecutor(max_workers=read_workers, thread_name_prefix="db-read",
+                                          initializer=self.db.defer_read_flush)
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-write")
+        # Os flushes por prazo do write buffer também passam pelo writer único
+        self.db.write_buffer.executor = self._writer
+        self._closed = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def _read(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._reader, functools.partial(fn, *args, **kwargs))
+
+    async def _write(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._writer, functools.partial(fn, *args, **kwargs))
+
+    async def _flushed_read(self, fn, *args, **kwargs):
+        """Read that must see buffered readings: flush on the writer first, then read on the pool."""
+        if len(self.db.write_buffer):
+            await self._write(self.db.flush_readings)
+        return await self._read(fn, *args, **kwargs)
+
+    async def close(self):
+        """Drain pending writes, flush buffered readings and close the connections."""
+        if self._closed:
+            return
+        self._closed = True
+        loop = asyncio.get_running_loop()
+        # O writer termina a fila antes do close (flush final do write buffer)
+        await loop.run_in_executor(None, self._writer.shutdown, True)
+        await loop.run_in_executor(None, self._reader.shutdown, True)
+        if self.db.write_buffer.executor is self._writer:
+            self.db.write_buffer.executor = None
+        if self._owns_db:
+            await loop.run_in_executor(None, self.db.close)
+        else:
+            await loop.run_in_executor(None, self.db.flush_readings)
+
+    # --- Escritas (writer único) ---
+
+    async def register_device(self, device_id, name, dtype, limits):
+        return await self._write(self.db.register_device, device_id, name, dtype, limits)
+
+    async def save_reading(self, reading):
+        return await self._write(self.db.save_reading, reading)
+
+    async def save_readings_batch(self, readings):
+        return await self._write(self.db.save_readings_batch, readings)
+
+    async def queue_reading(self, reading):
+        return await self._write(self.db.queue_reading, reading)
+
+    async def queue_readings(self, readings):
+        return await self._write(self.db.queue_readings, readings)
+
+    async def flush_readings(self):
+        return await self._write(self.db.flush_readings)
+
+    async def flush_kpis(self):
+        return await self._write(self.db.flush_kpis)
+
+    async def log_event(self, device_id, event_type, description):
+        return await self._write(self.db.log_event, device_id, event_type, description)
+
+    async def log_events(self, events):
+        return await self._write(self.db.log_events, events)
+
+    async def save_historical(self, data_batch, filename):
+        return await self._write(self.db.save_historical, data_batch, filename)
+
+    async def create_user(self, username, password_hash, salt, role='user'):
+        return await self._write(self.db.create_user, username, password_hash, salt, role)
+
+    async def save_alert(self, alert_data: dict, report_text: str, image_path: str = None,
+                         notification_sent: bool = False):
+        return await self._write(self.db.save_alert, alert_data, report_text, image_path, notification_sent)
+
+    async def resolve_alert(self, alert_id: int, resolved_by: str = "system"):
+        return await self._write(self.db.resolve_alert, alert_id, resolved_by)
+
+    # --- Leituras (pool de leitores) ---
+    # Consultas de leituras fazem flush do write buffer antes (read-your-writes), sempre
+    # no writer: as threads leitoras só leem.
+
+    async def get_device_info(self, device_id):
+        return await self._read(self.db.get_device_info, device_id)
+
+    async def get_recent_readings(self, device_id, limit=100, result='dataframe'):
+        return await self._flushed_read(self.db.get_recent_readings, device_id, limit, result)
+
+    async def get_recent_window(self, device_id, limit=100) -> Dict[str, np.ndarray]:
+        # O cache já devolve cópias feitas sob o lock, seguras contra as escritas do writer
+        return await self._flushed_read(self.db.get_recent_window, device_id, limit)
+
+    async def get_readings_window(self, device_id, target_time_str, window_minutes=30, result='dataframe'):
+        return await self._flushed_read(self.db.get_readings_window, device_id, target_time_str, window_minutes, result)
+
+    async def get_rollups(self, device_id, start, end, resolution='1m', result='dataframe'):
+        return await self._flushed_read(self.db.get_rollups, device_id, start, end, resolution, result)
+
+    async def get_kpis(self, device_id, start=None, end=None):
+        # Os KPIs já contam as leituras enfileiradas (deltas em memória): não precisa de flush
+        return await self._read(self.db.get_kpis, device_id, start, end)
+
+    async def get_user_by_username(self, username):
+        return await self._read(self.db.get_user_by_username, username)
+
+    async def get_alert_history(self, device_id: str = None, limit: int = 20, result: str = 'dataframe'):
+        return await self._read(self.db.get_alert_history, device_id, limit, result)
+
+    async def get_active_alerts(self, device_id: str = None, result: str = 'dataframe'):
+        return await self._read(self.db.get_active_alerts, device_id, result)
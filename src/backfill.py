@@ -0,0 +1,242 @@
+"""
+Backfill - Importação em Massa de Histórico
+Carrega exportações de historian (CSV), o Data Lake (history_data, CSV ou Parquet) e a
+tabela sensor_leituras do banco legado (smart-factory-legacy) nas partições de leituras.
+
+Para vazão máxima:
+- lê a origem em blocos (chunks), sem montar dicts por leitura;
+- remove o índice (device_id, ts) das partições tocadas e recria uma vez no final;
+- grava cada bloco numa única transação grande, com synchronous=OFF durante a carga;
+- recalcula os rollups e os buckets de KPI no final, num GROUP BY por partição sobre as linhas novas.
+
+Uso:
+    python -m src.backfill history_data/sensor_history.csv
+    python -m src.backfill smart-factory-legacy/smart_factory.db --source legacy
+    python -m src.backfill history_data/sensor_history --source parquet --chunk-size 200000
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import time
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+from src import kpi, rollups
+from src.database import DatabaseManager
+from src.datalake import PYARROW_AVAILABLE
+from src.partitions import to_epoch_ms
+
+if PYARROW_AVAILABLE:
+    from src.datalake import DataLakeReader
+
+DEFAULT_CHUNK_SIZE = 100_000
+
+# Status do sistema legado -> status atual ('parado' é o mesmo nos dois)
+LEGACY_STATUS = {'rodando': 'running'}
+
+# Tupla no formato de DatabaseManager._reading_params
+Row = Tuple[int, str, Optional[float], Optional[float], Optional[float], str, float, float]
+
+
+def _column(df, name, default=None):
+    """Column as a Python list with NaN -> default (None for missing sensors)."""
+    if name not in df.columns:
+        return [default] * len(df)
+    col = df[name]
+    if default is not None:
+        return col.fillna(default).tolist()
+    return col.astype(object).where(col.notna(), None).tolist()
+
+
+def iter_csv(path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[List[Row]]:
+    """Stream a CSV with the packet columns (device_id, timestamp or ts, temperature, ...)."""
+    for df in pd.read_csv(path, chunksize=chunk_size):
+        if 'ts' in df.columns and df['ts'].notna().all():
+            ts = df['ts'].astype('int64').tolist()
+        else:
+            ts = [to_epoch_ms(t) for t in df['timestamp']]
+        cols = [_column(df, c) for c in ('device_id', 'temperature', 'vibration', 'pressure', 'status')]
+        cols += [_column(df, 'risk_score', 0.0), _column(df, 'power', 0.0)]
+        yield list(zip(ts, *cols))
+
+
+def iter_parquet(path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[List[Row]]:
+    """Stream a Data Lake directory written by DataLakeWriter (see src/datalake.py)."""
+    if not PYARROW_AVAILABLE:
+        raise RuntimeError("Importar Parquet requer pyarrow")
+    columns = ['ts', 'device_id', 'temperature', 'vibration', 'pressure', 'status', 'risk_score', 'power']
+    dataset = DataLakeReader(path).dataset()
+    for batch in dataset.to_batches(columns=columns, batch_size=chunk_size):
+        cols = batch.to_pydict()
+        yield [
+            (ts, dev, temp, vib, pres, stat, risk or 0.0, power or 0.0)
+            for ts, dev, temp, vib, pres, stat, risk, power in zip(*(cols[c] for c in columns))
+        ]
+
+
+def iter_legacy(path: str, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                device_prefix: str = "SENSOR-") -> Iterator[List[Row]]:
+    """
+    Stream sensor_leituras from a legacy SQLite database.
+    sensor_id vira device_id (com prefixo) e 'rodando' vira 'running'.
+    """
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        cursor = conn.execute(
+            "SELECT sensor_id, timestamp, temperatura, vibracao, status FROM sensor_leituras ORDER BY id"
+        )
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield [
+                (to_epoch_ms(ts), f"{device_prefix}{sensor_id}", temp, vib, None,
+                 LEGACY_STATUS.get(status, status), 0.0, 0.0)
+                for sensor_id, ts, temp, vib, status in rows
+            ]
+    finally:
+        conn.close()
+
+
+def detect_source(path: str) -> str:
+    if os.path.isdir(path):
+        return 'parquet'
+    if path.lower().endswith('.csv'):
+        return 'csv'
+    return 'legacy'
+
+
+class BulkLoader:
+    """
+    Grava blocos de leituras direto nas partições, com índices adiados.
+    Rode com a simulação parada: as partições tocadas ficam sem índice até finish().
+    """
+
+    def __init__(self, db: DatabaseManager, report_every: int = 1_000_000):
+        self.db = db
+        self.report_every = report_every
+        self.rows = 0
+        self.expired = 0  # Linhas mais antigas que a retenção (não gravadas)
+        self.started = None
+        self._deferred = {}  # partição com o índice removido -> último id antes da carga
+        self._next_report = report_every
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.finish()
+
+    def start(self):
+        self.started = time.perf_counter()
+        self.db.flush_readings()
+        # Durabilidade por transação é desnecessária numa carga que pode ser repetida
+        self.db._connect().execute("PRAGMA synchronous=OFF")
+
+    def load(self, chunks: Iterable[List[Row]]) -> int:
+        for rows in chunks:
+            self.write_chunk(rows)
+        return self.rows
+
+    def write_chunk(self, rows: List[Row]):
+        if not rows:
+            return
+        # Partições são resolvidas (e criadas) fora da transação do bloco
+        by_table = {}
+        loaded = 0
+        for row in rows:
+            table = self.db.partitions.table_for(row[0])
+            if table is None:
+                self.expired += 1  # A retenção apagaria a partição
+                continue
+            by_table.setdefault(table, []).append(row)
+            loaded += 1
+
+        conn = self.db._connect()
+        for table in by_table:
+            if table not in self._deferred:
+                conn.execute(f"DROP INDEX IF EXISTS idx_{table}_device_ts")
+                self._deferred[table] = conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}").fetchone()[0]
+
+        with conn:
+            for table, table_rows in by_table.items():
+                conn.executemany(self.db._INSERT_READING_SQL.format(table=table), table_rows)
+
+        self.rows += loaded
+        if self.rows >= self._next_report:
+            self._next_report += self.report_every
+            print(f"  {self.rows:,} leituras ({self.rate():,.0f} leituras/s)")
+
+    def finish(self):
+        """Roll up the imported rows (rollups + KPI buckets), recreate the deferred indexes and restore the connection settings."""
+        conn = self.db._connect()
+        for table, last_id in sorted(self._deferred.items()):
+            with conn:
+                # Só as linhas novas: os rollups das existentes já foram gravados na escrita
+                source = f"(SELECT * FROM {table} WHERE id > {last_id})"
+                for rollup_table, bucket_ms in rollups.ROLLUP_RESOLUTIONS.values():
+                    conn.execute(rollups.backfill_sql(rollup_table, bucket_ms, source))
+                conn.execute(kpi.backfill_sql(source, self.db.kpis.max_gap_ms))
+                conn.execute(kpi.state_backfill_sql(source))
+                conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_device_ts ON {table} (device_id, ts)")
+        self._deferred.clear()
+        conn.execute(f"PRAGMA synchronous={self.db.synchronous}")
+        # Leituras antigas podem ter entrado no meio da janela em cache
+        self.db.reading_cache.invalidate()
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started if self.started else 0.0
+
+    def rate(self) -> float:
+        elapsed = self.elapsed()
+        return self.rows / elapsed if elapsed else 0.0
+
+
+def import_paths(db: DatabaseManager, paths: List[str], source: str = 'auto',
+                 chunk_size: int = DEFAULT_CHUNK_SIZE, device_prefix: str = "SENSOR-") -> BulkLoader:
+    """Import every path into db. Returns the loader (rows, elapsed(), rate())."""
+    with BulkLoader(db) as loader:
+        for path in paths:
+            kind = detect_source(path) if source == 'auto' else source
+            print(f"Importando {path} ({kind})...")
+            if kind == 'csv':
+                chunks = iter_csv(path, chunk_size)
+            elif kind == 'parquet':
+                chunks = iter_parquet(path, chunk_size)
+            elif kind == 'legacy':
+                chunks = iter_legacy(path, chunk_size, device_prefix)
+            else:
+                raise ValueError(f"Origem inválida: {kind} (use csv, parquet ou legacy)")
+            loader.load(chunks)
+    return loader
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Importação em massa de leituras históricas.")
+    parser.add_argument('paths', nargs='+', help="Arquivos CSV, diretórios Parquet ou bancos legados")
+    parser.add_argument('--source', choices=['auto', 'csv', 'parquet', 'legacy'], default='auto')
+    parser.add_argument('--db', default=None, help="Banco de destino (padrão: DATABASE_PATH)")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="Leituras por bloco/transação")
+    parser.add_argument('--device-prefix', default="SENSOR-",
+                        help="Prefixo do device_id para sensor_id do banco legado")
+    args = parser.parse_args(argv)
+
+    db = DatabaseManager(args.db)
+    try:
+        loader = import_paths(db, args.paths, args.source, args.chunk_size, args.device_prefix)
+    finally:
+        db.close()
+    print(f"✅ {loader.rows:,} leituras importadas em {loader.elapsed():.1f}s "
+          f"({loader.rate():,.0f} leituras/s)")
+    if loader.expired:
+        print(f"⚠️ {loader.expired:,} leituras ignoradas: mais antigas que READING_RETENTION_DAYS")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
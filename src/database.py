@@ -1,8 +1,20 @@
 import sqlite3
+import threading
+import time
+from collections import deque
+import numpy as np
 import pandas as pd
 import os
 from datetime import datetime, timedelta
 import json
+from contextlib import contextmanager
+from urllib.parse import quote
+from src.migrations import run_migrations
+from src.partitions import ReadingPartitions, DAY_MS, EPOCH_MS_TO_ISO, GRANULARITY_MS, epoch_ms_to_iso, to_epoch_ms
+from src import kpi, rollups
+from src.datalake import DataLakeWriter, PYARROW_AVAILABLE
+from src.reading_cache import RecentReadingsCache
+from src.tsblock import ColdStorage
 
 class DatabaseManager:
     def __init__(self, db_path=None, history_path="history_data"):
@@ -16,173 +28,444 @@ class DatabaseManager:
         if not os.path.exists(self.history_path):
             os.makedirs(self.history_path)
 
-        self._init_relational_db()
-        self._init_timeseries_db()
-        self._upgrade_schema()
+        # Conexões persistentes (uma por thread), configuradas uma única vez
+        self.busy_timeout_ms = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+        self.cache_size_kb = int(os.getenv("DB_CACHE_SIZE_KB", "20000"))
+        self.mmap_size = int(os.getenv("DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+        self.synchronous = os.getenv("DB_SYNCHRONOUS", "NORMAL")
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
 
-    def _init_relational_db(self):
-        """Simulates Supabase (PostgreSQL) for structured data."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Equipment / Devices
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS devices (
-                id TEXT PRIMARY KEY,
-                name TEXT,
-                type TEXT,
-                status TEXT,
-                operational_limit_temp REAL,
-                operational_limit_vibration REAL
-            )
-        ''')
-        
-        # Events / Stops
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS events (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                device_id TEXT,
-                event_type TEXT,
-                timestamp DATETIME,
-                description TEXT
-            )
-        ''')
-
-        # Users / Auth
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE,
-                password_hash TEXT,
-                salt TEXT,
-                role TEXT
-            )
-        ''')
-        conn.commit()
-        conn.close()
+        # Leituras analíticas em conexões somente-leitura separadas (snapshot WAL, query_only)
+        self.read_snapshots = os.getenv("DB_READ_SNAPSHOTS", "1") == "1" and self.db_path != ":memory:"
+        self._read_local = threading.local()
 
-    def _init_timeseries_db(self):
-        """Simulates TimescaleDB/InfluxDB using a separate table or file approach (here SQLite for simplicity)."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS sensor_readings (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp DATETIME,
-                device_id TEXT,
-                temperature REAL,
-                vibration REAL,
-                pressure REAL,
-                status TEXT,
-                risk_score REAL
-            )
-        ''')
-        conn.commit()
-        conn.close()
+        # Schema versionado: DDL roda apenas aqui, nunca no caminho de escrita
+        run_migrations(self._connect())
 
-    def _upgrade_schema(self):
-        """Helper to add columns if table already exists (for this prototype)."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        # Leituras particionadas por tempo (READING_PARTITION=day|week) com retenção por DROP TABLE
+        self.partitions = ReadingPartitions(
+            self._connect,
+            span_ms=GRANULARITY_MS[os.getenv("READING_PARTITION", "day")],
+            retention_days=int(os.getenv("READING_RETENTION_DAYS", "0"))
+        )
+        self.partitions.drop_expired()
+        self.expired_readings = 0  # Leituras descartadas por chegarem já fora da retenção
+
+        # Partições mais antigas que COLD_STORAGE_AFTER_DAYS viram blocos comprimidos (0 = desligado)
+        self.cold_storage = ColdStorage(
+            self._connect, self.partitions,
+            after_days=int(os.getenv("COLD_STORAGE_AFTER_DAYS", "0"))
+        )
+        self.compact_cold_readings()
+        # Processos longos compactam a cada partição nova, depois do commit do lote que a criou
+        self._compaction_due = False
+        self.partitions.on_rollover = self._schedule_compaction
+
+        self._datalakes = {}
+
+        # Cadastro de dispositivos em memória (muda raramente; write-through em register_device)
+        self._devices = {}
+        self._devices_lock = threading.Lock()
+        self._load_devices()
+
+        # Acumuladores de KPI por dispositivo/hora (O(1) por leitura, gravados periodicamente)
+        self.kpis = kpi.KpiAccumulator(
+            flush_interval=float(os.getenv("KPI_FLUSH_SECONDS", "5")),
+            max_gap_ms=int(os.getenv("KPI_MAX_GAP_SECONDS", "300")) * 1000
+        )
+        self.kpis.load_state(self._connect())
+        self.kpi_window_ms = int(float(os.getenv("KPI_WINDOW_HOURS", "24")) * 3_600_000)
+
+        # Ring buffers das últimas N leituras por dispositivo (populados na escrita)
+        self.reading_cache = RecentReadingsCache(int(os.getenv("READING_CACHE_SIZE", "1000")))
+
+        # Buffer de escrita em lote (group commit) para leituras de sensores
+        # Em :memory: cada thread teria seu próprio banco vazio: sem thread de prazo, as
+        # gravações acontecem na thread que enfileira (lote cheio) ou que faz flush
+        self.write_buffer = ReadingWriteBuffer(
+            self,
+            max_size=int(os.getenv("READING_BATCH_SIZE", "500")),
+            max_latency=(float(os.getenv("READING_BATCH_LATENCY_MS", "500")) / 1000
+                         if self.db_path != ":memory:" else None)
+        )
+
+    def _connect(self):
+        """Return this thread's persistent connection, opening it on first use."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout_ms / 1000, check_same_thread=False)
+            self._configure_connection(conn)
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def _connect_reader(self):
+        """
+        Return this thread's read-only connection (separate pool from the writers).
+        Falls back to the regular connection when DB_READ_SNAPSHOTS=0.
+        """
+        if not self.read_snapshots:
+            return self._connect()
+        conn = getattr(self._read_local, 'conn', None)
+        if conn is None:
+            uri = f"file:{quote(os.path.abspath(self.db_path))}?mode=ro"
+            conn = sqlite3.connect(uri, uri=True, timeout=self.busy_timeout_ms / 1000, check_same_thread=False)
+            self._configure_connection(conn, read_only=True)
+            self._read_local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    @contextmanager
+    def _read_snapshot(self):
+        """
+        Read transaction on a read-only connection: every query inside sees the same
+        WAL snapshot (e.g. across partitions) and never takes the write lock, so long
+        reports do not stall ingestion and writer bursts do not stall readers.
+        """
+        conn = self._connect_reader()
+        conn.execute("BEGIN")
         try:
-             cursor.execute("ALTER TABLE sensor_readings ADD COLUMN risk_score REAL")
-             print("Schema atualizado: coluna risk_score adicionada.")
-        except sqlite3.OperationalError:
-             pass # Coluna já existe
-        
-        # Create alerts table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS alerts (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp DATETIME,
-                device_id TEXT,
-                device_name TEXT,
-                alert_level TEXT,
-                risk_score REAL,
-                temperature REAL,
-                vibration REAL,
-                pressure REAL,
-                report_text TEXT,
-                image_path TEXT,
-                notification_sent BOOLEAN DEFAULT 0,
-                resolved BOOLEAN DEFAULT 0,
-                resolved_at DATETIME,
-                resolved_by TEXT
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
+            yield conn
+        finally:
+            conn.rollback()
+
+    def _configure_connection(self, conn, read_only=False):
+        """Apply journal and cache pragmas once per connection."""
+        cursor = conn.cursor()
+        if read_only:
+            cursor.execute("PRAGMA query_only=ON")
+        else:
+            cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA synchronous={self.synchronous}")
+        cursor.execute(f"PRAGMA cache_size=-{self.cache_size_kb}")
+        cursor.execute(f"PRAGMA mmap_size={self.mmap_size}")
+        cursor.execute(f"PRAGMA busy_timeout={self.busy_timeout_ms}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.close()
+
+    def close(self):
+        """Flush buffered readings and close every pooled connection (call on shutdown)."""
+        self.write_buffer.close()
+        self.flush_kpis()
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+        self._local = threading.local()
+        self._read_local = threading.local()
 
     def register_device(self, device_id, name, dtype, limits):
-        conn = sqlite3.connect(self.db_path)
+        device = {
+            'id': device_id,
+            'name': name,
+            'type': dtype,
+            'status': 'active',
+            'operational_limit_temp': float(limits.get('temp', 100)),
+            'operational_limit_vibration': float(limits.get('vib', 10)),
+        }
+        conn = self._connect()
         cursor = conn.cursor()
         cursor.execute('''
             INSERT OR REPLACE INTO devices (id, name, type, status, operational_limit_temp, operational_limit_vibration)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (device_id, name, dtype, 'active', limits.get('temp', 100), limits.get('vib', 10)))
+            VALUES (:id, :name, :type, :status, :operational_limit_temp, :operational_limit_vibration)
+        ''', device)
         conn.commit()
-        conn.close()
+        with self._devices_lock:
+            self._devices[device_id] = device
+
+    def _load_devices(self):
+        """Load the device registry into memory (startup)."""
+        devices = {row['id']: row for row in self._query("SELECT * FROM devices", result='dicts')}
+        with self._devices_lock:
+            self._devices = devices
 
     def save_reading(self, reading):
         """Save real-time sensor data."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Ensure 'power' column exists (simple migration check)
-        try: 
-            cursor.execute("ALTER TABLE sensor_readings ADD COLUMN power REAL DEFAULT 0")
-        except: pass
-        
-        cursor.execute('''
-            INSERT INTO sensor_readings (timestamp, device_id, temperature, vibration, pressure, status, risk_score, power)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            reading['timestamp'], 
-            reading['device_id'], 
-            reading['temperature'], 
-            reading['vibration'], 
+        self.save_readings_batch([reading])
+
+    def save_readings_batch(self, readings):
+        """Save many readings with executemany in a single transaction."""
+        ts = [self._reading_ts(r) for r in readings]
+        self.reading_cache.extend(readings, ts)
+        self._account_kpis(readings, ts)
+        return self._write_readings(readings)
+
+    def _write_readings(self, readings):
+        """Insert into partitions + rollups (the cache was already updated by the caller)."""
+        if not readings:
+            return 0
+        # Partições são resolvidas (e criadas) antes de abrir a transação de escrita
+        by_table = {}
+        expired = 0
+        for reading in readings:
+            params = self._reading_params(reading)
+            table = self.partitions.table_for(params[0])
+            if table is None:
+                expired += 1  # Mais antiga que READING_RETENTION_DAYS: a partição seria apagada
+                continue
+            by_table.setdefault(table, []).append(params)
+        if expired:
+            self.expired_readings += expired
+            print(f"Retenção: {expired} leitura(s) mais antiga(s) que {self.partitions.retention_days} dia(s) descartada(s).")
+
+        conn = self._connect()
+        with conn:
+            for table, rows in by_table.items():
+                conn.executemany(self._INSERT_READING_SQL.format(table=table), rows)
+            self._update_rollups(conn, [row for rows in by_table.values() for row in rows])
+        if self.kpis.due():
+            self.flush_kpis()
+        if self._compaction_due:
+            self._compaction_due = False
+            self.compact_cold_readings()
+        return len(readings) - expired
+
+    def _update_rollups(self, conn, rows):
+        """Merge a batch into the 1m/1h rollups inside the caller's transaction."""
+        for table, bucket_ms in rollups.ROLLUP_RESOLUTIONS.values():
+            conn.executemany(rollups.upsert_sql(table), rollups.accumulate(rows, bucket_ms))
+
+    def get_rollups(self, device_id, start, end, resolution='1m', result='dataframe'):
+        """
+        Aggregated readings per bucket ('1m' or '1h') between start and end
+        (ISO string, datetime or epoch ms). Serves long-range charts without raw rows.
+        """
+        self._flush_before_read()
+        table, _ = rollups.ROLLUP_RESOLUTIONS[resolution]
+        with self._read_snapshot() as conn:
+            return self._query(rollups.select_sql(table), (device_id, to_epoch_ms(start), to_epoch_ms(end)), result, conn)
+
+    def compact_cold_readings(self, now_ms=None):
+        """Move partitions older than COLD_STORAGE_AFTER_DAYS into compressed blocks and apply retention to them."""
+        compacted = self.cold_storage.compact(now_ms)
+        if self.partitions.retention_days:
+            now_ms = now_ms if now_ms is not None else int(time.time() * 1000)
+            self.cold_storage.drop_expired(now_ms - self.partitions.retention_days * DAY_MS)
+        return compacted
+
+    def _schedule_compaction(self):
+        # Não compacta dentro de table_for: o lote em curso pode ter linhas para a partição que sairia
+        self._compaction_due = True
+
+    def queue_reading(self, reading):
+        """Queue a reading for the next group commit (see ReadingWriteBuffer)."""
+        ts = self._reading_ts(reading)
+        self.reading_cache.append(reading, ts)
+        self.kpis.add(reading['device_id'], ts, reading.get('status'), reading.get('vibration'))
+        self.write_buffer.add(reading)
+
+    def queue_readings(self, readings):
+        """Queue many readings at once (one cache and one buffer lock for the whole batch)."""
+        ts = [self._reading_ts(r) for r in readings]
+        self.reading_cache.extend(readings, ts)
+        self._account_kpis(readings, ts)
+        self.write_buffer.add_many(readings)
+
+    def _account_kpis(self, readings, ts):
+        self.kpis.add_many(
+            (r['device_id'], t, r.get('status'), r.get('vibration')) for r, t in zip(readings, ts)
+        )
+
+    def flush_kpis(self):
+        """Persist the pending KPI deltas now. Returns the number of buckets written."""
+        conn = self._connect()
+        with self.kpis.lock:
+            try:
+                with conn:
+                    written = self.kpis.persist(conn)
+            except Exception:
+                self.kpis.restore()  # Rollback: os deltas continuam pendentes para o próximo flush
+                raise
+            self.kpis.committed()
+            return written
+
+    def get_kpis(self, device_id, start=None, end=None):
+        """
+        OEE/availability/performance/quality (%), MTBF/MTTR (minutes) and the raw counters of a
+        device between start and end (ISO, datetime or epoch ms), from the KPI buckets (stored +
+        pending in memory), without reading raw readings. Defaults to the last KPI_WINDOW_HOURS
+        up to the device's latest reading. Granularity is the 1-hour bucket containing start.
+        """
+        if end is not None:
+            end_ms = to_epoch_ms(end)
+        else:
+            end_ms = self.kpis.last_ts(device_id) or int(time.time() * 1000)
+        start_ms = to_epoch_ms(start) if start is not None else end_ms - self.kpi_window_ms
+        start_ms -= start_ms % kpi.BUCKET_MS
+        with self.kpis.lock:
+            totals = self.kpis.pending_totals(device_id, start_ms, end_ms)
+            with self._read_snapshot() as conn:
+                stored = conn.execute(kpi.TOTALS_SQL, (device_id, start_ms, end_ms)).fetchone()
+        totals = dict(zip(kpi.COUNTERS, (a + b for a, b in zip(totals, stored))))
+        return dict(kpi.kpis_from_totals(totals), **totals)
+
+    def flush_readings(self):
+        """Force buffered readings to disk. Returns the number of rows written."""
+        return self.write_buffer.flush()
+
+    def defer_read_flush(self):
+        """
+        Reads on the calling thread stop flushing the write buffer themselves: the caller
+        flushes through its own writer first (see AsyncDatabaseManager's reader pool).
+        """
+        self._read_local.defer_flush = True
+
+    def _flush_before_read(self):
+        """Make buffered readings visible to the read that follows (read-your-writes)."""
+        if not getattr(self._read_local, 'defer_flush', False):
+            self.write_buffer.flush()
+
+    # {table} é a partição (ver src/partitions.py)
+    _INSERT_READING_SQL = '''
+        INSERT INTO {table} (ts, device_id, temperature, vibration, pressure, status, risk_score, power)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    '''
+
+    # ts é epoch ms; 'timestamp' ISO continua disponível para os chamadores existentes
+    _READING_FIELDS = ['id', 'timestamp', 'device_id', 'temperature', 'vibration',
+                       'pressure', 'status', 'risk_score', 'power', 'ts']
+    _READING_DTYPE = np.dtype([
+        ('id', np.int64), ('timestamp', object), ('device_id', object), ('temperature', np.float64),
+        ('vibration', np.float64), ('pressure', np.float64), ('status', object),
+        ('risk_score', np.float64), ('power', np.float64), ('ts', np.int64),
+    ])
+    _READING_SELECT = (
+        f"SELECT id, {EPOCH_MS_TO_ISO.format(col='ts')} AS timestamp, device_id, temperature, "
+        "vibration, pressure, status, risk_score, power, ts FROM {table}"
+    )
+
+    # Consultas quentes - verify_query_plans.py confere que cada uma usa índice
+    _RECENT_READINGS_SQL = _READING_SELECT + " WHERE device_id = ? ORDER BY ts DESC LIMIT ?"
+    _READINGS_WINDOW_SQL = _READING_SELECT + " WHERE device_id = ? AND ts BETWEEN ? AND ? ORDER BY ts ASC"
+
+    _ALERT_HISTORY_SQL = "SELECT * FROM alerts ORDER BY timestamp DESC LIMIT ?"
+    _ALERT_HISTORY_DEVICE_SQL = "SELECT * FROM alerts WHERE device_id = ? ORDER BY timestamp DESC LIMIT ?"
+    _ACTIVE_ALERTS_SQL = "SELECT * FROM alerts WHERE resolved = 0 ORDER BY timestamp DESC"
+    _ACTIVE_ALERTS_DEVICE_SQL = "SELECT * FROM alerts WHERE device_id = ? AND resolved = 0 ORDER BY timestamp DESC"
+
+    @staticmethod
+    def _reading_ts(reading):
+        ts = reading.get('ts')
+        return ts if ts is not None else to_epoch_ms(reading['timestamp'])
+
+    @classmethod
+    def _reading_params(cls, reading):
+        return (
+            cls._reading_ts(reading),
+            reading['device_id'],
+            reading['temperature'],
+            reading['vibration'],
             reading['pressure'],
             reading['status'],
             reading.get('risk_score', 0.0),
             reading.get('power', 0.0)
-        ))
-        conn.commit()
-        conn.close()
+        )
 
     def log_event(self, device_id, event_type, description):
         """Log significant events like stops."""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         cursor.execute('''
             INSERT INTO events (device_id, event_type, timestamp, description)
             VALUES (?, ?, ?, ?)
         ''', (device_id, event_type, datetime.now().isoformat(), description))
         conn.commit()
-        conn.close()
+
+    def log_events(self, events):
+        """Log many (device_id, event_type, description) events in one transaction."""
+        if not events:
+            return
+        now = datetime.now().isoformat()
+        conn = self._connect()
+        with conn:
+            conn.executemany('''
+                INSERT INTO events (device_id, event_type, timestamp, description)
+                VALUES (?, ?, ?, ?)
+            ''', [(device_id, event_type, now, description) for device_id, event_type, description in events])
 
     def get_device_info(self, device_id):
-        conn = sqlite3.connect(self.db_path)
-        df = pd.read_sql_query(f"SELECT * FROM devices WHERE id = '{device_id}'", conn)
-        conn.close()
-        return df.iloc[0].to_dict() if not df.empty else None
+        """Device row as a dict (a copy), served from the in-memory registry."""
+        device = self._devices.get(device_id)
+        if device is None:
+            # Miss: pode ter sido cadastrado por outro processo
+            rows = self._query("SELECT * FROM devices WHERE id = ?", (device_id,), result='dicts')
+            if not rows:
+                return None
+            device = rows[0]
+            with self._devices_lock:
+                self._devices[device_id] = device
+        return dict(device)
+
+    def get_recent_readings(self, device_id, limit=100, result='dataframe'):
+        """
+        Latest readings, newest first. result: 'dataframe', 'tuples', 'dicts' or 'numpy'.
+        Readings still waiting in the write buffer have id -1 (no database id yet).
+        """
+        return self._format_columns(self.get_recent_window(device_id, limit), result)
 
-    def get_recent_readings(self, device_id, limit=100):
-        conn = sqlite3.connect(self.db_path)
-        df = pd.read_sql_query(f"SELECT * FROM sensor_readings WHERE device_id = '{device_id}' ORDER BY timestamp DESC LIMIT {limit}", conn)
-        conn.close()
-        return df
+    def get_recent_window(self, device_id, limit=100):
+        """
+        Latest readings (newest first) as a dict of NumPy columns.
+        Served from the in-memory ring buffer when it covers the request; the arrays
+        are copies taken under the cache lock, safe to keep and to read from any thread.
+        """
+        window = self.reading_cache.latest(device_id, limit)
+        if window is not None:
+            return window
+
+        # Cache frio: busca pelo menos uma janela completa do banco para aquecê-lo
+        # (as leituras anexadas durante a consulta são mescladas, não descartadas)
+        since = self.reading_cache.version(device_id)
+        rows = self._query_recent_rows(device_id, max(limit, self.reading_cache.capacity))
+        self.reading_cache.warm(device_id, [dict(zip(self._READING_FIELDS, row)) for row in rows], since)
+        window = self.reading_cache.latest(device_id, limit)
+        if window is not None:
+            return window
+        rows = rows[:limit]
+        return {name: np.array([row[i] for row in rows]) for i, name in enumerate(self._READING_FIELDS)}
+
+    def _query_recent_rows(self, device_id, limit):
+        self._flush_before_read() # Leituras pendentes precisam estar visíveis
+        # Da partição mais nova para a mais antiga, até completar o limite
+        rows = []
+        with self._read_snapshot() as conn:
+            for table in self.partitions.tables_newest_first():
+                rows += conn.execute(self._RECENT_READINGS_SQL.format(table=table), (device_id, limit - len(rows))).fetchall()
+                if len(rows) >= limit:
+                    break
+        return rows
 
     def save_historical(self, data_batch, filename):
-        """Simulate saving to Data Lake / Storage (CSV)."""
+        """
+        Save a batch to the Data Lake: partitioned Parquet under history_path/<filename stem>
+        (see src/datalake.py), or CSV append when pyarrow is not installed.
+        """
+        if not data_batch:
+            return
+        if PYARROW_AVAILABLE:
+            self.get_datalake(filename).write_batch(data_batch)
+            return
+
         filepath = os.path.join(self.history_path, filename)
         df = pd.DataFrame(data_batch)
         # Append if exists, else create
         header = not os.path.exists(filepath)
         df.to_csv(filepath, mode='a', header=header, index=False)
 
+    def get_datalake(self, filename="sensor_history"):
+        """Parquet writer for a Data Lake dataset (one directory per filename stem)."""
+        name = os.path.splitext(filename)[0]
+        writer = self._datalakes.get(name)
+        if writer is None:
+            writer = self._datalakes[name] = DataLakeWriter(os.path.join(self.history_path, name))
+        return writer
+
     def create_user(self, username, password_hash, salt, role='user'):
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         try:
             cursor.execute('''
@@ -192,25 +475,23 @@ class DatabaseManager:
             conn.commit()
             print(f"User {username} created successfully.")
         except sqlite3.IntegrityError:
+            conn.rollback()
             print(f"Error: User {username} already exists.")
-        finally:
-            conn.close()
 
     def get_user_by_username(self, username):
-        conn = sqlite3.connect(self.db_path)
-        # Using row_factory to get dict-like access if needed, but here simple tuple or manual dict
-        conn.row_factory = sqlite3.Row
+        conn = self._connect()
+        # row_factory no cursor para não alterar a conexão compartilhada da thread
         cursor = conn.cursor()
+        cursor.row_factory = sqlite3.Row
         cursor.execute("SELECT * FROM users WHERE username = ?", (username,))
         row = cursor.fetchone()
-        conn.close()
         if row:
             return dict(row)
         return None
 
-    def get_readings_window(self, device_id, target_time_str, window_minutes=30):
+    def get_readings_window(self, device_id, target_time_str, window_minutes=30, result='dataframe'):
         """Get readings around a timestamp with a wider window for reports."""
-        conn = sqlite3.connect(self.db_path)
+        self._flush_before_read()
         try:
             # Try parsing various formats
             if len(target_time_str.split()) == 2:
@@ -218,30 +499,40 @@ class DatabaseManager:
                 target = datetime.strptime(target_time_str, "%d/%m/%Y %H:%M")
             else:
                  # Fallback
-                 return pd.DataFrame()
-            
-            start_window = (target - timedelta(minutes=window_minutes)).isoformat()
-            end_window = (target + timedelta(minutes=window_minutes)).isoformat()
+                 return self._format_rows([], self._READING_FIELDS, result)
             
-            query = f"""
-                SELECT * FROM sensor_readings 
-                WHERE device_id = ? 
-                AND timestamp BETWEEN ? AND ?
-                ORDER BY timestamp ASC
-            """
+            start_window = to_epoch_ms(target - timedelta(minutes=window_minutes))
+            end_window = to_epoch_ms(target + timedelta(minutes=window_minutes))
             
-            df = pd.read_sql_query(query, conn, params=(device_id, start_window, end_window))
-            conn.close()
-            return df
+            rows = []
+            with self._read_snapshot() as conn:
+                # Blocos frios (mais antigos) primeiro, depois as partições
+                rows += self._cold_rows(conn, device_id, start_window, end_window)
+                for table in self.partitions.tables_for_range(start_window, end_window):
+                    rows += conn.execute(self._READINGS_WINDOW_SQL.format(table=table), (device_id, start_window, end_window)).fetchall()
+            return self._format_rows(rows, self._READING_FIELDS, result)
             
         except Exception as e:
             print(f"Error fetching historical window: {e}")
-            conn.close()
-            return pd.DataFrame()
+            return self._format_rows([], self._READING_FIELDS, result)
     
+    def _cold_rows(self, conn, device_id, start_ts, end_ts):
+        """Decode compressed blocks into rows in the _READING_FIELDS layout."""
+        columns = self.cold_storage.read(conn, device_id, start_ts, end_ts)
+        if not columns:
+            return []
+        rows = []
+        for i in range(len(columns['ts'])):
+            ts = int(columns['ts'][i])
+            floats = [None if v != v else v for v in (columns[m][i].item() for m in
+                      ('temperature', 'vibration', 'pressure', 'risk_score', 'power'))]
+            rows.append((int(columns['id'][i]), epoch_ms_to_iso(ts), device_id, floats[0], floats[1], floats[2],
+                         columns['status'][i], floats[3], floats[4], ts))
+        return rows
+
     def save_alert(self, alert_data: dict, report_text: str, image_path: str = None, notification_sent: bool = False):
         """Save alert to database."""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -265,40 +556,65 @@ class DatabaseManager:
         
         alert_id = cursor.lastrowid
         conn.commit()
-        conn.close()
         return alert_id
     
-    def get_alert_history(self, device_id: str = None, limit: int = 20):
+    def get_alert_history(self, device_id: str = None, limit: int = 20, result: str = 'dataframe'):
         """Get alert history from database."""
-        conn = sqlite3.connect(self.db_path)
-        
-        if device_id:
-            query = f"SELECT * FROM alerts WHERE device_id = ? ORDER BY timestamp DESC LIMIT ?"
-            df = pd.read_sql_query(query, conn, params=(device_id, limit))
-        else:
-            query = f"SELECT * FROM alerts ORDER BY timestamp DESC LIMIT ?"
-            df = pd.read_sql_query(query, conn, params=(limit,))
-        
-        conn.close()
-        return df
+        with self._read_snapshot() as conn:
+            if device_id:
+                return self._query(self._ALERT_HISTORY_DEVICE_SQL, (device_id, limit), result, conn)
+            return self._query(self._ALERT_HISTORY_SQL, (limit,), result, conn)
     
-    def get_active_alerts(self, device_id: str = None):
+    def get_active_alerts(self, device_id: str = None, result: str = 'dataframe'):
         """Get unresolved alerts."""
-        conn = sqlite3.connect(self.db_path)
-        
-        if device_id:
-            query = "SELECT * FROM alerts WHERE device_id = ? AND resolved = 0 ORDER BY timestamp DESC"
-            df = pd.read_sql_query(query, conn, params=(device_id,))
-        else:
-            query = "SELECT * FROM alerts WHERE resolved = 0 ORDER BY timestamp DESC"
-            df = pd.read_sql_query(query, conn)
-        
-        conn.close()
-        return df
+        with self._read_snapshot() as conn:
+            if device_id:
+                return self._query(self._ACTIVE_ALERTS_DEVICE_SQL, (device_id,), result, conn)
+            return self._query(self._ACTIVE_ALERTS_SQL, (), result, conn)
+
+    # --- Formatos de resultado ---
+    # 'dataframe' (padrão), 'tuples', 'dicts' ou 'numpy' (array estruturado).
+    # Os formatos leves evitam construir um DataFrame em consultas pequenas do caminho quente.
+    RESULT_FORMATS = ('dataframe', 'tuples', 'dicts', 'numpy')
+
+    def _query(self, sql, params=(), result='dataframe', conn=None):
+        cursor = (conn or self._connect()).execute(sql, params)
+        fields = [col[0] for col in cursor.description]
+        return self._format_rows(cursor.fetchall(), fields, result)
+
+    def _format_rows(self, rows, fields, result):
+        """Format rows (list of tuples) fetched from SQLite."""
+        if result == 'dataframe':
+            return pd.DataFrame.from_records(rows, columns=fields)
+        if result == 'tuples':
+            return rows
+        if result == 'dicts':
+            return [dict(zip(fields, row)) for row in rows]
+        if result == 'numpy':
+            if fields == self._READING_FIELDS:
+                return np.array(rows, dtype=self._READING_DTYPE) if rows else np.empty(0, dtype=self._READING_DTYPE)
+            if not rows:
+                return np.empty(0, dtype=[(f, object) for f in fields])
+            inferred = np.rec.fromrecords(rows, names=fields).dtype
+            return np.array(rows, dtype=np.dtype(inferred.descr))
+        raise ValueError(f"Formato de resultado inválido: {result} (use {', '.join(self.RESULT_FORMATS)})")
+
+    def _format_columns(self, columns, result):
+        """Format a reading window given as NumPy columns (see get_recent_window)."""
+        fields = self._READING_FIELDS
+        if result == 'dataframe':
+            return pd.DataFrame(columns, columns=fields)
+        if result == 'numpy':
+            arr = np.empty(len(columns['ts']), dtype=self._READING_DTYPE)
+            for f in fields:
+                arr[f] = columns[f]
+            return arr
+        rows = list(zip(*(columns[f].tolist() for f in fields)))
+        return self._format_rows(rows, fields, result)
     
     def resolve_alert(self, alert_id: int, resolved_by: str = "system"):
         """Mark alert as resolved."""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -308,4 +624,141 @@ class DatabaseManager:
         ''', (datetime.now().isoformat(), resolved_by, alert_id))
         
         conn.commit()
-        conn.close()
+
+
+class ReadingWriteBuffer:
+    """
+    Group commit para leituras de sensores.
+    Acumula leituras e grava todas numa única transação quando o buffer
+    atinge max_size ou quando a leitura mais antiga espera mais que max_latency (s).
+    max_latency=None desliga a thread de prazo (só lote cheio ou flush explícito).
+    executor: se definido (ex: o writer do AsyncDatabaseManager), os flushes por prazo rodam
+    nele em vez de na thread de prazo, mantendo um único escritor.
+
+    Falhas transitórias do SQLite (OperationalError: banco travado, disco) devolvem o lote
+    ao buffer. Qualquer outro erro indica leituras que nunca serão gravadas: o lote é
+    regravado leitura a leitura e as que falham vão para dead_letter (as demais não se perdem).
+    """
+
+    def __init__(self, db_manager, max_size=500, max_latency=0.5, dead_letter_size=10_000):
+        self.db = db_manager
+        self.max_size = max_size
+        self.max_latency = max_latency
+        self.dead_letter = deque(maxlen=dead_letter_size)  # (leitura, erro) mais recentes
+        self.dead_lettered = 0
+        self.executor = None
+
+        self._pending = []
+        self._oldest = None  # time.monotonic() da leitura mais antiga pendente
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()  # Serializa gravações (leitores esperam o lote em voo)
+        self._flusher = None
+        self._closed = False
+
+    def add(self, reading):
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("ReadingWriteBuffer já foi fechado")
+            if not self._pending:
+                self._oldest = time.monotonic()
+            self._pending.append(reading)
+            full = len(self._pending) >= self.max_size
+            self._start_flusher()
+            self._cond.notify()
+        if full:
+            self.flush()
+
+    def _start_flusher(self):
+        # Chamado com self._cond adquirido
+        if self._flusher is None and self.max_latency is not None:
+            self._flusher = threading.Thread(target=self._run, name="ReadingWriteBuffer", daemon=True)
+            self._flusher.start()
+
+    def add_many(self, readings):
+        if not readings:
+            return
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("ReadingWriteBuffer já foi fechado")
+            if not self._pending:
+                self._oldest = time.monotonic()
+            self._pending.extend(readings)
+            full = len(self._pending) >= self.max_size
+            self._start_flusher()
+            self._cond.notify()
+        if full:
+            self.flush()
+
+    def flush(self):
+        """Write every pending reading now. Returns the number of rows written."""
+        with self._flush_lock:
+            with self._cond:
+                batch, self._pending = self._pending, []
+                self._oldest = None
+            try:
+                return self.db._write_readings(batch)
+            except sqlite3.OperationalError:
+                # Transitório: devolve o lote ao buffer para a próxima tentativa
+                with self._cond:
+                    self._pending = batch + self._pending
+                    self._oldest = time.monotonic()
+                raise
+            except Exception as e:
+                print(f"Erro gravando lote de {len(batch)} leituras ({type(e).__name__}: {e}); gravando uma a uma.")
+                return self._write_one_by_one(batch)
+
+    def _write_one_by_one(self, batch):
+        """Salvage a batch that failed with a non-transient error (caller holds _flush_lock)."""
+        written = failed = 0
+        for reading in batch:
+            try:
+                written += self.db._write_readings([reading])
+            except Exception as e:
+                self.dead_letter.append((reading, f"{type(e).__name__}: {e}"))
+                self.dead_lettered += 1
+                failed += 1
+        if failed:
+            print(f"{failed} leitura(s) não gravável(is) movida(s) para o dead letter "
+                  f"(total {self.dead_lettered}).")
+        return written
+
+    def close(self):
+        """Stop the deadline thread and flush what is left."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        if self._flusher is not None:
+            self._flusher.join()
+        self.flush()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def _run(self):
+        """Background thread that enforces the latency deadline."""
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                remaining = self._oldest + self.max_latency - time.monotonic()
+                if remaining > 0:
+                    self._cond.wait(remaining)
+                    continue
+            try:
+                self._deadline_flush()
+            except Exception as e:
+                # A thread de prazo nunca morre: o lote volta ao buffer (ou ao dead letter) no flush
+                print(f"Error flushing sensor readings: {e}")
+
+    def _deadline_flush(self):
+        executor = self.executor
+        if executor is not None:
+            try:
+                future = executor.submit(self.flush)
+            except RuntimeError:
+                pass  # Executor já encerrado: não há mais escritor concorrente, grava aqui
+            else:
+                return future.result()
+        return self.flush()
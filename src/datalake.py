@@ -0,0 +1,164 @@
+"""
+Data Lake - Armazenamento Colunar (Parquet)
+Grava lotes de leituras em arquivos Parquet comprimidos e tipados, particionados por
+data e dispositivo (date=AAAA-MM-DD/device_id=DEV-100/part-*.parquet), compacta
+arquivos pequenos e lê com pushdown de colunas e predicados.
+"""
+
+import os
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+    print("⚠️ PyArrow não instalado (Data Lake em CSV). Instale com: pip install pyarrow")
+
+from src.partitions import to_epoch_ms
+
+COMPRESSION = os.getenv("DATALAKE_COMPRESSION", "zstd")
+
+if PYARROW_AVAILABLE:
+    # device_id e date não entram no arquivo: vêm do caminho da partição
+    READING_SCHEMA = pa.schema([
+        ('ts', pa.int64()),
+        ('temperature', pa.float32()),
+        ('vibration', pa.float32()),
+        ('pressure', pa.float32()),
+        ('power', pa.float32()),
+        ('status', pa.dictionary(pa.int8(), pa.string())),
+        ('risk_score', pa.float32()),
+        ('predicted_rul', pa.float32()),
+        ('energy_waste', pa.float32()),
+    ])
+    PARTITIONING = ds.partitioning(
+        pa.schema([('date', pa.string()), ('device_id', pa.string())]), flavor='hive'
+    )
+
+
+def _partition_date(ts: int) -> str:
+    return datetime.fromtimestamp(ts / 1000, tz=timezone.utc).strftime('%Y-%m-%d')
+
+
+class DataLakeWriter:
+    """
+    Escreve lotes de leituras (dicts no formato dos pacotes) como Parquet particionado.
+    """
+
+    def __init__(self, root: str):
+        if not PYARROW_AVAILABLE:
+            raise RuntimeError("DataLakeWriter requer pyarrow")
+        self.root = root
+        os.makedirs(self.root, exist_ok=True)
+
+    def write_batch(self, readings: List[Dict]) -> List[str]:
+        """Write one file per (date, device) touched by the batch. Returns the file paths."""
+        groups: Dict[tuple, Dict[str, list]] = {}
+        for r in readings:
+            ts = r.get('ts')
+            if ts is None:
+                ts = to_epoch_ms(r['timestamp'])
+            key = (_partition_date(ts), r['device_id'])
+            cols = groups.get(key)
+            if cols is None:
+                cols = groups[key] = {name: [] for name in READING_SCHEMA.names}
+            cols['ts'].append(ts)
+            for name in READING_SCHEMA.names[1:]:
+                cols[name].append(r.get(name))
+
+        paths = []
+        for (date, device_id), cols in groups.items():
+            table = pa.Table.from_pydict(cols, schema=READING_SCHEMA)
+            directory = self._partition_dir(date, device_id)
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f"part-{uuid.uuid4().hex}.parquet")
+            pq.write_table(table, path, compression=COMPRESSION)
+            paths.append(path)
+        return paths
+
+    def compact(self, min_files: int = 4) -> int:
+        """
+        Junta os arquivos pequenos de cada partição (date, device) num único arquivo ordenado por ts.
+
+        Returns:
+            Número de partições compactadas.
+        """
+        compacted = 0
+        for directory, _, files in os.walk(self.root):
+            parts = sorted(f for f in files if f.endswith('.parquet'))
+            if len(parts) < min_files:
+                continue
+            paths = [os.path.join(directory, f) for f in parts]
+            table = pa.concat_tables(pq.read_table(p, schema=READING_SCHEMA) for p in paths)
+            table = table.sort_by('ts')
+
+            # Escreve num temporário e renomeia antes de apagar os originais
+            target = os.path.join(directory, f"part-{uuid.uuid4().hex}.parquet")
+            tmp = target + ".tmp"
+            pq.write_table(table, tmp, compression=COMPRESSION)
+            os.replace(tmp, target)
+            for p in paths:
+                os.remove(p)
+            compacted += 1
+        return compacted
+
+    def _partition_dir(self, date: str, device_id: str) -> str:
+        return os.path.join(self.root, f"date={date}", f"device_id={device_id}")
+
+
+class DataLakeReader:
+    """
+    Lê o Data Lake com pushdown: só as colunas pedidas são decodificadas e
+    partições fora do intervalo de datas/dispositivos nem são abertas.
+    """
+
+    def __init__(self, root: str):
+        if not PYARROW_AVAILABLE:
+            raise RuntimeError("DataLakeReader requer pyarrow")
+        self.root = root
+
+    def dataset(self):
+        return ds.dataset(self.root, format='parquet', schema=self._full_schema(), partitioning=PARTITIONING)
+
+    def read(self, columns: Optional[Sequence[str]] = None, device_ids: Optional[Sequence[str]] = None,
+             start=None, end=None, filter=None):
+        """
+        Args:
+            columns: colunas a ler (None = todas)
+            device_ids: restringe a estes dispositivos (poda de partição)
+            start, end: intervalo de tempo (ISO, datetime ou epoch ms), inclusivo
+            filter: expressão pyarrow.dataset adicional (ex: ds.field('temperature') > 90)
+
+        Returns:
+            pandas.DataFrame
+        """
+        if not os.path.isdir(self.root):
+            return pd.DataFrame(columns=list(columns) if columns else self._full_schema().names)
+
+        expr = filter
+        if device_ids is not None:
+            expr = self._and(expr, ds.field('device_id').isin(list(device_ids)))
+        if start is not None:
+            start_ms = to_epoch_ms(start)
+            expr = self._and(expr, (ds.field('date') >= _partition_date(start_ms)) & (ds.field('ts') >= start_ms))
+        if end is not None:
+            end_ms = to_epoch_ms(end)
+            expr = self._and(expr, (ds.field('date') <= _partition_date(end_ms)) & (ds.field('ts') <= end_ms))
+
+        table = self.dataset().to_table(columns=list(columns) if columns else None, filter=expr)
+        return table.to_pandas()
+
+    @staticmethod
+    def _and(left, right):
+        return right if left is None else left & right
+
+    @staticmethod
+    def _full_schema():
+        return pa.schema(list(READING_SCHEMA) + list(PARTITIONING.schema))
@@ -1,11 +1,20 @@
+import asyncio
+import math
+import numbers
 import random
+import struct
 import time
 import json
-from datetime import datetime
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
 
 class SensorSimulator:
-    def __init__(self, device_id):
+    def __init__(self, device_id, seed=None):
         self.device_id = device_id
+        self.rng = random.Random(seed) # Semente fixa = sequência reproduzível
         self.status = 'running'
         self.pressure_base = 10 # Default
         self.scenario = 'normal'
@@ -27,27 +36,30 @@ class SensorSimulator:
             self.vib_base = 2.0
             self.noise_level = 1.0
 
-    def generate_packet(self):
-        """Generates a data packet resembling a real IoT payload."""
+    def generate_packet(self, now=None):
+        """
+        Generates a data packet resembling a real IoT payload.
+        now: timestamp of the packet (simulated clock); defaults to the wall clock.
+        """
         
         # Simulate some drift or anomalies
         # In negative scenario, failure/anomalies are more frequent
         anomaly_chance = 0.95 if self.scenario != 'negative' else 0.70
         
-        if random.random() > anomaly_chance:
+        if self.rng.random() > anomaly_chance:
             # Random spike
-            temp = self.temp_base + random.uniform(10, 20) * self.noise_level
-            vib = self.vib_base + random.uniform(2, 5) * self.noise_level
+            temp = self.temp_base + self.rng.uniform(10, 20) * self.noise_level
+            vib = self.vib_base + self.rng.uniform(2, 5) * self.noise_level
         else:
             # Normal fluctuation
-            temp = self.temp_base + random.uniform(-2, 2) * self.noise_level
-            vib = self.vib_base + random.uniform(-0.5, 0.5) * self.noise_level
+            temp = self.temp_base + self.rng.uniform(-2, 2) * self.noise_level
+            vib = self.vib_base + self.rng.uniform(-0.5, 0.5) * self.noise_level
 
-        pressure = self.pressure_base + random.uniform(-1, 1)
+        pressure = self.pressure_base + self.rng.uniform(-1, 1)
 
         # Simulate breakdown logic
         breakdown_chance = 0.99 if self.scenario != 'negative' else 0.95
-        if self.status == 'running' and random.random() > breakdown_chance:
+        if self.status == 'running' and self.rng.random() > breakdown_chance:
              self.status = 'parado' # Random stop
              self.steps_to_failure = 10 # Stay stopped for 10 ticks
         
@@ -68,9 +80,12 @@ class SensorSimulator:
         elif self.scenario == 'negative':
             power_usage *= 1.2 # Inefficient
 
+        if now is None:
+            now = datetime.now()
         return {
             'device_id': self.device_id,
-            'timestamp': datetime.now().isoformat(),
+            'timestamp': now.isoformat(),
+            'ts': int(now.timestamp() * 1000), # epoch ms, gravado sem reparse
             'temperature': round(temp, 2),
             'vibration': round(vib, 2),
             'pressure': round(pressure, 2),
@@ -78,17 +93,512 @@ class SensorSimulator:
             'status': self.status
         }
 
+# --- Formato binário de pacotes ---
+# Layout fixo little-endian de 29 bytes por leitura:
+#   device (uint32, índice em DeviceIndex) | ts (int64, epoch ms) |
+#   temperature, vibration, pressure, power (float32) | status (uint8, STATUS_NAMES)
+PACKET_DTYPE = np.dtype([
+    ('device', '<u4'), ('ts', '<i8'),
+    ('temperature', '<f4'), ('vibration', '<f4'), ('pressure', '<f4'), ('power', '<f4'),
+    ('status', 'u1'),
+])
+PACKET_SIZE = PACKET_DTYPE.itemsize
+_PACKET_STRUCT = struct.Struct('<IqffffB')
+
+STATUS_NAMES = ['running', 'parado', 'unknown']
+STATUS_CODES = {name: code for code, name in enumerate(STATUS_NAMES)}
+_STATUS_UNKNOWN = STATUS_CODES['unknown']
+
+
+class DeviceIndex:
+    """Mapeia device_id <-> índice inteiro do formato binário (compartilhado por encoder e decoder)."""
+
+    def __init__(self, device_ids=()):
+        self.ids = []
+        self._index = {}
+        for device_id in device_ids:
+            self.index(device_id)
+
+    def index(self, device_id):
+        """Index of device_id, registering it on first use."""
+        i = self._index.get(device_id)
+        if i is None:
+            i = self._index[device_id] = len(self.ids)
+            self.ids.append(device_id)
+        return i
+
+    def __len__(self):
+        return len(self.ids)
+
+
+def encode_packet(packet, devices):
+    """Packet dict -> PACKET_SIZE bytes."""
+    ts = packet.get('ts')
+    if ts is None:
+        ts = int(datetime.fromisoformat(packet['timestamp']).timestamp() * 1000)
+    return _PACKET_STRUCT.pack(
+        devices.index(packet['device_id']), ts,
+        packet['temperature'], packet['vibration'], packet['pressure'], packet.get('power', 0.0),
+        STATUS_CODES.get(packet['status'], _STATUS_UNKNOWN),
+    )
+
+
+def decode_packet(data, devices):
+    """PACKET_SIZE bytes -> packet dict (same keys as SensorSimulator.generate_packet)."""
+    device, ts, temp, vib, pressure, power, status = _PACKET_STRUCT.unpack(data)
+    return {
+        'device_id': devices.ids[device],
+        'timestamp': datetime.fromtimestamp(ts / 1000).isoformat(),
+        'ts': ts,
+        'temperature': temp,
+        'vibration': vib,
+        'pressure': pressure,
+        'power': power,
+        'status': STATUS_NAMES[status],
+    }
+
+
+def encode_packets(packets, devices):
+    """Many packet dicts -> one contiguous buffer."""
+    return b''.join(encode_packet(p, devices) for p in packets)
+
+
+def encode_tick(columns, devices):
+    """FleetSimulator.generate_tick() columns -> buffer, without per-packet Python objects."""
+    n = len(columns['ts'])
+    arr = np.empty(n, dtype=PACKET_DTYPE)
+    arr['device'] = [devices.index(d) for d in columns['device_id']]
+    arr['ts'] = columns['ts']
+    for name in ('temperature', 'vibration', 'pressure', 'power'):
+        arr[name] = columns[name]
+    status = np.asarray(columns['status'])
+    arr['status'] = _STATUS_UNKNOWN
+    for name, code in STATUS_CODES.items():
+        arr['status'][status == name] = code
+    return arr.tobytes()
+
+
+def decode_batch(buffer):
+    """
+    Zero-copy decode: structured NumPy view (PACKET_DTYPE) over a bytes/bytearray/memoryview
+    holding whole packets. Column access (batch['temperature']) needs no per-packet objects.
+    """
+    return np.frombuffer(buffer, dtype=PACKET_DTYPE, count=len(buffer) // PACKET_SIZE)
+
+
+def batch_to_packets(batch, devices):
+    """Structured batch -> packet dicts (for consumers that still take dicts)."""
+    ids = devices.ids
+    return [
+        {
+            'device_id': ids[device],
+            'timestamp': datetime.fromtimestamp(ts / 1000).isoformat(),
+            'ts': ts,
+            'temperature': temp,
+            'vibration': vib,
+            'pressure': pressure,
+            'power': power,
+            'status': STATUS_NAMES[status],
+        }
+        for device, ts, temp, vib, pressure, power, status in zip(*(batch[name].tolist() for name in PACKET_DTYPE.names))
+    ]
+
+
+# Campos obrigatórios de um pacote; as métricas podem ser None/NaN (sem medição)
+REQUIRED_FIELDS = ('device_id', 'temperature', 'vibration', 'pressure', 'status')
+_NUMERIC_FIELDS = ('temperature', 'vibration', 'pressure', 'power')
+
+
+# Faixa de ts aceita: de 1970 até a maior data que datetime representa (9999-12-31 UTC)
+MIN_TS_MS = 0
+MAX_TS_MS = 253_402_214_400_000
+
+
+def _is_number(value):
+    return isinstance(value, numbers.Real) and not isinstance(value, bool)
+
+
+def _to_float(value):
+    """Metric as a float, None for a missing value (None/NaN); raises ValueError if invalid."""
+    if value is None:
+        return None
+    if not _is_number(value):
+        raise ValueError("não numérico")
+    try:
+        value = float(value)
+    except OverflowError:
+        raise ValueError("fora da faixa de float")
+    if value != value:
+        return None  # NaN = sem medição
+    if math.isinf(value):
+        raise ValueError("infinito")
+    return value
+
+
+def packet_ts(packet):
+    """
+    Epoch ms of a packet ('ts', or the ISO 'timestamp' when ts is absent); None if missing,
+    invalid or outside MIN_TS_MS..MAX_TS_MS.
+    """
+    ts = packet.get('ts')
+    if ts is not None:
+        if not _is_number(ts):
+            return None
+        try:
+            ts = int(ts)  # int(inf/NaN) -> OverflowError/ValueError
+        except (OverflowError, ValueError):
+            return None
+    else:
+        timestamp = packet.get('timestamp')
+        if not isinstance(timestamp, str):
+            return None
+        try:
+            ts = int(datetime.fromisoformat(timestamp).timestamp() * 1000)
+        except (OverflowError, OSError, ValueError):
+            return None
+    return ts if MIN_TS_MS <= ts < MAX_TS_MS else None
+
+
+def validate_packet(packet):
+    """
+    Why a packet cannot be processed, or None when it is valid. Never raises.
+    A valid packet is normalized in place: metrics become float (or None when missing)
+    and 'ts' an int, so nothing downstream (model, SQLite) can overflow on it.
+    """
+    if not isinstance(packet, dict):
+        return "não é um objeto"
+    missing = [name for name in REQUIRED_FIELDS if name not in packet]
+    if missing:
+        return f"sem {', '.join(missing)}"
+    if not isinstance(packet['device_id'], str) or not packet['device_id']:
+        return "device_id inválido"
+    if not isinstance(packet['status'], str):
+        return "status inválido"
+    metrics = {}
+    for name in _NUMERIC_FIELDS:
+        if name in packet:
+            try:
+                metrics[name] = _to_float(packet[name])
+            except ValueError as e:
+                return f"{name} {e}"
+    ts = packet_ts(packet)
+    if ts is None:
+        return "sem ts/timestamp válido"
+    packet.update(metrics)
+    if packet.get('ts') is not None:
+        packet['ts'] = ts
+    return None
+
+
+class FleetSimulator:
+    """
+    Simula N dispositivos de uma vez: o estado fica em arrays NumPy e cada tick
+    é gerado num único passo vetorizado (mesmos cenários e paradas do SensorSimulator).
+    """
+
+    SCENARIOS = ['normal', 'positive', 'negative']
+    # Parâmetros por cenário, na ordem de SCENARIOS
+    TEMP_BASE = np.array([60.0, 70.0, 100.0])
+    VIB_BASE = np.array([2.0, 1.0, 6.0])
+    NOISE_LEVEL = np.array([1.0, 0.5, 2.0])
+    ANOMALY_CHANCE = np.array([0.95, 0.95, 0.70])
+    BREAKDOWN_CHANCE = np.array([0.99, 0.99, 0.95])
+    POWER_FACTOR = np.array([1.0, 0.9, 1.2])
+
+    STOP_TICKS = 10  # Ticks parado após uma quebra
+
+    def __init__(self, device_ids, seed=None):
+        self.device_ids = np.array(device_ids, dtype=object)
+        n = len(self.device_ids)
+        self.rng = np.random.default_rng(seed)
+        self.pressure_base = np.full(n, 10.0)
+        self.scenario = np.zeros(n, dtype=np.int8)  # índice em SCENARIOS
+        self.running = np.ones(n, dtype=bool)
+        self.steps_to_failure = np.zeros(n, dtype=np.int32)
+
+    def __len__(self):
+        return len(self.device_ids)
+
+    def set_scenario(self, scenario, device_ids=None):
+        """Change the scenario of every device (or only of device_ids)."""
+        code = self.SCENARIOS.index(scenario)
+        if device_ids is None:
+            self.scenario[:] = code
+        else:
+            self.scenario[np.isin(self.device_ids, list(device_ids))] = code
+
+    def generate_tick(self, now=None):
+        """
+        One reading per device as NumPy columns:
+        device_id, ts, temperature, vibration, pressure, power, status.
+        """
+        n = len(self.device_ids)
+        rng = self.rng
+        sc = self.scenario
+        noise = self.NOISE_LEVEL[sc]
+
+        # Picos aleatórios (mais frequentes no cenário negativo)
+        spike = rng.random(n) > self.ANOMALY_CHANCE[sc]
+        temp = self.TEMP_BASE[sc] + np.where(spike, rng.uniform(10, 20, n), rng.uniform(-2, 2, n)) * noise
+        vib = self.VIB_BASE[sc] + np.where(spike, rng.uniform(2, 5, n), rng.uniform(-0.5, 0.5, n)) * noise
+        pressure = self.pressure_base + rng.uniform(-1, 1, n)
+
+        # Quebras: máquinas rodando param por STOP_TICKS ticks
+        breakdown = self.running & (rng.random(n) > self.BREAKDOWN_CHANCE[sc])
+        self.running &= ~breakdown
+        self.steps_to_failure[breakdown] = self.STOP_TICKS
+
+        stopped = ~self.running
+        self.steps_to_failure[stopped] -= 1
+        self.running |= stopped & (self.steps_to_failure <= 0)
+        # Parada: valores caem (mesmo no tick em que volta a rodar)
+        temp = np.where(stopped, np.maximum(25, temp - 20), temp)
+        vib = np.where(stopped, 0.0, vib)
+        pressure = np.where(stopped, 0.0, pressure)
+
+        power = (500 + vib * 20 + temp * 0.5) * self.POWER_FACTOR[sc]
+
+        if now is None:
+            now = datetime.now()
+        return {
+            'device_id': self.device_ids,
+            'ts': np.full(n, int(now.timestamp() * 1000), dtype=np.int64),
+            'temperature': np.round(temp, 2),
+            'vibration': np.round(vib, 2),
+            'pressure': np.round(pressure, 2),
+            'power': np.round(power, 2),
+            'status': np.where(self.running, 'running', 'parado').astype(object),
+        }
+
+    def generate_packets(self, now=None):
+        """One tick as packet dicts (same format as SensorSimulator.generate_packet)."""
+        if now is None:
+            now = datetime.now()
+        tick = self.generate_tick(now)
+        timestamp = now.isoformat()
+        ts = int(tick['ts'][0]) if len(self) else 0
+        return [
+            {
+                'device_id': device_id,
+                'timestamp': timestamp,
+                'ts': ts,
+                'temperature': temp,
+                'vibration': vib,
+                'pressure': pressure,
+                'power': power,
+                'status': status,
+            }
+            for device_id, temp, vib, pressure, power, status in zip(
+                tick['device_id'].tolist(), tick['temperature'].tolist(), tick['vibration'].tolist(),
+                tick['pressure'].tolist(), tick['power'].tolist(), tick['status'].tolist()
+            )
+        ]
+
 class MqttMock:
-    """Mocks an MQTT broker/client that simply yields data from registered simulators."""
-    def __init__(self):
+    """
+    Mocks an MQTT broker/client that simply yields data from registered simulators.
+
+    Relógio virtual (testes de carga e benchmarks reproduzíveis):
+        tick_interval: segundos simulados entre rodadas
+        speed: multiplicador em relação ao tempo real (sleep = tick_interval / speed);
+               None = sem sleep, vazão máxima
+        start_time: início do relógio simulado (datetime). Com speed=1 e sem start_time,
+                    os pacotes usam o relógio de parede (comportamento original)
+        seed: semente das simulações registradas (mesma semente = mesmos pacotes)
+    """
+    def __init__(self, tick_interval=1.0, speed=1.0, start_time=None, seed=None):
         self.sensors = []
+        self.fleets = []
+        self.tick_interval = tick_interval
+        self.speed = speed
+        self.start_time = start_time
+        self.seed = seed
+        self.virtual_clock = start_time is not None or speed != 1.0
+        self.now = None  # Horário simulado da rodada atual
 
     def register_sensor(self, sensor):
+        if self.seed is not None:
+            # Semente por dispositivo: independe da ordem/quantidade de sensores
+            sensor.rng.seed(f"{self.seed}:{sensor.device_id}")
         self.sensors.append(sensor)
 
-    def listen(self):
+    def register_fleet(self, fleet):
+        """Register a FleetSimulator (one vectorized tick per round)."""
+        if self.seed is not None:
+            fleet.rng = np.random.default_rng((self.seed, len(self.fleets)))
+        self.fleets.append(fleet)
+
+    def listen(self, max_ticks=None):
         """Generator that yields messages like an MQTT subscription."""
-        while True:
+        for now in self._clock(max_ticks):
             for sensor in self.sensors:
-                yield sensor.generate_packet()
-            time.sleep(1)  # Simulate network/polling interval
+                yield sensor.generate_packet(now)
+            for fleet in self.fleets:
+                yield from fleet.generate_packets(now)
+            if self.speed:
+                time.sleep(self.tick_interval / self.speed)  # Simulate network/polling interval
+
+    async def listen_async(self, max_ticks=None):
+        """Async version of listen() (asyncio.sleep between rounds), for IngestionGateway."""
+        for now in self._clock(max_ticks):
+            for sensor in self.sensors:
+                yield sensor.generate_packet(now)
+            for fleet in self.fleets:
+                for packet in fleet.generate_packets(now):
+                    yield packet
+            await asyncio.sleep(self.tick_interval / self.speed if self.speed else 0)
+
+    def _clock(self, max_ticks=None):
+        """Timestamps of each round: simulated (start_time + n * tick_interval) or wall clock."""
+        start = self.start_time or datetime.now()
+        tick = 0
+        while max_ticks is None or tick < max_ticks:
+            if self.virtual_clock:
+                self.now = start + timedelta(seconds=tick * self.tick_interval)
+            else:
+                self.now = datetime.now()
+            yield self.now
+            tick += 1
+
+
+class IngestionGateway:
+    """
+    Gateway asyncio entre produtores (MqttMock, cliente de broker real) e o processamento.
+
+    - Filas limitadas por shard; o shard vem de crc32(device_id), então a ordem
+      por dispositivo é preservada e cada shard tem seu próprio consumidor.
+    - Política quando a fila está cheia:
+        'block'       -> o produtor espera (backpressure)
+        'drop_newest' -> o pacote que chega é descartado
+        'drop_oldest' -> o pacote mais antigo da fila é descartado (prioriza dados recentes)
+    - Handlers síncronos (ex: DataProcessor.process_packet) rodam num pool de threads,
+      um por shard; handlers async são aguardados direto.
+    - metrics(): profundidade das filas, aceitos/descartados/processados e lag de fila.
+
+    Uso:
+        gateway = IngestionGateway(processor.process_packet, shards=4, queue_size=1000)
+        await gateway.start()
+        await gateway.run_producer(mqtt.listen_async())
+        await gateway.stop()
+    """
+
+    POLICIES = ('block', 'drop_newest', 'drop_oldest')
+
+    def __init__(self, handler, shards=4, queue_size=1000, policy='block', key='device_id'):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Política inválida: {policy} (use {', '.join(self.POLICIES)})")
+        self.handler = handler
+        self.shards = shards
+        self.queue_size = queue_size
+        self.policy = policy
+        self.key = key
+
+        self._queues = []
+        self._consumers = []
+        self._executor = None
+        self._is_async = asyncio.iscoroutinefunction(handler)
+        self._stats = [self._empty_stats() for _ in range(shards)]
+
+    @staticmethod
+    def _empty_stats():
+        return {'accepted': 0, 'dropped': 0, 'processed': 0, 'errors': 0,
+                'max_depth': 0, 'lag_last': 0.0, 'lag_max': 0.0, 'lag_total': 0.0}
+
+    def shard_for(self, packet):
+        return zlib.crc32(str(packet[self.key]).encode()) % self.shards
+
+    async def start(self):
+        self._queues = [asyncio.Queue(maxsize=self.queue_size) for _ in range(self.shards)]
+        if not self._is_async:
+            self._executor = ThreadPoolExecutor(max_workers=self.shards, thread_name_prefix="ingestion")
+        self._consumers = [asyncio.create_task(self._consume(i)) for i in range(self.shards)]
+
+    async def stop(self, drain=True):
+        """Stop the consumers; with drain=True, process everything still queued first."""
+        if drain:
+            for queue in self._queues:
+                await queue.join()
+        for task in self._consumers:
+            task.cancel()
+        await asyncio.gather(*self._consumers, return_exceptions=True)
+        self._consumers = []
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    async def publish(self, packet) -> bool:
+        """Enqueue a packet according to the policy. Returns False if it was dropped."""
+        i = self.shard_for(packet)
+        queue = self._queues[i]
+        stats = self._stats[i]
+        item = (time.monotonic(), packet)
+
+        if self.policy == 'block':
+            await queue.put(item)
+        elif queue.full():
+            stats['dropped'] += 1
+            if self.policy == 'drop_newest':
+                return False
+            queue.get_nowait()
+            queue.task_done()
+            queue.put_nowait(item)
+        else:
+            queue.put_nowait(item)
+
+        stats['accepted'] += 1
+        stats['max_depth'] = max(stats['max_depth'], queue.qsize())
+        return True
+
+    async def run_producer(self, source):
+        """Publish every packet from a sync or async iterable (e.g. MqttMock.listen_async())."""
+        if hasattr(source, '__aiter__'):
+            async for packet in source:
+                await self.publish(packet)
+        else:
+            for packet in source:
+                await self.publish(packet)
+                await asyncio.sleep(0)  # Cede o loop aos consumidores
+
+    async def _consume(self, i):
+        queue = self._queues[i]
+        stats = self._stats[i]
+        loop = asyncio.get_running_loop()
+        while True:
+            enqueued, packet = await queue.get()
+            try:
+                if self._is_async:
+                    await self.handler(packet)
+                else:
+                    await loop.run_in_executor(self._executor, self.handler, packet)
+                stats['processed'] += 1
+            except Exception as e:
+                stats['errors'] += 1
+                print(f"Erro processando pacote de {packet.get(self.key)}: {e}")
+            finally:
+                lag = time.monotonic() - enqueued
+                stats['lag_last'] = lag
+                stats['lag_max'] = max(stats['lag_max'], lag)
+                stats['lag_total'] += lag
+                queue.task_done()
+
+    def metrics(self):
+        """Per-shard and total counters; lag is seconds from enqueue to handler completion."""
+        shards = []
+        for queue, stats in zip(self._queues, self._stats):
+            done = stats['processed'] + stats['errors']
+            shards.append({
+                'depth': queue.qsize(),
+                'max_depth': stats['max_depth'],
+                'accepted': stats['accepted'],
+                'dropped': stats['dropped'],
+                'processed': stats['processed'],
+                'errors': stats['errors'],
+                'lag_last': stats['lag_last'],
+                'lag_max': stats['lag_max'],
+                'lag_avg': stats['lag_total'] / done if done else 0.0,
+            })
+        total = {name: sum(s[name] for s in shards)
+                 for name in ('depth', 'accepted', 'dropped', 'processed', 'errors')}
+        total['lag_max'] = max((s['lag_max'] for s in shards), default=0.0)
+        total['shards'] = shards
+        return total
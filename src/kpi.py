@@ -0,0 +1,267 @@
+"""
+KPI - Acumuladores Incrementais de OEE / MTBF / MTTR
+Cada leitura atualiza, em O(1), contadores por dispositivo e por bucket de 1 hora:
+leituras rodando/paradas, transições (falhas running->parado, reparos parado->running),
+tempo rodando/parado (diferença de ts atribuída ao status anterior) e soma da vibração.
+
+Os buckets alterados ficam em memória e são gravados (UPSERT somando os deltas) depois
+do group commit, no máximo a cada KPI_FLUSH_SECONDS. As consultas somam os buckets
+gravados com os pendentes, então os KPIs de qualquer janela estão sempre em dia sem
+ler leituras (DatabaseManager.get_kpis).
+"""
+
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+BUCKET_MS = 3_600_000
+DEFAULT_MAX_GAP_MS = 300_000
+
+COUNTERS = ['readings', 'running', 'stopped', 'failures', 'repairs',
+            'uptime_ms', 'downtime_ms', 'vib_sum', 'vib_count']
+
+
+def create_kpi_tables(cursor):
+    counter_cols = ",\n".join(
+        f"            {name} {'REAL' if name == 'vib_sum' else 'INTEGER'} NOT NULL DEFAULT 0" for name in COUNTERS
+    )
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS kpi_buckets (
+            device_id TEXT NOT NULL,
+            bucket_ts INTEGER NOT NULL,
+{counter_cols},
+            PRIMARY KEY (device_id, bucket_ts)
+        ) WITHOUT ROWID
+    ''')
+    # Última leitura de cada dispositivo: transições e durações continuam após reiniciar
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS kpi_device_state (
+            device_id TEXT PRIMARY KEY,
+            last_ts INTEGER NOT NULL,
+            last_status TEXT
+        )
+    ''')
+
+
+def _upsert_sql() -> str:
+    placeholders = ", ".join("?" for _ in range(len(COUNTERS) + 2))
+    updates = ", ".join(f"{c} = {c} + excluded.{c}" for c in COUNTERS)
+    return f'''
+        INSERT INTO kpi_buckets (device_id, bucket_ts, {", ".join(COUNTERS)}) VALUES ({placeholders})
+        ON CONFLICT (device_id, bucket_ts) DO UPDATE SET {updates}
+    '''
+
+
+_STATE_SQL = '''
+    INSERT INTO kpi_device_state (device_id, last_ts, last_status) VALUES (?, ?, ?)
+    ON CONFLICT (device_id) DO UPDATE SET last_ts = excluded.last_ts, last_status = excluded.last_status
+    WHERE excluded.last_ts >= kpi_device_state.last_ts
+'''
+
+TOTALS_SQL = f'''
+    SELECT {", ".join(f"COALESCE(SUM({c}), 0)" for c in COUNTERS)}
+    FROM kpi_buckets WHERE device_id = ? AND bucket_ts BETWEEN ? AND ?
+'''
+
+
+def backfill_sql(source: str, max_gap_ms: int = DEFAULT_MAX_GAP_MS) -> str:
+    """
+    INSERT ... SELECT that accumulates an existing readings table (same rules as KpiAccumulator.add).
+    Comparisons with NULL (first reading of a device, NULL status) are NULL in SQL: the sums are
+    COALESCEd so a bucket made only of such rows still counts 0.
+    """
+    return f'''
+        INSERT INTO kpi_buckets (device_id, bucket_ts, {", ".join(COUNTERS)})
+        SELECT device_id, ts - ts % {BUCKET_MS}, COUNT(*),
+               COALESCE(SUM(status = 'running'), 0), COALESCE(SUM(status = 'parado'), 0),
+               COALESCE(SUM(prev_status = 'running' AND status = 'parado'), 0),
+               COALESCE(SUM(prev_status = 'parado' AND status = 'running'), 0),
+               SUM(CASE WHEN prev_status = 'running' AND ts - prev_ts BETWEEN 1 AND {max_gap_ms} THEN ts - prev_ts ELSE 0 END),
+               SUM(CASE WHEN prev_status = 'parado' AND ts - prev_ts BETWEEN 1 AND {max_gap_ms} THEN ts - prev_ts ELSE 0 END),
+               COALESCE(SUM(vibration), 0), COUNT(vibration)
+        FROM (
+            SELECT device_id, ts, status, vibration,
+                   LAG(status) OVER w AS prev_status, LAG(ts) OVER w AS prev_ts
+            FROM {source}
+            WINDOW w AS (PARTITION BY device_id ORDER BY ts, id)
+        )
+        GROUP BY device_id, ts - ts % {BUCKET_MS}
+        ON CONFLICT (device_id, bucket_ts) DO UPDATE SET
+            {", ".join(f"{c} = {c} + excluded.{c}" for c in COUNTERS)}
+    '''
+
+
+def state_backfill_sql(source: str) -> str:
+    """Last reading of each device in an existing readings table -> kpi_device_state."""
+    return f'''
+        INSERT INTO kpi_device_state (device_id, last_ts, last_status)
+        SELECT device_id, ts, status FROM (
+            SELECT device_id, ts, status, ROW_NUMBER() OVER (PARTITION BY device_id ORDER BY ts DESC, id DESC) AS rn
+            FROM {source}
+        ) WHERE rn = 1
+        ON CONFLICT (device_id) DO UPDATE SET last_ts = excluded.last_ts, last_status = excluded.last_status
+        WHERE excluded.last_ts >= kpi_device_state.last_ts
+    '''
+
+
+def kpis_from_totals(totals: Dict) -> Dict:
+    """
+    OEE, disponibilidade, performance, qualidade (%), MTBF e MTTR (minutos) de contadores somados.
+    Performance/qualidade seguem as fórmulas simuladas do KpiCalculator (vibração média).
+    """
+    readings = totals['readings']
+    if not readings:
+        return {'oee': 0, 'availability': 0, 'performance': 0, 'quality': 0, 'mtbf': 0, 'mttr': 0}
+    availability = totals['running'] / readings
+    avg_vib = totals['vib_sum'] / totals['vib_count'] if totals['vib_count'] else 0.0
+    performance = max(0, 1 - (avg_vib / 10))
+    quality = 0.98 if avg_vib < 5 else 0.85
+    oee = availability * performance * quality
+
+    uptime_min = totals['uptime_ms'] / 60_000
+    downtime_min = totals['downtime_ms'] / 60_000
+    mtbf = round(uptime_min / totals['failures'], 1) if totals['failures'] else round(uptime_min, 1)
+    mttr = round(downtime_min / totals['repairs'], 1) if totals['repairs'] else 0
+    return {
+        'oee': round(oee * 100, 2), 'availability': round(availability * 100, 2),
+        'performance': round(performance * 100, 2), 'quality': round(quality * 100, 2),
+        'mtbf': mtbf, 'mttr': mttr,
+    }
+
+
+class KpiAccumulator:
+    """
+    Contadores de KPI em memória, por (dispositivo, bucket).
+
+    Args:
+        flush_interval: segundos mínimos entre gravações dos buckets alterados
+        max_gap_ms: intervalos maiores que isto entre leituras (dispositivo offline)
+                    não contam como tempo rodando/parado
+    """
+
+    def __init__(self, flush_interval: float = 5.0, max_gap_ms: int = DEFAULT_MAX_GAP_MS):
+        self.flush_interval = flush_interval
+        self.max_gap_ms = max_gap_ms
+        self.lock = threading.Lock()
+        self._pending: Dict[str, Dict[int, list]] = {}         # device_id -> bucket_ts -> deltas não gravados
+        self._last: Dict[str, Tuple[int, Optional[str]]] = {}  # device_id -> (ts, status)
+        self._dirty_state = set()
+        self._in_flight = None  # (pending, dirty_state) do persist() ainda sem commit
+        self._last_flush = time.monotonic()
+
+    def load_state(self, conn):
+        """Restore the last reading of each device (call once at startup)."""
+        rows = conn.execute("SELECT device_id, last_ts, last_status FROM kpi_device_state").fetchall()
+        with self.lock:
+            for device_id, ts, status in rows:
+                self._last.setdefault(device_id, (ts, status))
+
+    def add(self, device_id: str, ts: int, status: Optional[str], vibration: Optional[float]):
+        """Account one reading: O(1)."""
+        with self.lock:
+            self._add(device_id, ts, status, vibration)
+
+    def add_many(self, rows):
+        """rows: (device_id, ts, status, vibration) tuples, under a single lock acquisition."""
+        with self.lock:
+            for device_id, ts, status, vibration in rows:
+                self._add(device_id, ts, status, vibration)
+
+    def _add(self, device_id, ts, status, vibration):
+        buckets = self._pending.get(device_id)
+        if buckets is None:
+            buckets = self._pending[device_id] = {}
+        bucket_ts = ts - ts % BUCKET_MS
+        c = buckets.get(bucket_ts)
+        if c is None:
+            c = buckets[bucket_ts] = [0] * len(COUNTERS)
+        c[0] += 1
+        if status == 'running':
+            c[1] += 1
+        elif status == 'parado':
+            c[2] += 1
+        if vibration is not None and vibration == vibration:  # NaN = sem medição
+            c[7] += vibration
+            c[8] += 1
+
+        last = self._last.get(device_id)
+        if last is not None:
+            last_ts, last_status = last
+            if ts < last_ts:
+                return  # Leitura atrasada: conta no bucket, mas não muda o estado
+            if last_status == 'running' and status == 'parado':
+                c[3] += 1
+            elif last_status == 'parado' and status == 'running':
+                c[4] += 1
+            gap = ts - last_ts
+            if 0 < gap <= self.max_gap_ms:
+                if last_status == 'running':
+                    c[5] += gap
+                elif last_status == 'parado':
+                    c[6] += gap
+        self._last[device_id] = (ts, status)
+        self._dirty_state.add(device_id)
+
+    def snapshot(self) -> Dict:
+        """Copy of the pending (not yet persisted) buckets and of the last state per device."""
+        with self.lock:
+            return {
+                'buckets': {(device_id, bucket_ts): dict(zip(COUNTERS, c))
+                            for device_id, buckets in self._pending.items() for bucket_ts, c in buckets.items()},
+                'last': dict(self._last),
+            }
+
+    def due(self) -> bool:
+        return time.monotonic() - self._last_flush >= self.flush_interval
+
+    def persist(self, conn) -> int:
+        """
+        Write the pending deltas inside the caller's transaction. The caller holds self.lock
+        until the commit, so queries never see a delta twice (pending and stored) or not at all.
+        If the transaction fails (here or at commit), the caller must call restore() before
+        releasing the lock so the deltas stay pending. Returns the number of buckets written.
+        """
+        rows = [(d, b, *c) for d, buckets in self._pending.items() for b, c in buckets.items()]
+        states = [(d, *self._last[d]) for d in self._dirty_state]
+        self._in_flight = (self._pending, self._dirty_state)
+        self._pending = {}
+        self._dirty_state = set()
+        try:
+            if rows:
+                conn.executemany(_upsert_sql(), rows)
+            if states:
+                conn.executemany(_STATE_SQL, states)
+        except BaseException:
+            self.restore()
+            raise
+        self._last_flush = time.monotonic()
+        return len(rows)
+
+    def restore(self):
+        """Put back the deltas of the last persist() whose transaction was rolled back (caller holds the lock)."""
+        if self._in_flight is None:
+            return
+        pending, dirty = self._in_flight
+        self._in_flight = None
+        for device_id, buckets in pending.items():
+            target = self._pending.setdefault(device_id, {})
+            for bucket_ts, c in buckets.items():
+                current = target.get(bucket_ts)
+                target[bucket_ts] = c if current is None else [a + b for a, b in zip(current, c)]
+        self._dirty_state |= dirty
+
+    def committed(self):
+        """Forget the deltas of the last persist() once its transaction committed (caller holds the lock)."""
+        self._in_flight = None
+
+    def pending_totals(self, device_id: str, start_ms: int, end_ms: int) -> list:
+        """Sum of the pending buckets of device_id in the window (caller holds the lock)."""
+        totals = [0] * len(COUNTERS)
+        for bucket_ts, c in self._pending.get(device_id, {}).items():
+            if start_ms <= bucket_ts <= end_ms:
+                totals = [a + b for a, b in zip(totals, c)]
+        return totals
+
+    def last_ts(self, device_id: str) -> Optional[int]:
+        last = self._last.get(device_id)
+        return last[0] if last else None
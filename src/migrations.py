@@ -0,0 +1,290 @@
+"""
+Migrations - Versionamento do Schema SQLite
+Aplica, em ordem e uma única vez, os passos de schema registrados em MIGRATIONS.
+A versão atual fica na tabela schema_version.
+"""
+
+import os
+import sqlite3
+from datetime import datetime
+from typing import Callable, List, Tuple
+
+from src.partitions import (
+    READING_COLUMNS, GRANULARITY_MS, create_readings_view, create_partition_table, partition_name
+)
+from src.rollups import METRICS, ROLLUP_RESOLUTIONS, create_rollup_table, backfill_sql
+from src.tsblock import create_blocks_table
+from src import kpi
+
+
+def _table_columns(cursor, table: str) -> List[str]:
+    cursor.execute(f"PRAGMA table_info({table})")
+    return [row[1] for row in cursor.fetchall()]
+
+
+def _add_column_if_missing(cursor, table: str, column: str, ddl: str):
+    if column not in _table_columns(cursor, table):
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+
+
+def _m001_base_schema(cursor):
+    """Tabelas originais (IF NOT EXISTS para bancos criados antes do versionamento)."""
+    # Equipment / Devices (simula Supabase/PostgreSQL)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS devices (
+            id TEXT PRIMARY KEY,
+            name TEXT,
+            type TEXT,
+            status TEXT,
+            operational_limit_temp REAL,
+            operational_limit_vibration REAL
+        )
+    ''')
+
+    # Events / Stops
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            device_id TEXT,
+            event_type TEXT,
+            timestamp DATETIME,
+            description TEXT
+        )
+    ''')
+
+    # Users / Auth
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE,
+            password_hash TEXT,
+            salt TEXT,
+            role TEXT
+        )
+    ''')
+
+    # Time series (simula TimescaleDB/InfluxDB)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sensor_readings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp DATETIME,
+            device_id TEXT,
+            temperature REAL,
+            vibration REAL,
+            pressure REAL,
+            status TEXT,
+            risk_score REAL
+        )
+    ''')
+
+    # Alerts
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS alerts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp DATETIME,
+            device_id TEXT,
+            device_name TEXT,
+            alert_level TEXT,
+            risk_score REAL,
+            temperature REAL,
+            vibration REAL,
+            pressure REAL,
+            report_text TEXT,
+            image_path TEXT,
+            notification_sent BOOLEAN DEFAULT 0,
+            resolved BOOLEAN DEFAULT 0,
+            resolved_at DATETIME,
+            resolved_by TEXT
+        )
+    ''')
+
+
+def _m002_reading_columns(cursor):
+    """risk_score e power eram adicionados sob demanda em bancos antigos."""
+    _add_column_if_missing(cursor, 'sensor_readings', 'risk_score', 'REAL')
+    _add_column_if_missing(cursor, 'sensor_readings', 'power', 'REAL DEFAULT 0')
+
+
+def _m003_query_indexes(cursor):
+    """Índices compostos para as consultas por dispositivo/tempo (ver verify_query_plans.py)."""
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_readings_device_ts ON sensor_readings (device_id, timestamp)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_alerts_resolved_device_ts ON alerts (resolved, device_id, timestamp)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_alerts_resolved_ts ON alerts (resolved, timestamp)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_alerts_device_ts ON alerts (device_id, timestamp)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_alerts_ts ON alerts (timestamp)")
+
+
+# Conversão ISO (hora local, como gravado por datetime.now().isoformat()) -> epoch ms
+_ISO_TO_EPOCH_MS = "CAST(ROUND((julianday({col}, 'utc') - 2440587.5) * 86400000) AS INTEGER)"
+
+
+def _m004_epoch_ms_readings(cursor):
+    """Leituras passam a usar ts INTEGER (epoch ms) na tabela readings; sensor_readings vira view."""
+    cursor.execute('''
+        CREATE TABLE readings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ts INTEGER NOT NULL,
+            device_id TEXT,
+            temperature REAL,
+            vibration REAL,
+            pressure REAL,
+            status TEXT,
+            risk_score REAL,
+            power REAL DEFAULT 0
+        )
+    ''')
+    ts_expr = _ISO_TO_EPOCH_MS.format(col='timestamp')
+    cursor.execute(f'''
+        INSERT INTO readings ({READING_COLUMNS})
+        SELECT id, COALESCE({ts_expr}, 0), device_id, temperature, vibration, pressure, status, risk_score, power
+        FROM sensor_readings
+    ''')
+    # Mantém a sequência de ids (mesmo de linhas apagadas) para a API continuar ordenando por id
+    cursor.execute("SELECT MAX(seq) FROM sqlite_sequence WHERE name IN ('sensor_readings', 'readings')")
+    seq = cursor.fetchone()[0]
+    cursor.execute("DELETE FROM sqlite_sequence WHERE name = 'readings'")
+    if seq:
+        cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('readings', ?)", (seq,))
+    cursor.execute("DROP TABLE sensor_readings")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_readings_device_ts ON readings (device_id, ts)")
+    create_readings_view(cursor, ['readings'])
+
+
+def _m005_partitioned_readings(cursor):
+    """Divide readings em partições temporais (READING_PARTITION=day|week) registradas em reading_partitions."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS reading_partitions (
+            name TEXT PRIMARY KEY,
+            start_ts INTEGER NOT NULL,
+            end_ts INTEGER NOT NULL
+        )
+    ''')
+    span = GRANULARITY_MS[os.getenv("READING_PARTITION", "day")]
+    cursor.execute("SELECT DISTINCT ts - ts % ? FROM readings ORDER BY 1", (span,))
+    starts = [row[0] for row in cursor.fetchall()]
+
+    names = []
+    for start in starts:
+        name = partition_name(start)
+        create_partition_table(cursor, name)
+        cursor.execute(
+            f"INSERT INTO {name} ({READING_COLUMNS}) SELECT {READING_COLUMNS} FROM readings WHERE ts >= ? AND ts < ?",
+            (start, start + span)
+        )
+        cursor.execute(
+            "INSERT INTO reading_partitions (name, start_ts, end_ts) VALUES (?, ?, ?)",
+            (name, start, start + span)
+        )
+        names.append(name)
+
+    # A partição mais nova herda a sequência de ids de readings
+    cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'readings'")
+    row = cursor.fetchone()
+    if names and row:
+        cursor.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = ?", (row[0], names[-1]))
+
+    cursor.execute("DROP TABLE readings")
+    create_readings_view(cursor, names)
+
+
+def _m006_reading_rollups(cursor):
+    """Agregados por dispositivo de 1 minuto e 1 hora, preenchidos a partir das partições existentes."""
+    cursor.execute("SELECT name FROM reading_partitions ORDER BY start_ts")
+    partitions = [row[0] for row in cursor.fetchall()]
+    for table, bucket_ms in ROLLUP_RESOLUTIONS.values():
+        create_rollup_table(cursor, table)
+        for partition in partitions:
+            cursor.execute(backfill_sql(table, bucket_ms, partition))
+
+
+def _m007_reading_blocks(cursor):
+    """Blocos comprimidos por dispositivo/hora para leituras frias (ver src/tsblock.py)."""
+    create_blocks_table(cursor)
+
+
+def _m008_kpi_buckets(cursor):
+    """Acumuladores de KPI por dispositivo/hora (ver src/kpi.py), preenchidos a partir das partições."""
+    kpi.create_kpi_tables(cursor)
+    cursor.execute("SELECT name FROM reading_partitions ORDER BY start_ts")
+    for (partition,) in cursor.fetchall():
+        cursor.execute(kpi.backfill_sql(partition))
+        cursor.execute(kpi.state_backfill_sql(partition))
+
+
+def _m009_rollup_metric_counts(cursor):
+    """
+    Contagem de valores por métrica nos rollups (média sem NULL/NaN). Os buckets ainda
+    cobertos por partições são recalculados; os mais antigos (já em blocos frios)
+    assumem que todas as leituras tinham a métrica quando a soma não é nula.
+    """
+    cursor.execute("SELECT start_ts, end_ts, name FROM reading_partitions ORDER BY start_ts")
+    partitions = cursor.fetchall()
+    for table, bucket_ms in ROLLUP_RESOLUTIONS.values():
+        missing = [m for m in METRICS if f"{m}_count" not in _table_columns(cursor, table)]
+        if not missing:
+            continue  # Criada pela v6 já com as contagens
+        for m in missing:
+            _add_column_if_missing(cursor, table, f"{m}_count", "INTEGER NOT NULL DEFAULT 0")
+            cursor.execute(f"UPDATE {table} SET {m}_count = count WHERE {m}_sum IS NOT NULL")
+        for start_ts, end_ts, partition in partitions:
+            cursor.execute(f"DELETE FROM {table} WHERE bucket_ts >= ? AND bucket_ts < ?", (start_ts, end_ts))
+            cursor.execute(backfill_sql(table, bucket_ms, partition))
+
+
+# (versão, descrição, função) - sempre acrescentar no final, nunca reordenar
+MIGRATIONS: List[Tuple[int, str, Callable]] = [
+    (1, "base schema", _m001_base_schema),
+    (2, "risk_score and power columns on sensor_readings", _m002_reading_columns),
+    (3, "composite indexes for readings and alerts", _m003_query_indexes),
+    (4, "epoch ms readings table with ISO compatibility view", _m004_epoch_ms_readings),
+    (5, "time-partitioned reading tables", _m005_partitioned_readings),
+    (6, "1-minute and 1-hour reading rollups", _m006_reading_rollups),
+    (7, "compressed cold reading blocks", _m007_reading_blocks),
+    (8, "incremental KPI buckets", _m008_kpi_buckets),
+    (9, "per-metric value counts in rollups", _m009_rollup_metric_counts),
+]
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+
+def run_migrations(conn: sqlite3.Connection) -> int:
+    """
+    Aplica as migrations pendentes, cada uma em sua própria transação.
+
+    Returns:
+        Versão do schema após a execução.
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at TEXT
+        )
+    ''')
+    conn.commit()
+
+    for version, description, migrate in MIGRATIONS:
+        if version <= get_schema_version(conn):
+            continue
+        # BEGIN IMMEDIATE serializa processos que sobem ao mesmo tempo
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if version <= get_schema_version(conn):
+                conn.rollback()
+                continue
+            cursor = conn.cursor()
+            migrate(cursor)
+            cursor.execute(
+                "INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)",
+                (version, description, datetime.now().isoformat())
+            )
+            conn.commit()
+            print(f"Schema atualizado: v{version} ({description}).")
+        except Exception:
+            conn.rollback()
+            raise
+
+    return get_schema_version(conn)
@@ -0,0 +1,235 @@
+"""
+Partitions - Particionamento Temporal das Leituras
+Cada partição é uma tabela readings_pAAAAMMDD que cobre [start_ts, end_ts) em epoch ms (UTC).
+A tabela reading_partitions registra as partições e a view sensor_readings une todas.
+A retenção apaga partições inteiras (DROP TABLE) em vez de DELETEs grandes.
+"""
+
+import bisect
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, List, Optional, Tuple
+
+DAY_MS = 86_400_000
+GRANULARITY_MS = {'day': DAY_MS, 'week': 7 * DAY_MS}
+
+# A view usa UNION ALL, limitado pelo SQLite a 500 termos; mantém só as partições mais novas
+VIEW_MAX_PARTITIONS = 400
+
+# epoch ms -> ISO local; usado na view de compatibilidade e nas leituras do DatabaseManager
+EPOCH_MS_TO_ISO = "strftime('%Y-%m-%dT%H:%M:%f', {col} / 1000.0, 'unixepoch', 'localtime')"
+
+READING_COLUMNS = "id, ts, device_id, temperature, vibration, pressure, status, risk_score, power"
+
+
+def epoch_ms_to_iso(ts: int) -> str:
+    """Python equivalent of EPOCH_MS_TO_ISO (local time, millisecond precision)."""
+    return datetime.fromtimestamp(ts / 1000).strftime('%Y-%m-%dT%H:%M:%S.') + f"{ts % 1000:03d}"
+
+
+def to_epoch_ms(value) -> int:
+    """Convert an ISO string, datetime or epoch ms value to integer epoch milliseconds."""
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return int(value.timestamp() * 1000)
+
+
+def create_readings_view(cursor, tables: List[str]):
+    """(Re)cria a view sensor_readings, que expõe timestamp ISO para consumidores antigos (API NestJS)."""
+    cursor.execute("DROP VIEW IF EXISTS sensor_readings")
+    tables = tables[-VIEW_MAX_PARTITIONS:]
+    if not tables:
+        # Sem partições ainda: view vazia com as mesmas colunas
+        cursor.execute(
+            "CREATE VIEW sensor_readings AS SELECT NULL AS id, NULL AS timestamp, NULL AS device_id, "
+            "NULL AS temperature, NULL AS vibration, NULL AS pressure, NULL AS status, "
+            "NULL AS risk_score, NULL AS power, NULL AS ts WHERE 0"
+        )
+        return
+    selects = [
+        f"SELECT id, {EPOCH_MS_TO_ISO.format(col='ts')} AS timestamp, device_id, temperature, vibration, "
+        f"pressure, status, risk_score, power, ts FROM {table}"
+        for table in tables
+    ]
+    cursor.execute("CREATE VIEW sensor_readings AS " + " UNION ALL ".join(selects))
+
+
+def partition_bounds(ts: int, span_ms: int) -> Tuple[int, int]:
+    start = ts - ts % span_ms
+    return start, start + span_ms
+
+
+def partition_name(start_ts: int) -> str:
+    day = datetime.fromtimestamp(start_ts / 1000, tz=timezone.utc)
+    return f"readings_p{day:%Y%m%d}"
+
+
+def create_partition_table(cursor, name: str, seq: int = 0):
+    """Cria a tabela e o índice (device_id, ts) de uma partição."""
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS {name} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ts INTEGER NOT NULL,
+            device_id TEXT,
+            temperature REAL,
+            vibration REAL,
+            pressure REAL,
+            status TEXT,
+            risk_score REAL,
+            power REAL DEFAULT 0
+        )
+    ''')
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{name}_device_ts ON {name} (device_id, ts)")
+    # Continua a sequência de ids da partição anterior (a API ordena a view por id)
+    cursor.execute("SELECT COUNT(*) FROM sqlite_sequence WHERE name = ?", (name,))
+    if seq and not cursor.fetchone()[0]:
+        cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)", (name, seq))
+
+
+def current_sequence(cursor) -> int:
+    cursor.execute("SELECT MAX(seq) FROM sqlite_sequence WHERE name LIKE 'readings_p%'")
+    return cursor.fetchone()[0] or 0
+
+
+def list_partitions(cursor) -> List[Tuple[int, int, str]]:
+    cursor.execute("SELECT start_ts, end_ts, name FROM reading_partitions ORDER BY start_ts")
+    return [tuple(row) for row in cursor.fetchall()]
+
+
+class ReadingPartitions:
+    """
+    Roteia leituras para a partição do seu ts e resolve quais partições uma consulta precisa.
+    O registro em memória é recarregado quando outro processo/conexão altera o schema.
+    """
+
+    def __init__(self, connect: Callable, span_ms: int = DAY_MS, retention_days: int = 0):
+        self._connect = connect
+        self.span_ms = span_ms
+        self.retention_days = retention_days
+
+        self._lock = threading.Lock()
+        self._partitions: List[Tuple[int, int, str]] = []  # (start_ts, end_ts, name) ordenado
+        self._starts: List[int] = []
+        self._schema_version = None
+        # Chamado a cada partição nova, depois da retenção (ex: compactação fria do DatabaseManager)
+        self.on_rollover: Optional[Callable[[], None]] = None
+
+    def refresh(self, force: bool = False):
+        """Reload the registry if the database schema changed since the last load."""
+        conn = self._connect()
+        version = conn.execute("PRAGMA schema_version").fetchone()[0]
+        if not force and version == self._schema_version:
+            return
+        partitions = list_partitions(conn.cursor())
+        with self._lock:
+            self._partitions = partitions
+            self._starts = [p[0] for p in partitions]
+            self._schema_version = version
+
+    def _find(self, ts: int) -> Optional[Tuple[int, int, str]]:
+        with self._lock:
+            i = bisect.bisect_right(self._starts, ts) - 1
+            if i >= 0:
+                partition = self._partitions[i]
+                if partition[0] <= ts < partition[1]:
+                    return partition
+        return None
+
+    def retention_cutoff(self, now_ms: Optional[int] = None) -> Optional[int]:
+        """Partitions ending at or before this epoch ms are dropped by retention (None = no retention)."""
+        if not self.retention_days:
+            return None
+        if now_ms is None:
+            now_ms = int(time.time() * 1000)
+        return now_ms - self.retention_days * DAY_MS
+
+    def table_for(self, ts: int) -> Optional[str]:
+        """
+        Partition table for a timestamp, created on first use (must run outside a write transaction).
+        Returns None when the reading falls in a partition that retention drops: the caller skips it.
+        """
+        partition = self._find(ts)
+        if partition is None:
+            self.refresh()
+            partition = self._find(ts)
+        cutoff = self.retention_cutoff()
+        if partition is not None:
+            return None if cutoff is not None and partition[1] <= cutoff else partition[2]
+        return self._create(ts, cutoff)
+
+    def _create(self, ts: int, cutoff: Optional[int] = None) -> Optional[str]:
+        start, end = partition_bounds(ts, self.span_ms)
+        # Não sobrepõe partições existentes criadas com outra granularidade
+        with self._lock:
+            i = bisect.bisect_right(self._starts, ts)
+            if i > 0:
+                start = max(start, self._partitions[i - 1][1])
+            if i < len(self._partitions):
+                end = min(end, self._partitions[i][0])
+        if cutoff is not None and end <= cutoff:
+            return None  # Seria apagada pela retenção logo em seguida
+        name = partition_name(start)
+
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            cursor = conn.cursor()
+            create_partition_table(cursor, name, current_sequence(cursor))
+            cursor.execute(
+                "INSERT OR IGNORE INTO reading_partitions (name, start_ts, end_ts) VALUES (?, ?, ?)",
+                (name, start, end)
+            )
+            create_readings_view(cursor, [p[2] for p in list_partitions(cursor)])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        self.refresh(force=True)
+
+        # Rollover: aproveita para aplicar a retenção (mesmo corte usado acima) e a compactação
+        self.drop_expired(None if cutoff is None else cutoff + self.retention_days * DAY_MS)
+        if self.on_rollover is not None:
+            self.on_rollover()
+        return name
+
+    def tables_newest_first(self) -> List[str]:
+        self.refresh()
+        with self._lock:
+            return [p[2] for p in reversed(self._partitions)]
+
+    def tables_for_range(self, start_ts: int, end_ts: int) -> List[str]:
+        """Partitions overlapping [start_ts, end_ts], oldest first."""
+        self.refresh()
+        with self._lock:
+            return [name for start, end, name in self._partitions if start <= end_ts and end > start_ts]
+
+    def drop_expired(self, now_ms: Optional[int] = None) -> List[str]:
+        """Drop whole partitions older than retention_days. Returns the dropped table names."""
+        cutoff = self.retention_cutoff(now_ms)
+        if cutoff is None:
+            return []
+
+        self.refresh()
+        with self._lock:
+            expired = [name for _, end, name in self._partitions if end <= cutoff]
+        if not expired:
+            return []
+
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            cursor = conn.cursor()
+            for name in expired:
+                cursor.execute(f"DROP TABLE IF EXISTS {name}")
+                cursor.execute("DELETE FROM reading_partitions WHERE name = ?", (name,))
+            create_readings_view(cursor, [p[2] for p in list_partitions(cursor)])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        self.refresh(force=True)
+        print(f"Retenção: {len(expired)} partição(ões) de leituras removida(s).")
+        return expired
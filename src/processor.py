@@ -1,55 +1,178 @@
 import logging
+import os
+import random
+import threading
+from datetime import datetime
+
+import numpy as np
 from src.analytics import KpiCalculator, FailurePredictor
-import pandas as pd
+from src.ingestion import packet_ts, validate_packet
+from src.reading_cache import COLUMNS, DeviceRingBuffer
+
+# Pontos da regressão do RUL (FailurePredictor.predict_failure_risk usa as últimas 5 leituras)
+RUL_POINTS = 5
 
 class DataProcessor:
-    def __init__(self, db_manager):
+    def __init__(self, db_manager, window_size=None):
         self.db = db_manager
         self.kpi = KpiCalculator(db_manager)
         self.predictor = FailurePredictor()
-        
+
+        # Estado por dispositivo: janela das últimas N leituras e os escores da mais recente.
+        # Previsão, RUL e alertas leem daqui, sem consultar o banco por pacote.
+        if window_size is None:
+            window_size = int(os.getenv("PROCESSOR_WINDOW_SIZE", "20"))
+        self.window_size = max(window_size, RUL_POINTS)
+        self._windows = {}   # device_id -> DeviceRingBuffer
+        self._scores = {}    # device_id -> (risk, rul, waste) da última leitura
+        self._state_lock = threading.Lock()
+
         self.logger = logging.getLogger("Processor")
         logging.basicConfig(level=logging.INFO)
 
+    def get_window(self, device_id, n=None):
+        """
+        Last n readings seen by this processor (default: the whole window), newest first,
+        as NumPy columns like DatabaseManager.get_recent_window. Copies: safe to keep.
+        """
+        n = self.window_size if n is None else n
+        with self._state_lock:
+            window = self._windows.get(device_id)
+            if window is None:
+                return {name: np.empty(0, dtype=dtype) for name, dtype in COLUMNS.items()}
+            return {name: values.copy() for name, values in window.latest(n).items()}
+
+    def get_scores(self, device_id):
+        """(risk, rul, waste) of the latest reading of device_id, or None if not seen yet."""
+        return self._scores.get(device_id)
+
+    def _warm_windows(self, device_ids):
+        """
+        Create the windows of devices seen for the first time, warmed from their recent readings.
+        The database is read outside the state lock; if another batch created the window
+        meanwhile, that one wins (check-then-set under the lock).
+        """
+        with self._state_lock:
+            missing = [d for d in device_ids if d not in self._windows]
+        for device_id in missing:
+            window = DeviceRingBuffer(self.window_size)
+            recent = self.db.get_recent_window(device_id, self.window_size)
+            rows = [dict(zip(recent, values)) for values in zip(*recent.values())]
+            window.load(rows[::-1], has_all=True)
+            with self._state_lock:
+                self._windows.setdefault(device_id, window)
+
     def process_packet(self, packet):
-        # 1. Validação (verificação simples)
-        if 'temperature' not in packet or 'device_id' not in packet:
-            self.logger.warning("Pacote inválido recebido")
-            return
-
-        # 2. Analytics / IA - Calcular Risco ANTES de salvar
-        # Para precisão, deveríamos pegar hitórico + atual. 
-        # Simplificação: Usar apenas dados atuais para o modelo simples ou buscar histórico rápido.
-        # O modelo espera um DataFrame.
-        recent_df = self.db.get_recent_readings(packet['device_id'], limit=20)
-        # Adicionar o atual no topo (simulação rápida de append) se necessário, 
-        # mas como o modelo usa apenas o ultimo (iloc[0]), podemos montar um DF só com o atual se o histórico não for crucial para features de janela.
-        # O analytics.py atual usa apenas iloc[0].
-        
-        current_df = pd.DataFrame([packet])
-        risk, rul, waste = self.predictor.predict_failure_risk(current_df)
-        packet['risk_score'] = float(risk)
-        packet['predicted_rul'] = float(rul)
-        packet['energy_waste'] = float(waste)
-
-        # 3. Armazenar Tempo Real (agora com risk_score)
-        self.db.save_reading(packet)
-
-        # 4. Lógica de Verificação / Detecção de Parada
-        if packet['status'] == 'parado':
-            self.logger.info(f"PARADA DETECTADA em {packet['device_id']}!")
-            self.db.log_event(packet['device_id'], 'PARADA', f"Máquina parada. Temp: {packet['temperature']}")
-            
-        if risk > 0.7:
-             self.logger.warning(f"ALTO RISCO DE FALHA em {packet['device_id']}: {risk*100:.1f}%")
-             # Opcional: logar evento de alerta também
-             # self.db.log_event(packet['device_id'], 'ALERTA', f"Alto risco de falha: {risk}")
-
-        # 5. Calcular OEE (Apenas para logar ocasionalmente)
-        if  random.randint(0, 100) < 5: # 5% de chance de logar OEE no console para não spamar
-             oee, _, _, _ = self.kpi.calculate_oee(packet['device_id'])
-             mtbf = self.kpi.calculate_mtbf(packet['device_id'])
-             mttr = self.kpi.calculate_mttr(packet['device_id'])
-             self.logger.info(f"KPIs {packet['device_id']}: OEE={oee}% | MTBF={mtbf}m | MTTR={mttr}m")
-
-import random # re-import for the random check
+        """Single-packet entry point (a batch of one)."""
+        self.process_packets([packet])
+
+    def process_packets(self, packets):
+        """
+        Processa um lote de pacotes: validação vetorizada, uma única chamada ao modelo e
+        gravação em bloco (leituras no write buffer, eventos numa transação).
+        packets: lista de dicts ou dict de colunas (ex: FleetSimulator.generate_tick()).
+        Retorna os pacotes válidos, com risk_score/predicted_rul/energy_waste preenchidos.
+        """
+        # 1. Validação de todos os pacotes antes de mudar qualquer estado: só os inválidos são descartados
+        columns = None
+        if isinstance(packets, dict):
+            columns = packets
+            packets = _packets_from_columns(columns)
+        valid, reason = [], None
+        for packet in packets:
+            problem = validate_packet(packet)
+            if problem is None:
+                valid.append(packet)
+            elif reason is None:
+                reason = problem
+        if len(valid) < len(packets):
+            self.logger.warning(f"Pacote inválido recebido ({len(packets) - len(valid)} no lote, ex: {reason})")
+            columns = None  # As colunas não estão mais alinhadas com os pacotes
+        packets = valid
+        if not packets:
+            return []
+
+        def column(name):
+            if columns is not None and name in columns:
+                return np.asarray(columns[name], dtype=np.float64)
+            return np.array([p.get(name) for p in packets], dtype=np.float64)  # None -> NaN
+
+        # 2. Analytics / IA - Calcular Risco ANTES de salvar (um predict_proba para o lote todo)
+        # O modelo usa só a leitura atual; o RUL usa a tendência da janela (passo 3).
+        risk, rul, waste = self.predictor.predict_batch(column('temperature'), column('vibration'), column('power'))
+        for packet, r, w in zip(packets, risk.tolist(), waste.tolist()):
+            packet['risk_score'] = r
+            packet['energy_waste'] = w
+
+        # 3. Últimas RUL_POINTS vibrações de cada pacote: janela atual + pacotes anteriores do
+        # mesmo dispositivo no lote. As janelas só mudam depois que o lote foi enfileirado.
+        device_ids = list(dict.fromkeys(p['device_id'] for p in packets))
+        self._warm_windows(device_ids)
+        with self._state_lock:
+            recent = {d: self._windows[d].latest(RUL_POINTS)['vibration'][::-1].tolist() for d in device_ids}
+        rows = [_window_row(packet) for packet in packets]
+        history = np.full((len(packets), RUL_POINTS), np.nan)
+        for i, row in enumerate(rows):
+            vib = recent[row['device_id']]
+            vib.append(np.nan if row['vibration'] is None else row['vibration'])
+            del vib[:-RUL_POINTS]
+            history[i, RUL_POINTS - len(vib):] = vib
+        # rul == 0 marca leituras que o modelo não conseguiu avaliar (mesmo resultado do caminho antigo)
+        rul = np.where(rul > 0, self.predictor.estimate_rul_batch(history), rul)
+        for packet, u in zip(packets, rul.tolist()):
+            packet['predicted_rul'] = u
+
+        # 4. Armazenar Tempo Real (agora com risk_score) - gravado em lote pelo write buffer.
+        # Se falhar, janelas e escores continuam como antes do lote.
+        self.db.queue_readings(packets)
+        with self._state_lock:
+            for packet, row, r, u, w in zip(packets, rows, risk.tolist(), rul.tolist(), waste.tolist()):
+                self._windows[packet['device_id']].append(row)
+                self._scores[packet['device_id']] = (r, u, w)
+
+        # 5. Lógica de Verificação / Detecção de Parada
+        events = []
+        for packet in packets:
+            if packet['status'] == 'parado':
+                self.logger.info(f"PARADA DETECTADA em {packet['device_id']}!")
+                events.append((packet['device_id'], 'PARADA', f"Máquina parada. Temp: {packet['temperature']}"))
+        self.db.log_events(events)
+
+        for i in np.flatnonzero(risk > 0.7):
+            self.logger.warning(f"ALTO RISCO DE FALHA em {packets[i]['device_id']}: {risk[i]*100:.1f}%")
+            # Opcional: logar evento de alerta também
+
+        # 6. Calcular OEE (Apenas para logar ocasionalmente)
+        # 5% de chance por pacote de logar OEE no console para não spamar (no máximo uma vez por dispositivo no lote)
+        sampled = {p['device_id'] for p in packets if random.randint(0, 100) < 5}
+        for device_id in sampled:
+            k = self.kpi.calculate_kpis(device_id)
+            self.logger.info(f"KPIs {device_id}: OEE={k['oee']}% | MTBF={k['mtbf']}m | MTTR={k['mttr']}m")
+
+        return packets
+
+
+def _window_row(packet):
+    row = {name: packet.get(name) for name in COLUMNS}
+    if row['ts'] is None:
+        row['ts'] = packet_ts(packet)
+    return row
+
+
+def _iso(ts):
+    # ts inválido fica sem timestamp; validate_packet descarta o pacote depois
+    try:
+        return datetime.fromtimestamp(ts / 1000).isoformat()
+    except (TypeError, ValueError, OverflowError, OSError):
+        return None
+
+
+def _packets_from_columns(columns):
+    """Dict of columns -> packet dicts (the write buffer and cache work on dicts)."""
+    names = list(columns)
+    values = [np.asarray(columns[name]).tolist() for name in names]
+    if 'timestamp' not in columns and 'ts' in columns:
+        # Mesmo formato dos pacotes do simulador (eventos, relatórios e CSV usam o ISO)
+        names.append('timestamp')
+        values.append([_iso(ts) for ts in values[names.index('ts')]])
+    return [dict(zip(names, row)) for row in zip(*values)]
@@ -0,0 +1,169 @@
+"""
+Reading Cache - Ring Buffers em Memória das Leituras Recentes
+Mantém as últimas N leituras de cada dispositivo em arrays NumPy (uma coluna por métrica),
+populados na escrita. As consultas de leituras recentes viram um slice de memória.
+"""
+
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from src.partitions import epoch_ms_to_iso
+
+# coluna -> dtype; 'timestamp' é o ISO local gerado de ts (mesmo formato de EPOCH_MS_TO_ISO) e
+# 'id' o id do banco, ou -1 para leituras enfileiradas que ainda não têm id (ainda não gravadas)
+COLUMNS = {
+    'id': np.int64,
+    'ts': np.int64,
+    'timestamp': object,
+    'device_id': object,
+    'temperature': np.float64,
+    'vibration': np.float64,
+    'pressure': np.float64,
+    'status': object,
+    'risk_score': np.float64,
+    'power': np.float64,
+}
+
+# Valor usado quando a coluna vem nula (ex: risk_score NULL no banco)
+_MISSING = {name: (np.nan if dtype is np.float64 else (-1 if dtype is np.int64 else None))
+            for name, dtype in COLUMNS.items()}
+
+
+class DeviceRingBuffer:
+    """
+    Ring buffer de capacidade fixa para um dispositivo.
+    Cada valor é gravado em duas posições (i e i + capacity), assim qualquer janela
+    das últimas n leituras é um slice contíguo, sem cópia.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.columns = {name: np.empty(2 * capacity, dtype=dtype) for name, dtype in COLUMNS.items()}
+        self.pos = 0        # próxima posição de escrita (0..capacity-1)
+        self.count = 0      # leituras válidas (<= capacity)
+        self.warm = False   # True depois de carregado do banco
+        self.has_all = False  # True se o banco tinha menos que capacity leituras ao aquecer
+
+    def append(self, row: Dict):
+        ts = row['ts']
+        if self.count and ts < self.columns['ts'][self.pos + self.capacity - 1]:
+            # Fora de ordem (ex: backfill): a janela deixa de ser confiável, recarrega do banco
+            self.warm = False
+        if self.count == self.capacity:
+            self.has_all = False  # A leitura mais antiga vai ser sobrescrita
+        i, j = self.pos, self.pos + self.capacity
+        for name, arr in self.columns.items():
+            value = row.get(name)
+            arr[i] = arr[j] = _MISSING[name] if value is None else value
+        self.pos = (self.pos + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def load(self, rows_oldest_first: List[Dict], has_all: bool):
+        """Replace the contents with rows read from the database."""
+        self.pos = 0
+        self.count = 0
+        for row in rows_oldest_first[-self.capacity:]:
+            self.append(row)
+        self.warm = True
+        self.has_all = has_all
+
+    def can_serve(self, n: int) -> bool:
+        return self.warm and (n <= self.count or self.has_all)
+
+    def latest(self, n: int) -> Dict[str, np.ndarray]:
+        """
+        Last n readings, newest first, as array views (no copy): valid only until the next
+        append, so callers must own the buffer or hold the lock that guards it.
+        """
+        n = min(n, self.count)
+        end = self.pos + self.capacity
+        return {name: arr[end - n:end][::-1] for name, arr in self.columns.items()}
+
+
+class RecentReadingsCache:
+    """
+    Cache de leituras recentes por dispositivo.
+    Assume que este processo é o único que escreve as leituras dos seus dispositivos.
+    """
+
+    def __init__(self, capacity: int = 1000):
+        self.capacity = capacity
+        self._buffers: Dict[str, DeviceRingBuffer] = {}
+        self._appended: Dict[str, int] = {}  # device_id -> leituras já anexadas (ver warm)
+        self._lock = threading.Lock()
+
+    def append(self, reading: Dict, ts: int):
+        """Populate on write (readings still in the write buffer are already visible here)."""
+        self.extend([reading], [ts])
+
+    def extend(self, readings: List[Dict], ts: List[int]):
+        """append() for a batch, under a single lock acquisition."""
+        with self._lock:
+            for reading, reading_ts in zip(readings, ts):
+                row = dict(reading, ts=reading_ts, timestamp=epoch_ms_to_iso(reading_ts))
+                row.setdefault('id', -1)
+                row.setdefault('risk_score', 0.0)
+                row.setdefault('power', 0.0)
+                device_id = reading['device_id']
+                buffer = self._buffers.get(device_id)
+                if buffer is None:
+                    buffer = self._buffers[device_id] = DeviceRingBuffer(self.capacity)
+                buffer.append(row)
+                self._appended[device_id] = self._appended.get(device_id, 0) + 1
+
+    def latest(self, device_id: str, n: int) -> Optional[Dict[str, np.ndarray]]:
+        """
+        Cached window or None when the database must be consulted (cold cache or n too large).
+        The columns are copied under the lock: concurrent appends cannot tear a returned row.
+        """
+        with self._lock:
+            buffer = self._buffers.get(device_id)
+            if buffer is None or not buffer.can_serve(n):
+                return None
+            return {name: values.copy() for name, values in buffer.latest(n).items()}
+
+    def version(self, device_id: str) -> int:
+        """Append counter of device_id: take it before querying the database for warm()."""
+        with self._lock:
+            return self._appended.get(device_id, 0)
+
+    def warm(self, device_id: str, rows_newest_first: List[Dict], since: int):
+        """
+        Fill the buffer with rows read from the database. Readings appended after version()
+        returned `since` may be missing from those rows: they are kept and merged by ts
+        (the ones that did reach the database are not duplicated).
+        """
+        with self._lock:
+            buffer = self._buffers.get(device_id)
+            if buffer is None:
+                buffer = self._buffers[device_id] = DeviceRingBuffer(self.capacity)
+            rows = rows_newest_first[::-1]
+            appended = min(self._appended.get(device_id, 0) - since, buffer.count)
+            if appended > 0:
+                stored = {_row_key(row) for row in rows}
+                recent = buffer.latest(appended)
+                extra = [row for row in (dict(zip(recent, values)) for values in zip(*recent.values()))
+                         if _row_key(row) not in stored]
+                rows = sorted(rows + extra[::-1], key=lambda row: row['ts'])  # Estável: empates na ordem original
+            has_all = len(rows_newest_first) < self.capacity and len(rows) <= self.capacity
+            buffer.load(rows, has_all=has_all)
+
+    def invalidate(self, device_id: Optional[str] = None):
+        with self._lock:
+            if device_id is None:
+                self._buffers.clear()
+            else:
+                self._buffers.pop(device_id, None)
+
+
+def _row_key(row: Dict):
+    """Identity of a reading across the cache and the database (the cache has no id for buffered rows)."""
+    key = []
+    for name in ('ts', 'temperature', 'vibration', 'pressure', 'status'):
+        value = row.get(name)
+        if isinstance(value, float) and value != value:
+            value = None  # NaN (cache) == NULL (banco)
+        key.append(value.item() if isinstance(value, np.generic) else value)
+    return tuple(key)
@@ -0,0 +1,280 @@
+"""
+Replay - Reprocessamento de Histórico
+Reenvia leituras gravadas (banco, CSV ou Data Lake Parquet) em ordem de ts pelo
+DataProcessor e pelo AlertManager, num banco de rascunho separado, em múltiplos do
+tempo real ou na velocidade máxima. Serve para avaliar mudanças de modelo/limiares
+e como benchmark ponta a ponta.
+
+Uso:
+    python -m src.replay smart_factory.db --scratch replay.db --speed 60
+    python -m src.replay history_data/sensor_history --source parquet --start 2026-01-01T00:00:00
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime
+from typing import Dict, Iterator, Optional
+
+import numpy as np
+
+from src.alert_manager import AlertManager, AlertLevel
+from src.backfill import DEFAULT_CHUNK_SIZE, detect_source, iter_csv
+from src.database import DatabaseManager
+from src.datalake import PYARROW_AVAILABLE
+from src.partitions import list_partitions, to_epoch_ms
+from src.processor import DataProcessor
+from src.tsblock import decode_block
+
+if PYARROW_AVAILABLE:
+    import pyarrow.dataset as ds
+    from src.datalake import DataLakeReader
+
+PACKET_FIELDS = ['device_id', 'ts', 'temperature', 'vibration', 'pressure', 'power', 'status']
+
+
+def _packet(device_id, ts, temperature, vibration, pressure, power, status) -> Dict:
+    """Same dict layout as SensorSimulator.generate_packet."""
+    return {
+        'device_id': device_id,
+        'timestamp': datetime.fromtimestamp(ts / 1000).isoformat(),
+        'ts': ts,
+        'temperature': temperature,
+        'vibration': vibration,
+        'pressure': pressure,
+        'power': power,
+        'status': status,
+    }
+
+
+def _in_range(ts, start_ms, end_ms):
+    return (start_ms is None or ts >= start_ms) and (end_ms is None or ts <= end_ms)
+
+
+def replay_database(path: str, start=None, end=None) -> Iterator[Dict]:
+    """Readings of a smart_factory database: cold blocks first, then the partitions, in ts order."""
+    start_ms = to_epoch_ms(start) if start is not None else None
+    end_ms = to_epoch_ms(end) if end is not None else None
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        if 'reading_partitions' not in tables:
+            raise RuntimeError(f"{path} não está no schema atual; abra-o uma vez com DatabaseManager para migrar")
+
+        if 'reading_blocks' in tables:
+            buckets = [row[0] for row in conn.execute("SELECT DISTINCT bucket_ts FROM reading_blocks ORDER BY bucket_ts")]
+            for bucket_ts in buckets:
+                blocks = conn.execute(
+                    "SELECT device_id, data FROM reading_blocks WHERE bucket_ts = ?", (bucket_ts,)
+                ).fetchall()
+                # Uma hora de todos os dispositivos, intercalada por ts
+                decoded = []
+                for device_id, blob in blocks:
+                    cols = decode_block(blob)
+                    cols['device_id'] = np.full(len(cols['ts']), device_id, dtype=object)
+                    decoded.append(cols)
+                cols = {name: np.concatenate([d[name] for d in decoded]) for name in decoded[0]}
+                order = np.argsort(cols['ts'], kind='stable')
+                rows = zip(*(cols[name][order].tolist() for name in PACKET_FIELDS))
+                for device_id, ts, temp, vib, pressure, power, status in rows:
+                    if _in_range(ts, start_ms, end_ms):
+                        yield _packet(device_id, ts, *(None if v != v else v for v in (temp, vib, pressure, power)), status)
+
+        for start_ts, end_ts, table in list_partitions(conn.cursor()):
+            if (end_ms is not None and start_ts > end_ms) or (start_ms is not None and end_ts <= start_ms):
+                continue
+            cursor = conn.execute(
+                f"SELECT {', '.join(PACKET_FIELDS)} FROM {table} "
+                "WHERE ts BETWEEN ? AND ? ORDER BY ts, id",
+                (start_ms if start_ms is not None else start_ts, end_ms if end_ms is not None else end_ts)
+            )
+            for row in cursor:
+                yield _packet(*row)
+    finally:
+        conn.close()
+
+
+def replay_csv(path: str, start=None, end=None, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Dict]:
+    """CSV history (as written by save_historical), assumed to be appended in time order."""
+    start_ms = to_epoch_ms(start) if start is not None else None
+    end_ms = to_epoch_ms(end) if end is not None else None
+    for rows in iter_csv(path, chunk_size):
+        rows.sort(key=lambda r: r[0])
+        for ts, device_id, temp, vib, pressure, status, _risk, power in rows:
+            if _in_range(ts, start_ms, end_ms):
+                yield _packet(device_id, ts, temp, vib, pressure, power, status)
+
+
+def replay_parquet(path: str, start=None, end=None) -> Iterator[Dict]:
+    """Data Lake directory: one date partition at a time (every device), sorted by ts."""
+    if not PYARROW_AVAILABLE:
+        raise RuntimeError("Replay de Parquet requer pyarrow")
+    start_ms = to_epoch_ms(start) if start is not None else None
+    end_ms = to_epoch_ms(end) if end is not None else None
+    dates = sorted(name.split('=', 1)[1] for name in os.listdir(path) if name.startswith('date='))
+    reader = DataLakeReader(path)
+    for date in dates:
+        expr = ds.field('date') == date
+        if start_ms is not None:
+            expr = expr & (ds.field('ts') >= start_ms)
+        if end_ms is not None:
+            expr = expr & (ds.field('ts') <= end_ms)
+        table = reader.dataset().to_table(columns=PACKET_FIELDS, filter=expr).sort_by('ts')
+        cols = table.to_pydict()
+        for row in zip(*(cols[name] for name in PACKET_FIELDS)):
+            yield _packet(*row)
+
+
+def open_source(path: str, source: str = 'auto', start=None, end=None) -> Iterator[Dict]:
+    kind = source
+    if source == 'auto':
+        kind = 'database' if detect_source(path) == 'legacy' else detect_source(path)
+    if kind == 'database':
+        return replay_database(path, start, end)
+    if kind == 'csv':
+        return replay_csv(path, start, end)
+    if kind == 'parquet':
+        return replay_parquet(path, start, end)
+    raise ValueError(f"Origem inválida: {kind} (use database, csv ou parquet)")
+
+
+def paced(packets: Iterator[Dict], speed: Optional[float]) -> Iterator[Dict]:
+    """Yield packets at speed x real time (by their ts); None = as fast as possible."""
+    if not speed:
+        yield from packets
+        return
+    first_ts = None
+    started = time.monotonic()
+    for packet in packets:
+        if first_ts is None:
+            first_ts = packet['ts']
+        delay = (packet['ts'] - first_ts) / 1000 / speed - (time.monotonic() - started)
+        if delay > 0:
+            time.sleep(delay)
+        yield packet
+
+
+class ReplayEngine:
+    """
+    Roda DataProcessor (+ AlertManager) sobre um fluxo de pacotes históricos,
+    gravando tudo num banco de rascunho. O AlertManager usa o horário das leituras
+    como relógio, então cooldowns se comportam como na produção.
+    """
+
+    def __init__(self, scratch_path: str, devices: Optional[Dict[str, dict]] = None, alerts: bool = True,
+                 history_path: Optional[str] = None):
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(scratch_path + suffix):
+                os.remove(scratch_path + suffix)
+        self.db = DatabaseManager(scratch_path, history_path or scratch_path + "_history")
+        self.processor = DataProcessor(self.db)
+        self.alerts = alerts
+        self._now = datetime.now()
+        self.alert_manager = AlertManager(self.db, self.processor.predictor, clock=lambda: self._now,
+                                          state=self.processor)
+
+        self.devices = dict(devices or {})
+        for device_id, info in self.devices.items():
+            self._register(device_id, info)
+
+        self.packets = 0
+        self.alert_counts = {'pre_alert': 0, 'critical': 0}
+        self.first_ts = None
+        self.last_ts = None
+        self.elapsed = 0.0
+
+    def _register(self, device_id, info):
+        self.db.register_device(device_id, info.get('name', device_id), info.get('type', 'replay'), {
+            'temp': info.get('operational_limit_temp', 100),
+            'vib': info.get('operational_limit_vibration', 10),
+        })
+        self.devices[device_id] = info
+
+    def run(self, packets: Iterator[Dict], speed: Optional[float] = None, limit: Optional[int] = None):
+        started = time.perf_counter()
+        try:
+            for packet in paced(packets, speed):
+                device_id = packet['device_id']
+                if device_id not in self.devices:
+                    self._register(device_id, {})
+                self._now = datetime.fromtimestamp(packet['ts'] / 1000)
+                if self.first_ts is None:
+                    self.first_ts = packet['ts']
+                self.last_ts = packet['ts']
+
+                self.processor.process_packet(packet)
+                if self.alerts:
+                    level, alert_data = self.alert_manager.check_alert_conditions(device_id)
+                    if level != AlertLevel.NORMAL and alert_data:
+                        self.alert_counts[level.value] += 1
+                        self.db.save_alert(alert_data, self.alert_manager.generate_report(alert_data))
+
+                self.packets += 1
+                if limit is not None and self.packets >= limit:
+                    break
+        finally:
+            self.db.flush_readings()
+            self.elapsed = time.perf_counter() - started
+        return self.report()
+
+    def report(self) -> Dict:
+        span = (self.last_ts - self.first_ts) / 1000 if self.packets else 0.0
+        return {
+            'packets': self.packets,
+            'elapsed_s': self.elapsed,
+            'packets_per_s': self.packets / self.elapsed if self.elapsed else 0.0,
+            'simulated_span_s': span,
+            'speedup': span / self.elapsed if self.elapsed else 0.0,
+            'alerts': dict(self.alert_counts),
+        }
+
+    def close(self):
+        self.db.close()
+
+
+def load_devices(path: str) -> Dict[str, dict]:
+    """Device registry of a source database (empty for CSV/Parquet sources)."""
+    if not os.path.isfile(path) or path.lower().endswith('.csv'):
+        return {}
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        conn.row_factory = sqlite3.Row
+        return {row['id']: dict(row) for row in conn.execute("SELECT * FROM devices")}
+    except sqlite3.Error:
+        return {}
+    finally:
+        conn.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay de leituras históricas pelo pipeline.")
+    parser.add_argument('path', help="Banco smart_factory, CSV ou diretório Parquet")
+    parser.add_argument('--source', choices=['auto', 'database', 'csv', 'parquet'], default='auto')
+    parser.add_argument('--scratch', default="replay_scratch.db", help="Banco de rascunho (recriado)")
+    parser.add_argument('--speed', type=float, default=0,
+                        help="Múltiplo do tempo real (0 = o mais rápido possível)")
+    parser.add_argument('--start', default=None, help="Início (ISO)")
+    parser.add_argument('--end', default=None, help="Fim (ISO)")
+    parser.add_argument('--limit', type=int, default=None, help="Máximo de pacotes")
+    parser.add_argument('--no-alerts', action='store_true', help="Não roda o AlertManager")
+    args = parser.parse_args(argv)
+
+    if os.path.abspath(args.scratch) == os.path.abspath(args.path):
+        parser.error("--scratch não pode ser o banco de origem")
+
+    engine = ReplayEngine(args.scratch, load_devices(args.path), alerts=not args.no_alerts)
+    try:
+        report = engine.run(open_source(args.path, args.source, args.start, args.end),
+                            speed=args.speed or None, limit=args.limit)
+    finally:
+        engine.close()
+    print(f"✅ Replay: {report['packets']:,} pacotes em {report['elapsed_s']:.1f}s "
+          f"({report['packets_per_s']:,.0f} pacotes/s, {report['speedup']:,.0f}x tempo real)")
+    print(f"   Alertas: {report['alerts']['pre_alert']} pré-alertas, {report['alerts']['critical']} críticos")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
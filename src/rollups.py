@@ -0,0 +1,136 @@
+"""
+Rollups - Agregados Contínuos das Leituras
+Mantém, por dispositivo, buckets de 1 minuto e 1 hora com min/max/média das métricas,
+contagem de leituras rodando/paradas e risco máximo. Atualizados na mesma transação da escrita.
+Métricas nulas ou NaN (sem medição) ficam fora do min/max/média: cada métrica tem sua
+própria contagem de valores ({m}_count), usada como divisor da média.
+"""
+
+from typing import Dict, Iterable, List, Tuple
+
+from src.partitions import EPOCH_MS_TO_ISO
+
+# resolução -> (tabela, tamanho do bucket em ms)
+ROLLUP_RESOLUTIONS = {
+    '1m': ('reading_rollups_1m', 60_000),
+    '1h': ('reading_rollups_1h', 3_600_000),
+}
+
+METRICS = ['temperature', 'vibration', 'pressure', 'power']
+
+# Colunas na ordem usada pelo UPSERT e pelo acumulador
+_COLUMNS = ['device_id', 'bucket_ts', 'count', 'running_count', 'stopped_count']
+for _m in METRICS:
+    _COLUMNS += [f'{_m}_min', f'{_m}_max', f'{_m}_sum', f'{_m}_count']
+_COLUMNS.append('risk_max')
+
+
+def create_rollup_table(cursor, table: str):
+    metric_cols = ",\n".join(
+        f"            {m}_min REAL, {m}_max REAL, {m}_sum REAL, {m}_count INTEGER NOT NULL DEFAULT 0" for m in METRICS
+    )
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS {table} (
+            device_id TEXT NOT NULL,
+            bucket_ts INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            running_count INTEGER NOT NULL,
+            stopped_count INTEGER NOT NULL,
+{metric_cols},
+            risk_max REAL,
+            PRIMARY KEY (device_id, bucket_ts)
+        ) WITHOUT ROWID
+    ''')
+
+
+def backfill_sql(table: str, bucket_ms: int, source: str) -> str:
+    """INSERT ... SELECT que agrega uma tabela de leituras já existente."""
+    # SQLite grava NaN como NULL; MIN/MAX/TOTAL/COUNT ignoram NULL (status NULL: SUM daria NULL)
+    metric_exprs = ", ".join(f"MIN({m}), MAX({m}), TOTAL({m}), COUNT({m})" for m in METRICS)
+    return f'''
+        INSERT INTO {table} ({", ".join(_COLUMNS)})
+        SELECT device_id, ts - ts % {bucket_ms}, COUNT(*),
+               COALESCE(SUM(status = 'running'), 0), COALESCE(SUM(status = 'parado'), 0),
+               {metric_exprs}, MAX(risk_score)
+        FROM {source}
+        GROUP BY device_id, ts - ts % {bucket_ms}
+        ON CONFLICT (device_id, bucket_ts) DO UPDATE SET {_merge_assignments()}
+    '''
+
+
+def _merge_assignments() -> str:
+    # MIN/MAX escalares com NULL retornam NULL no SQLite; COALESCE preserva o valor conhecido
+    def merge(fn, col):
+        return f"{col} = {fn}(COALESCE({col}, excluded.{col}), COALESCE(excluded.{col}, {col}))"
+
+    parts = [f"{c} = {c} + excluded.{c}" for c in ('count', 'running_count', 'stopped_count')]
+    for m in METRICS:
+        parts += [
+            merge('MIN', f'{m}_min'),
+            merge('MAX', f'{m}_max'),
+            f"{m}_sum = COALESCE({m}_sum, 0) + COALESCE(excluded.{m}_sum, 0)",
+            f"{m}_count = {m}_count + excluded.{m}_count",
+        ]
+    parts.append(merge('MAX', 'risk_max'))
+    return ", ".join(parts)
+
+
+def upsert_sql(table: str) -> str:
+    placeholders = ", ".join("?" for _ in _COLUMNS)
+    return f'''
+        INSERT INTO {table} ({", ".join(_COLUMNS)}) VALUES ({placeholders})
+        ON CONFLICT (device_id, bucket_ts) DO UPDATE SET {_merge_assignments()}
+    '''
+
+
+def accumulate(rows: Iterable[Tuple], bucket_ms: int) -> List[list]:
+    """
+    Agrega um lote de leituras em memória antes do UPSERT (uma linha por bucket tocado).
+
+    Args:
+        rows: tuplas no formato de DatabaseManager._reading_params
+              (ts, device_id, temperature, vibration, pressure, status, risk_score, power)
+    """
+    buckets: Dict[Tuple[str, int], list] = {}
+    for ts, device_id, temp, vib, pressure, status, risk, power in rows:
+        key = (device_id, ts - ts % bucket_ms)
+        values = (temp, vib, pressure, power)
+        agg = buckets.get(key)
+        if agg is None:
+            agg = [device_id, key[1], 0, 0, 0]
+            for _ in values:
+                agg += [None, None, 0.0, 0]
+            agg.append(None)
+            buckets[key] = agg
+        agg[2] += 1
+        if status == 'running':
+            agg[3] += 1
+        elif status == 'parado':
+            agg[4] += 1
+        for i, v in enumerate(values):
+            if v is None or v != v:  # Sem medição (None ou NaN)
+                continue
+            base = 5 + i * 4
+            if agg[base] is None or v < agg[base]:
+                agg[base] = v
+            if agg[base + 1] is None or v > agg[base + 1]:
+                agg[base + 1] = v
+            agg[base + 2] += v
+            agg[base + 3] += 1
+        if risk is not None and risk == risk and (agg[-1] is None or risk > agg[-1]):
+            agg[-1] = risk
+    return list(buckets.values())
+
+
+def select_sql(table: str) -> str:
+    """Buckets de um dispositivo num intervalo, com médias calculadas."""
+    metric_exprs = ", ".join(
+        f"{m}_min, {m}_max, {m}_sum / NULLIF({m}_count, 0) AS {m}_avg" for m in METRICS
+    )
+    return f'''
+        SELECT bucket_ts, {EPOCH_MS_TO_ISO.format(col='bucket_ts')} AS timestamp,
+               count, running_count, stopped_count, {metric_exprs}, risk_max
+        FROM {table}
+        WHERE device_id = ? AND bucket_ts BETWEEN ? AND ?
+        ORDER BY bucket_ts ASC
+    '''
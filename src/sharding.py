@@ -0,0 +1,375 @@
+"""
+Sharding - Pipeline Multiprocesso com Afinidade por Dispositivo
+Cada device_id pertence sempre ao mesmo worker (crc32(device_id) % N). O worker é um
+processo com seu próprio DataProcessor, FailurePredictor, AlertManager (cooldowns) e
+conexões SQLite, então o processamento escala com os núcleos em vez de disputar o GIL.
+
+O coordenador (ShardedPipeline) distribui pacotes em lotes, responde consultas
+roteando-as ao dono do dispositivo (ou a todos os workers) e faz o desligamento
+ordenado: esvazia os lotes, pede para cada worker gravar o que tem e fechar.
+
+Um lote que falha no worker é descartado e reportado ao coordenador (o worker segue
+vivo). Se o processo de um worker morre, o shard é marcado como morto: submit, consultas
+e consultas pendentes para ele levantam RuntimeError em vez de bloquear para sempre.
+
+Uso:
+    with ShardedPipeline(workers=4) as pipeline:
+        for packet in mqtt.listen():
+            pipeline.submit(packet)
+        print(pipeline.query_all('stats'))
+"""
+
+import itertools
+import multiprocessing as mp
+import os
+import queue
+import signal
+import threading
+import time
+import zlib
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional
+
+
+def shard_for(device_id: str, shards: int) -> int:
+    """Stable shard of a device (crc32, independent of PYTHONHASHSEED)."""
+    return zlib.crc32(str(device_id).encode()) % shards
+
+
+class _Worker:
+    """Estado de um shard, dentro do processo worker."""
+
+    def __init__(self, shard: int, db_path: Optional[str], history_path: str, alerts: bool):
+        from src.alert_manager import AlertManager, AlertLevel
+        from src.database import DatabaseManager
+        from src.processor import DataProcessor
+
+        self.shard = shard
+        self.db = DatabaseManager(db_path, history_path)
+        self.processor = DataProcessor(self.db)
+        self.alert_manager = AlertManager(self.db, self.processor.predictor, state=self.processor) if alerts else None
+        self.normal = AlertLevel.NORMAL
+        self.processed = 0
+        self.alerts = 0
+        self.failed_batches = 0
+        self.devices = set()
+
+    def process(self, packets: List[Dict], outbox):
+        packets = self.processor.process_packets(packets)
+        self.processed += len(packets)
+        # Alertas uma vez por dispositivo do lote, já com todas as leituras dele gravadas
+        batch_devices = list(dict.fromkeys(p['device_id'] for p in packets))
+        self.devices.update(batch_devices)
+        if self.alert_manager is None:
+            return
+        for device_id in batch_devices:
+            level, alert_data = self.alert_manager.check_alert_conditions(device_id)
+            if level != self.normal and alert_data:
+                report = self.alert_manager.generate_report(alert_data)
+                alert_data['alert_id'] = self.db.save_alert(alert_data, report)
+                self.alerts += 1
+                outbox.put(('alert', self.shard, alert_data))
+
+    # --- Consultas (nome -> método query_<nome>) ---
+
+    def query_stats(self):
+        return {'shard': self.shard, 'pid': os.getpid(), 'processed': self.processed,
+                'alerts': self.alerts, 'failed_batches': self.failed_batches, 'devices': len(self.devices)}
+
+    def query_devices(self):
+        return sorted(self.devices)
+
+    def query_recent_readings(self, device_id, limit=20):
+        return self.db.get_recent_readings(device_id, limit, result='dicts')
+
+    def query_kpis(self, device_id, start=None, end=None):
+        return self.processor.kpi.calculate_kpis(device_id, start, end)
+
+    def query_alert_state(self, device_id):
+        if self.alert_manager is None:
+            return None
+        state = self.alert_manager.active_alerts.get(device_id)
+        return {'level': state['level'].value, 'timestamp': state['timestamp'].isoformat()} if state else None
+
+    def close(self):
+        self.db.close()
+
+
+def _worker_main(shard, db_path, history_path, alerts, inbox, outbox):
+    # Ctrl+C chega a todo o grupo de processos; quem decide o desligamento é o coordenador
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    try:
+        worker = _Worker(shard, db_path, history_path, alerts)
+    except Exception as e:
+        # Ex: banco inacessível; o coordenador aborta o start() em vez de esperar para sempre
+        outbox.put(('error', shard, f"{type(e).__name__}: {e}"))
+        return
+    outbox.put(('ready', shard, None))
+    try:
+        while True:
+            message = inbox.get()
+            kind = message[0]
+            if kind == 'packets':
+                try:
+                    worker.process(message[1], outbox)
+                except Exception as e:
+                    # Um lote ruim não derruba o shard: descarta e avisa o coordenador
+                    worker.failed_batches += 1
+                    outbox.put(('batch_error', shard, (len(message[1]), f"{type(e).__name__}: {e}")))
+            elif kind == 'query':
+                _, request_id, name, args = message
+                try:
+                    outbox.put(('result', request_id, (True, getattr(worker, f"query_{name}")(*args))))
+                except Exception as e:
+                    outbox.put(('result', request_id, (False, f"{type(e).__name__}: {e}")))
+            elif kind == 'stop':
+                break
+    finally:
+        worker.close()
+        outbox.put(('stopped', shard, worker.query_stats()))
+
+
+class ShardedPipeline:
+    """
+    Coordenador: roteia pacotes e consultas para N processos worker.
+
+    Args:
+        workers: número de processos (padrão: SHARD_WORKERS ou os.cpu_count())
+        batch_size: pacotes acumulados por shard antes de enviar (menos IPC por pacote)
+        alerts: roda o AlertManager em cada worker
+        on_alert: callback(alert_data) chamado no coordenador para cada alerta disparado
+    """
+
+    def __init__(self, workers: Optional[int] = None, db_path: Optional[str] = None,
+                 history_path: str = "history_data", batch_size: int = 100, alerts: bool = True,
+                 on_alert: Optional[Callable[[Dict], None]] = None):
+        if workers is None:
+            workers = int(os.getenv("SHARD_WORKERS", str(os.cpu_count() or 1)))
+        self.workers = workers
+        self.db_path = db_path
+        self.history_path = history_path
+        self.batch_size = batch_size
+        self.alerts = alerts
+        self.on_alert = on_alert
+
+        self._ctx = mp.get_context('spawn')  # Seguro com threads/conexões abertas no pai (e igual no Windows)
+        self._inboxes = []
+        self._processes = []
+        self._outbox = None
+        self._buffers: List[List[Dict]] = [[] for _ in range(workers)]
+        self._pending: Dict[int, Future] = {}
+        self._request_ids = itertools.count()
+        self._ready = threading.Semaphore(0)
+        self._errors: Dict[int, str] = {}  # shard -> erro na inicialização
+        self._dead: Dict[int, str] = {}    # shard -> motivo (worker morreu depois de pronto)
+        self._last_liveness = 0.0
+        self.failed_batches = 0
+        self.failed_packets = 0
+        self._listener = None
+        self.final_stats: List[Dict] = []
+        self._stopped = 0
+        self._started = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def start(self, timeout: float = 60):
+        """
+        Spawn the workers and wait until every one is ready. Raises RuntimeError (after
+        terminating the others) if a worker fails to initialize, dies or misses the timeout.
+        """
+        self._outbox = self._ctx.Queue()
+        for shard in range(self.workers):
+            inbox = self._ctx.Queue(maxsize=64)  # Limita lotes em voo: backpressure no submit
+            process = self._ctx.Process(
+                target=_worker_main, name=f"shard-{shard}",
+                args=(shard, self.db_path, self.history_path, self.alerts, inbox, self._outbox),
+            )
+            process.start()
+            self._inboxes.append(inbox)
+            self._processes.append(process)
+        self._listener = threading.Thread(target=self._listen, name="ShardedPipeline", daemon=True)
+        self._listener.start()
+        deadline = time.monotonic() + timeout
+        ready = 0
+        while ready < self.workers:
+            if self._ready.acquire(timeout=0.5):
+                ready += 1
+                continue
+            error = None
+            if self._errors:
+                shard, message = min(self._errors.items())
+                error = f"shard-{shard} falhou ao iniciar: {message}"
+            elif not all(p.is_alive() for p in self._processes):
+                dead = [p.name for p in self._processes if not p.is_alive()]
+                error = f"worker(s) {', '.join(dead)} encerraram durante a inicialização"
+            elif time.monotonic() > deadline:
+                error = f"workers não ficaram prontos em {timeout}s"
+            if error:
+                self._abort_start()
+                raise RuntimeError(error)
+        self._started = True
+
+    def _abort_start(self):
+        for process in self._processes:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+        self._stopped = self.workers  # Encerra o listener
+        if self._listener is not None:
+            self._listener.join()
+
+    def shard_for(self, device_id: str) -> int:
+        return shard_for(device_id, self.workers)
+
+    def submit(self, packet: Dict):
+        shard = self.shard_for(packet['device_id'])
+        self._check_alive(shard)
+        buffer = self._buffers[shard]
+        buffer.append(packet)
+        if len(buffer) >= self.batch_size:
+            self._send(shard)
+
+    def submit_many(self, packets):
+        for packet in packets:
+            self.submit(packet)
+
+    def flush(self):
+        """Send every partial batch to its worker."""
+        for shard in range(self.workers):
+            self._send(shard)
+
+    def _send(self, shard):
+        batch, self._buffers[shard] = self._buffers[shard], []
+        if batch:
+            self._put(shard, ('packets', batch))
+
+    def _check_alive(self, shard):
+        if shard in self._dead:
+            raise RuntimeError(f"shard-{shard} está morto: {self._dead[shard]}")
+
+    def _put(self, shard, message):
+        """Put on the shard inbox; raises RuntimeError instead of blocking if the worker dies."""
+        while True:
+            self._check_alive(shard)
+            try:
+                self._inboxes[shard].put(message, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    # --- Consultas ---
+
+    def query(self, device_id: str, name: str, *args, timeout: Optional[float] = 30):
+        """Run query_<name>(device_id, *args) on the worker that owns device_id."""
+        shard = self.shard_for(device_id)
+        self._send(shard)  # A consulta vê os pacotes já submetidos
+        return self._request(shard, name, (device_id,) + args).result(timeout)
+
+    def query_all(self, name: str, *args, timeout: Optional[float] = 30) -> List:
+        """Run query_<name>(*args) on every worker (cross-shard), results in shard order."""
+        self.flush()
+        futures = [self._request(shard, name, args) for shard in range(self.workers)]
+        return [f.result(timeout) for f in futures]
+
+    def _request(self, shard, name, args) -> Future:
+        request_id = next(self._request_ids)
+        future = Future()
+        self._pending[request_id] = (shard, future)
+        try:
+            self._put(shard, ('query', request_id, name, args))
+        except RuntimeError:
+            self._pending.pop(request_id, None)
+            raise
+        return future
+
+    def _mark_dead(self, shard, reason):
+        """Called by the listener: fail the shard's pending queries and refuse new work."""
+        if shard in self._dead:
+            return
+        self._dead[shard] = reason
+        print(f"shard-{shard} morreu: {reason}")
+        for request_id, (owner, future) in list(self._pending.items()):
+            if owner == shard and self._pending.pop(request_id, None) is not None:
+                future.set_exception(RuntimeError(f"shard-{shard} está morto: {reason}"))
+
+    def _check_liveness(self):
+        # Worker morto sem mensagem (kill, segfault, OOM); no máximo uma vez por segundo
+        now = time.monotonic()
+        if not self._started or now - self._last_liveness < 1:
+            return
+        self._last_liveness = now
+        for shard, process in enumerate(self._processes):
+            if shard not in self._dead and not process.is_alive():
+                self._mark_dead(shard, f"processo encerrou (exitcode {process.exitcode})")
+
+    def _listen(self):
+        """Demultiplex worker messages: query results, alerts, lifecycle."""
+        while self._stopped < self.workers:
+            self._check_liveness()
+            try:
+                kind, key, payload = self._outbox.get(timeout=1)
+            except queue.Empty:
+                if not any(p.is_alive() for p in self._processes):
+                    break
+                continue
+            if kind == 'result':
+                ok, value = payload
+                entry = self._pending.pop(key, None)
+                if entry is None:
+                    continue  # Já falhou por shard morto ou foi cancelada no stop()
+                future = entry[1]
+                if ok:
+                    future.set_result(value)
+                else:
+                    future.set_exception(RuntimeError(value))
+            elif kind == 'alert':
+                if self.on_alert is not None:
+                    try:
+                        self.on_alert(payload)
+                    except Exception as e:
+                        print(f"Erro no callback de alerta: {e}")
+            elif kind == 'ready':
+                self._ready.release()
+            elif kind == 'batch_error':
+                size, message = payload
+                self.failed_batches += 1
+                self.failed_packets += size
+                print(f"shard-{key}: lote de {size} pacotes descartado ({message})")
+            elif kind == 'error':
+                self._errors[key] = payload
+            elif kind == 'stopped':
+                self.final_stats.append(payload)
+                self._stopped += 1
+                if self._started:
+                    # Saiu do loop sem ter recebido 'stop'
+                    self._mark_dead(key, "worker encerrou inesperadamente")
+
+    def stop(self, timeout: float = 30):
+        """Graceful shutdown: flush batches, let every worker drain and close its database."""
+        if not self._started:
+            return
+        self._started = False
+        for shard in range(self.workers):
+            pending = len(self._buffers[shard])
+            try:
+                self._send(shard)
+                self._put(shard, ('stop',))
+            except RuntimeError as e:
+                print(f"{e}; {pending} pacotes não entregues.")
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                print(f"Worker {process.name} não terminou em {timeout}s; encerrando à força.")
+                process.terminate()
+                process.join()
+        if self._listener is not None:
+            self._listener.join(timeout)
+        self.final_stats.sort(key=lambda s: s['shard'])
+        for _, future in list(self._pending.values()):
+            future.cancel()
+        self._pending.clear()
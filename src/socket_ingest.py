@@ -0,0 +1,630 @@
+"""
+Socket Ingest - Endpoint de Ingestão por Socket (TCP, UDP ou Unix)
+Substitui o MqttMock quando os pacotes vêm de fora do processo: geradores de carga,
+gateways de borda ou um bridge do broker real. Os dados seguem para o IngestionGateway
+(ou qualquer handler de lotes, ex: ShardedPipeline.submit_many).
+
+Protocolo (o mesmo em TCP, Unix e UDP; no UDP cada datagrama traz frames inteiros):
+- JSON lines: uma linha por frame, com um pacote (objeto) ou vários (array).
+- Binário: frames com cabeçalho de 5 bytes (tipo uint8 + tamanho uint32 LE):
+    0xD1 + n bytes   -> lista JSON de device_ids, anexados ao DeviceIndex da conexão
+    0xB1 + n pacotes -> n * PACKET_SIZE bytes no formato de src/ingestion.py
+  Os dois formatos podem ser misturados na mesma conexão.
+- Frames (ou linhas JSON) maiores que INGEST_MAX_FRAME_BYTES encerram a conexão; pacotes
+  JSON fora do esquema (ver validate_packet) são descartados e contados em 'errors'.
+- Ack (opcional): depois que os pacotes são entregues ao pipeline, o servidor responde
+  uma linha JSON cumulativa {"ack": <último frame entregue>, "packets": n, "dropped": n}.
+  Frames de dispositivos não contam na numeração.
+
+Uso:
+    python -m src.socket_ingest serve --tcp 127.0.0.1:7878 --udp 127.0.0.1:7879
+    python -m src.socket_ingest bench --tcp 127.0.0.1:7878 --devices 1000 --ticks 20 --format binary
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import struct
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from src.ingestion import (
+    MAX_TS_MS, MIN_TS_MS, PACKET_SIZE, STATUS_NAMES, DeviceIndex, FleetSimulator, IngestionGateway,
+    batch_to_packets, decode_batch, encode_packets, encode_tick, validate_packet,
+)
+
+PACKETS_FRAME = 0xB1
+DEVICES_FRAME = 0xD1
+_FRAME_HEADER = struct.Struct('<BI')
+_READ_SIZE = 1 << 16
+_MAX_DATAGRAM = 65507
+
+
+class FrameParser:
+    """
+    Decodifica o fluxo de uma conexão em frames de pacotes (listas de dicts).
+    Guarda bytes incompletos entre chamadas e o DeviceIndex da conexão.
+
+    Args:
+        max_frame_bytes: maior frame (corpo binário ou linha JSON) aceito; limita o
+                         buffer da conexão (INGEST_MAX_FRAME_BYTES)
+    """
+
+    def __init__(self, max_frame_bytes: Optional[int] = None):
+        if max_frame_bytes is None:
+            max_frame_bytes = int(os.getenv("INGEST_MAX_FRAME_BYTES", str(4 * 1024 * 1024)))
+        self.max_frame_bytes = max_frame_bytes
+        self.devices = DeviceIndex()
+        self.errors = 0
+        self._buffer = bytearray()
+
+    def feed(self, data: bytes, final: bool = False) -> List[List[Dict]]:
+        """
+        Append data and return the complete frames. final=True treats the end of data as the
+        end of the last JSON line (UDP datagrams). Raises ValueError on corrupt binary framing
+        or on a frame larger than max_frame_bytes, after which the stream cannot be resynchronized.
+        """
+        self._buffer += data
+        try:
+            return self._parse(final)
+        except Exception:
+            del self._buffer[:]  # Não reprocessa os bytes ruins no próximo feed (ex: próximo datagrama)
+            raise
+
+    def _parse(self, final: bool) -> List[List[Dict]]:
+        buf = self._buffer
+        frames = []
+        pos = 0
+        while pos < len(buf):
+            kind = buf[pos]
+            if kind in (PACKETS_FRAME, DEVICES_FRAME):
+                if len(buf) - pos < _FRAME_HEADER.size:
+                    break
+                _, size = _FRAME_HEADER.unpack_from(buf, pos)
+                body_size = size * PACKET_SIZE if kind == PACKETS_FRAME else size
+                if body_size > self.max_frame_bytes:
+                    raise ValueError(f"Frame de {body_size} bytes excede o limite de {self.max_frame_bytes}")
+                start = pos + _FRAME_HEADER.size
+                end = start + body_size
+                if end > len(buf):
+                    break
+                body = bytes(buf[start:end])
+                pos = end
+                if kind == DEVICES_FRAME:
+                    device_ids = json.loads(body)
+                    if not isinstance(device_ids, list):
+                        raise ValueError("Frame de dispositivos não é uma lista JSON")
+                    for device_id in device_ids:
+                        self.devices.index(str(device_id))
+                    continue
+                batch = decode_batch(body)
+                self._check_batch(batch)
+                frames.append(batch_to_packets(batch, self.devices))
+            else:
+                newline = buf.find(b'\n', pos)
+                if newline - pos > self.max_frame_bytes or (newline < 0 and len(buf) - pos > self.max_frame_bytes):
+                    raise ValueError(f"Linha JSON excede o limite de {self.max_frame_bytes} bytes")
+                if newline < 0:
+                    if not final:
+                        break
+                    newline = len(buf)
+                line = bytes(buf[pos:newline]).strip()
+                pos = newline + 1
+                if not line:
+                    continue
+                packets = self._parse_json(line)
+                if packets is not None:
+                    frames.append(packets)
+        del buf[:pos]
+        if final and buf:
+            del buf[:]
+            raise ValueError("Datagrama com frame binário incompleto")
+        return frames
+
+    def _check_batch(self, batch):
+        """Range-check a decoded binary frame (the values index tables and become datetimes)."""
+        if not len(batch):
+            return
+        if int(batch['device'].max()) >= len(self.devices):
+            raise ValueError("Frame binário com dispositivo não declarado")
+        if int(batch['status'].max()) >= len(STATUS_NAMES):
+            raise ValueError("Frame binário com status desconhecido")
+        ts = batch['ts']
+        if int(ts.min()) < MIN_TS_MS or int(ts.max()) >= MAX_TS_MS:
+            raise ValueError("Frame binário com ts fora da faixa")
+        for name in ('temperature', 'vibration', 'pressure', 'power'):
+            if np.isinf(batch[name]).any():
+                raise ValueError(f"Frame binário com {name} infinito")
+
+    def _parse_json(self, line: bytes) -> Optional[List[Dict]]:
+        try:
+            obj = json.loads(line)
+        except ValueError:
+            self.errors += 1
+            return None
+        packets = obj if isinstance(obj, list) else [obj]
+        # Pacotes fora do esquema não entram no lote (o handler descartaria o lote inteiro)
+        valid = [p for p in packets if validate_packet(p) is None]
+        self.errors += len(packets) - len(valid)
+        return valid or None
+
+
+class _Connection:
+    """Estado e contadores de uma conexão (ou de um remetente UDP)."""
+
+    def __init__(self, peer, transport: str, send=None, max_frame_bytes: Optional[int] = None):
+        self.peer = peer
+        self.transport = transport
+        self.send = send  # Envia uma linha de ack (None = sem acks)
+        self.parser = FrameParser(max_frame_bytes)
+        self.pending: List[Dict] = []
+        self.pending_since = 0.0
+        self.frame_seq = 0     # Frames recebidos
+        self.acked_seq = 0     # Frames já entregues ao pipeline
+        self.stats = {'frames': 0, 'packets': 0, 'bytes': 0, 'batches': 0, 'dropped': 0, 'errors': 0}
+        self.connected_at = time.monotonic()
+        self.last_at = self.connected_at
+
+    def snapshot(self) -> Dict:
+        stats = dict(self.stats, errors=self.stats['errors'] + self.parser.errors)
+        elapsed = self.last_at - self.connected_at
+        stats.update(peer=str(self.peer), transport=self.transport, elapsed_s=elapsed,
+                     packets_per_s=stats['packets'] / elapsed if elapsed else 0.0,
+                     bytes_per_s=stats['bytes'] / elapsed if elapsed else 0.0)
+        return stats
+
+
+class _DatagramProtocol(asyncio.DatagramProtocol):
+    def __init__(self, server):
+        self.server = server
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.server._datagrams.put_nowait((self.transport, data, addr))
+
+
+class SocketIngestServer:
+    """
+    Servidor asyncio que recebe pacotes por socket e os entrega ao pipeline em lotes.
+
+    Args:
+        sink: IngestionGateway (cada pacote vai para gateway.publish, respeitando a política
+              de fila) ou handler de lotes handler(list_of_packets), síncrono ou async.
+              Handlers síncronos rodam numa thread dedicada (ordem de chegada preservada).
+        batch_size: entrega quando a conexão acumula N pacotes (INGEST_BATCH_SIZE)
+        batch_latency_ms: ... ou quando o pacote mais antigo espera este tempo (INGEST_BATCH_LATENCY_MS)
+        ack: responde acks cumulativos após cada entrega (INGEST_ACK)
+        max_frame_bytes: maior frame aceito por conexão (INGEST_MAX_FRAME_BYTES)
+    """
+
+    def __init__(self, sink, batch_size: Optional[int] = None, batch_latency_ms: Optional[int] = None,
+                 ack: Optional[bool] = None, max_frame_bytes: Optional[int] = None):
+        self.sink = sink
+        self.batch_size = batch_size or int(os.getenv("INGEST_BATCH_SIZE", "500"))
+        if batch_latency_ms is None:
+            batch_latency_ms = int(os.getenv("INGEST_BATCH_LATENCY_MS", "50"))
+        self.batch_latency = batch_latency_ms / 1000
+        self.ack = ack if ack is not None else os.getenv("INGEST_ACK", "1") == "1"
+        self.max_frame_bytes = max_frame_bytes
+
+        self._gateway = sink if isinstance(sink, IngestionGateway) else None
+        self._is_async = asyncio.iscoroutinefunction(sink)
+        self._executor = None
+        if self._gateway is None and not self._is_async:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="socket-ingest")
+
+        self._servers = []
+        self._handlers = set()
+        self._udp_transports = []
+        self._udp_task = None
+        self._datagrams: asyncio.Queue = None
+        self.connections: Dict[object, _Connection] = {}
+        self._closed_totals = {'connections': 0, 'frames': 0, 'packets': 0, 'bytes': 0,
+                               'batches': 0, 'dropped': 0, 'errors': 0}
+
+    # --- Ciclo de vida ---
+
+    async def start_tcp(self, host: str = '127.0.0.1', port: int = 0):
+        """Listen on TCP. Returns the bound (host, port) (port=0 picks a free one)."""
+        server = await asyncio.start_server(self._handle_stream, host, port)
+        self._servers.append(server)
+        return server.sockets[0].getsockname()[:2]
+
+    async def start_unix(self, path: str):
+        if os.path.exists(path):
+            os.remove(path)
+        server = await asyncio.start_unix_server(self._handle_stream, path)
+        self._servers.append(server)
+        return path
+
+    async def start_udp(self, host: str = '127.0.0.1', port: int = 0):
+        loop = asyncio.get_running_loop()
+        if self._datagrams is None:
+            self._datagrams = asyncio.Queue()
+            self._udp_task = asyncio.create_task(self._consume_datagrams())
+        transport, _ = await loop.create_datagram_endpoint(lambda: _DatagramProtocol(self), local_addr=(host, port))
+        self._udp_transports.append(transport)
+        return transport.get_extra_info('sockname')[:2]
+
+    async def stop(self):
+        """Stop listening, deliver every pending batch and close the connections."""
+        for server in self._servers:
+            server.close()
+            await server.wait_closed()
+        self._servers = []
+        for writer in list(self._handlers):
+            writer.close()  # O handler vê EOF, entrega o lote pendente e encerra
+        while self._handlers:
+            await asyncio.sleep(0.01)
+
+        if self._udp_task is not None:
+            if not self._udp_task.done():
+                await self._datagrams.join()
+            self._udp_task.cancel()
+            await asyncio.gather(self._udp_task, return_exceptions=True)
+            self._udp_task = None
+            for conn in [c for c in self.connections.values() if c.transport == 'udp']:
+                await self._flush(conn)
+                self._close_connection(conn)
+            for transport in self._udp_transports:
+                transport.close()
+            self._udp_transports = []
+
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    # --- Recepção ---
+
+    async def _handle_stream(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        unix = isinstance(writer.get_extra_info('sockname'), str)
+        peer = writer.get_extra_info('peername') or 'unix'
+        conn = _Connection(peer, 'unix' if unix else 'tcp', writer.write if self.ack else None, self.max_frame_bytes)
+        key = id(writer)
+        self.connections[key] = conn
+        self._handlers.add(writer)
+        try:
+            while True:
+                timeout = None
+                if conn.pending:
+                    timeout = max(0.0, conn.pending_since + self.batch_latency - time.monotonic())
+                try:
+                    data = await asyncio.wait_for(reader.read(_READ_SIZE), timeout)
+                except asyncio.TimeoutError:
+                    await self._flush(conn)
+                    continue
+                except ConnectionError:
+                    break
+                if not data:
+                    break
+                try:
+                    frames = conn.parser.feed(data)
+                except Exception as e:
+                    conn.stats['errors'] += 1
+                    print(f"Conexão {peer} encerrada: {e}")
+                    break
+                await self._receive(conn, data, frames)
+        except Exception as e:
+            # Erro inesperado: encerra só esta conexão (o lote pendente ainda é entregue abaixo)
+            conn.stats['errors'] += 1
+            print(f"Conexão {peer} encerrada por erro: {type(e).__name__}: {e}")
+        finally:
+            try:
+                await self._flush(conn)
+                if not writer.is_closing():
+                    await writer.drain()
+            except (ConnectionError, RuntimeError):
+                pass
+            writer.close()
+            self._close_connection(conn, key)
+            self._handlers.discard(writer)
+
+    async def _consume_datagrams(self):
+        while True:
+            # Sem EOF no UDP: lotes parciais são entregues pelo prazo
+            pending = [c for c in self.connections.values() if c.transport == 'udp' and c.pending]
+            timeout = None
+            if pending:
+                oldest = min(c.pending_since for c in pending)
+                timeout = max(0.0, oldest + self.batch_latency - time.monotonic())
+            try:
+                transport, data, addr = await asyncio.wait_for(self._datagrams.get(), timeout)
+            except asyncio.TimeoutError:
+                now = time.monotonic()
+                for conn in pending:
+                    if now - conn.pending_since >= self.batch_latency:
+                        try:
+                            await self._flush(conn)
+                        except Exception as e:
+                            conn.stats['errors'] += 1
+                            print(f"Erro entregando lote UDP de {conn.peer}: {e}")
+                continue
+            # Um datagrama ruim nunca derruba o consumidor (que todo o UDP e o stop() dependem)
+            conn = None
+            try:
+                conn = self.connections.get(addr)
+                if conn is None:
+                    send = (lambda line, t=transport, a=addr: t.sendto(line, a)) if self.ack else None
+                    conn = self.connections[addr] = _Connection(addr, 'udp', send, self.max_frame_bytes)
+                try:
+                    frames = conn.parser.feed(data, final=True)
+                except Exception as e:
+                    conn.stats['errors'] += 1
+                    print(f"Datagrama inválido de {addr} descartado: {e}")
+                    frames = []
+                await self._receive(conn, data, frames)
+            except Exception as e:
+                if conn is not None:
+                    conn.stats['errors'] += 1
+                print(f"Erro processando datagrama de {addr}: {type(e).__name__}: {e}")
+            finally:
+                self._datagrams.task_done()
+
+    async def _receive(self, conn: _Connection, data: bytes, frames: List[List[Dict]]):
+        conn.stats['bytes'] += len(data)
+        conn.last_at = time.monotonic()
+        for packets in frames:
+            if not conn.pending:
+                conn.pending_since = conn.last_at
+            conn.pending.extend(packets)
+            conn.frame_seq += 1
+            conn.stats['frames'] += 1
+            conn.stats['packets'] += len(packets)
+        if len(conn.pending) >= self.batch_size or (
+                conn.pending and conn.last_at - conn.pending_since >= self.batch_latency):
+            await self._flush(conn)
+
+    async def _flush(self, conn: _Connection):
+        """Deliver the pending batch of a connection and acknowledge its frames."""
+        if conn.pending:
+            batch, conn.pending = conn.pending, []
+            dropped = await self._deliver(batch)
+            conn.stats['batches'] += 1
+            conn.stats['dropped'] += dropped
+            delivered = len(batch)
+        else:
+            delivered = dropped = 0
+        if conn.frame_seq == conn.acked_seq:
+            return
+        conn.acked_seq = conn.frame_seq
+        if conn.send is not None:
+            conn.send(json.dumps({'ack': conn.acked_seq, 'packets': delivered, 'dropped': dropped}).encode() + b'\n')
+
+    async def _deliver(self, batch: List[Dict]) -> int:
+        """Hand a batch to the sink. Returns how many packets the gateway dropped."""
+        if self._gateway is not None:
+            dropped = 0
+            for packet in batch:
+                if not await self._gateway.publish(packet):
+                    dropped += 1
+            return dropped
+        try:
+            if self._is_async:
+                await self.sink(batch)
+            else:
+                await asyncio.get_running_loop().run_in_executor(self._executor, self.sink, batch)
+        except Exception as e:
+            print(f"Erro entregando lote de {len(batch)} pacotes: {e}")
+            return len(batch)
+        return 0
+
+    def _close_connection(self, conn: _Connection, key=None):
+        self.connections.pop(key if key is not None else conn.peer, None)
+        snapshot = conn.snapshot()
+        self._closed_totals['connections'] += 1
+        for name in ('frames', 'packets', 'bytes', 'batches', 'dropped', 'errors'):
+            self._closed_totals[name] += snapshot[name]
+
+    def metrics(self) -> Dict:
+        """Totals (closed + open connections) and per-connection throughput counters."""
+        active = [conn.snapshot() for conn in self.connections.values()]
+        total = dict(self._closed_totals)
+        for snapshot in active:
+            for name in ('frames', 'packets', 'bytes', 'batches', 'dropped', 'errors'):
+                total[name] += snapshot[name]
+        total['active'] = len(active)
+        total['connections'] += len(active)
+        total['per_connection'] = active
+        return total
+
+
+class IngestClient:
+    """
+    Cliente síncrono do protocolo (gerador de carga, testes, bridge de borda).
+
+    Uso:
+        client = IngestClient(('127.0.0.1', 7878))
+        client.send_binary(packets)
+        client.wait_acks()
+    """
+
+    def __init__(self, address, transport: str = 'tcp', timeout: float = 30):
+        self.transport = transport
+        self.address = address
+        if transport == 'udp':
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.sock.connect(address)
+        elif transport == 'unix':
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.connect(address)
+        else:
+            self.sock = socket.create_connection(address)
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock.settimeout(timeout)
+        self.devices = DeviceIndex()
+        self.sent_frames = 0
+        self.acked = 0
+        self._acks = b''
+
+    def _send(self, data: bytes):
+        if self.transport == 'udp':
+            if len(data) > _MAX_DATAGRAM:
+                raise ValueError(f"Datagrama de {len(data)} bytes excede {_MAX_DATAGRAM}; reduza o frame")
+            self.sock.send(data)
+        else:
+            self.sock.sendall(data)
+
+    def _frames_for_devices(self, device_ids) -> bytes:
+        known = len(self.devices)
+        for device_id in device_ids:
+            self.devices.index(device_id)
+        if len(self.devices) == known:
+            return b''
+        body = json.dumps(self.devices.ids[known:]).encode()
+        return _FRAME_HEADER.pack(DEVICES_FRAME, len(body)) + body
+
+    def send_json(self, packets: List[Dict]):
+        """One JSON line with every packet (one frame)."""
+        self._send(json.dumps(packets, default=str).encode() + b'\n')
+        self.sent_frames += 1
+
+    def send_binary(self, packets: List[Dict]):
+        header = self._frames_for_devices(p['device_id'] for p in packets)
+        self._send(header + _FRAME_HEADER.pack(PACKETS_FRAME, len(packets)) + encode_packets(packets, self.devices))
+        self.sent_frames += 1
+
+    def send_tick(self, columns: Dict):
+        """FleetSimulator.generate_tick() columns as one binary frame."""
+        header = self._frames_for_devices(columns['device_id'])
+        n = len(columns['ts'])
+        self._send(header + _FRAME_HEADER.pack(PACKETS_FRAME, n) + encode_tick(columns, self.devices))
+        self.sent_frames += 1
+
+    def wait_acks(self, seq: Optional[int] = None) -> int:
+        """Block until the server acknowledged frame seq (default: every frame sent)."""
+        seq = self.sent_frames if seq is None else seq
+        while self.acked < seq:
+            data = self.sock.recv(_READ_SIZE)
+            if not data:
+                raise ConnectionError("Servidor fechou a conexão antes do ack")
+            self._acks += data
+            *lines, self._acks = self._acks.split(b'\n')
+            for line in lines:
+                if line:
+                    self.acked = max(self.acked, json.loads(line)['ack'])
+        return self.acked
+
+    def close(self):
+        self.sock.close()
+
+
+def _address(value: str):
+    host, _, port = value.rpartition(':')
+    return host or '127.0.0.1', int(port)
+
+
+async def _serve(args):
+    from src.database import DatabaseManager
+    from src.processor import DataProcessor
+
+    db = DatabaseManager(args.db)
+    processor = DataProcessor(db)
+    gateway = None
+    if args.gateway:
+        gateway = IngestionGateway(processor.process_packet, shards=args.shards, queue_size=args.queue_size,
+                                   policy=args.policy)
+        await gateway.start()
+    # Sem gateway, cada lote da conexão vai inteiro para o caminho em lote do processador
+    server = SocketIngestServer(gateway or processor.process_packets)
+    if args.tcp:
+        print(f"TCP em {await server.start_tcp(*_address(args.tcp))}")
+    if args.udp:
+        print(f"UDP em {await server.start_udp(*_address(args.udp))}")
+    if args.unix:
+        print(f"Unix em {await server.start_unix(args.unix)}")
+    try:
+        while True:
+            await asyncio.sleep(args.report_every)
+            m = server.metrics()
+            line = f"📡 {m['active']} conexões | {m['packets']:,} recebidos | {m['batches']:,} lotes"
+            if gateway is not None:
+                g = gateway.metrics()
+                line += f" | {g['processed']:,} processados | {g['dropped']:,} descartados | lag máx {g['lag_max']:.3f}s"
+            print(line)
+    finally:
+        await server.stop()
+        if gateway is not None:
+            await gateway.stop()
+        db.close()
+
+
+def _bench(args):
+    if args.unix:
+        address, transport = args.unix, 'unix'
+    elif args.udp:
+        address, transport = _address(args.udp), 'udp'
+    else:
+        address, transport = _address(args.tcp or '127.0.0.1:7878'), 'tcp'
+    fleet = FleetSimulator([f"DEV-{i + 1000}" for i in range(args.devices)], seed=args.seed)
+    client = IngestClient(address, transport)
+    start = datetime.now()
+    packets = 0
+    started = time.perf_counter()
+    for tick in range(args.ticks):
+        now = start.timestamp() + tick
+        if args.format == 'binary':
+            columns = fleet.generate_tick(datetime.fromtimestamp(now))
+            for i in range(0, len(columns['ts']), args.frame_size):
+                client.send_tick({name: values[i:i + args.frame_size] for name, values in columns.items()})
+        else:
+            batch = fleet.generate_packets(datetime.fromtimestamp(now))
+            for i in range(0, len(batch), args.frame_size):
+                client.send_json(batch[i:i + args.frame_size])
+        packets += args.devices
+    if transport != 'udp':
+        client.wait_acks()
+    elapsed = time.perf_counter() - started
+    client.close()
+    print(f"✅ {packets:,} pacotes ({args.format}, {transport}) em {elapsed:.2f}s = {packets / elapsed:,.0f} pacotes/s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingestão de pacotes por socket.")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    serve = sub.add_parser('serve', help="Servidor alimentando o DataProcessor")
+    serve.add_argument('--tcp', default=None, help="host:porta")
+    serve.add_argument('--udp', default=None, help="host:porta")
+    serve.add_argument('--unix', default=None, help="Caminho do socket Unix")
+    serve.add_argument('--db', default=None, help="Banco (padrão: DATABASE_PATH)")
+    serve.add_argument('--gateway', action='store_true',
+                       help="Passa pelo IngestionGateway (filas por shard) em vez de entregar lotes direto")
+    serve.add_argument('--shards', type=int, default=4)
+    serve.add_argument('--queue-size', type=int, default=1000)
+    serve.add_argument('--policy', choices=IngestionGateway.POLICIES, default='block')
+    serve.add_argument('--report-every', type=float, default=5.0, help="Segundos entre relatórios")
+
+    bench = sub.add_parser('bench', help="Gerador de carga (FleetSimulator)")
+    bench.add_argument('--tcp', default=None, help="host:porta")
+    bench.add_argument('--udp', default=None, help="host:porta (sem acks)")
+    bench.add_argument('--unix', default=None, help="Caminho do socket Unix")
+    bench.add_argument('--devices', type=int, default=1000)
+    bench.add_argument('--ticks', type=int, default=10)
+    bench.add_argument('--format', choices=['binary', 'json'], default='binary')
+    bench.add_argument('--frame-size', type=int, default=500, help="Pacotes por frame")
+    bench.add_argument('--seed', type=int, default=None)
+
+    args = parser.parse_args(argv)
+    if args.command == 'serve':
+        if not (args.tcp or args.udp or args.unix):
+            args.tcp = '127.0.0.1:7878'
+        try:
+            asyncio.run(_serve(args))
+        except KeyboardInterrupt:
+            print("Servidor encerrado.")
+    else:
+        _bench(args)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
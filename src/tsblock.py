@@ -0,0 +1,270 @@
+"""
+TSBlock - Armazenamento Frio Comprimido das Leituras
+Leituras mais antigas que COLD_STORAGE_AFTER_DAYS saem das partições e viram blocos
+por dispositivo e por hora (tabela reading_blocks), gravados como BLOB:
+
+- ts: delta-of-delta (intervalo regular vira uma sequência de zeros);
+- id: delta;
+- métricas: inteiros quantizados com delta quando o valor tem poucas casas decimais
+  (verificado sem perda), senão XOR com o valor anterior + byte shuffle;
+- status: dicionário + códigos de 1 byte;
+- tudo passa por zlib no final. A codificação é sem perda.
+
+Inteiros são gravados em zigzag com a menor largura (1, 2, 4 ou 8 bytes) que cabe no bloco.
+"""
+
+import json
+import struct
+import time
+import zlib
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from src.partitions import DAY_MS, create_readings_view, list_partitions
+
+BLOCK_MS = 3_600_000
+FORMAT_VERSION = 1
+FLOAT_COLUMNS = ['temperature', 'vibration', 'pressure', 'risk_score', 'power']
+
+# Casas decimais testadas para quantizar uma coluna sem perda
+_DECIMALS = (0, 1, 2, 3, 4, 6)
+
+_HEADER = struct.Struct('<BIqq')  # versão, quantidade, primeiro ts, primeiro id
+_QUANTIZED, _XOR = 0, 1
+
+
+def _zigzag(values: np.ndarray) -> np.ndarray:
+    values = values.astype(np.int64)
+    return ((values << 1) ^ (values >> 63)).astype(np.uint64)
+
+
+def _unzigzag(values: np.ndarray) -> np.ndarray:
+    values = values.astype(np.uint64)
+    return ((values >> np.uint64(1)).astype(np.int64) ^ -(values & np.uint64(1)).astype(np.int64))
+
+
+def _pack_ints(values: np.ndarray) -> bytes:
+    z = _zigzag(values)
+    top = int(z.max()) if len(z) else 0
+    width = 1 if top < 1 << 8 else 2 if top < 1 << 16 else 4 if top < 1 << 32 else 8
+    return bytes([width]) + z.astype(f'<u{width}').tobytes()
+
+
+def _unpack_ints(data: bytes) -> np.ndarray:
+    return _unzigzag(np.frombuffer(data, dtype=f'<u{data[0]}', offset=1))
+
+
+def _encode_floats(values: np.ndarray) -> bytes:
+    nulls = np.isnan(values)
+    out = bytearray()
+    if nulls.any():
+        out += b'\x01' + np.packbits(nulls).tobytes()
+        values = np.where(nulls, 0.0, values)
+    else:
+        out += b'\x00'
+
+    # Inteiros não guardam -0.0: nesse caso só o XOR é sem perda
+    quantizable = not np.any(np.signbit(values) & (values == 0))
+    for decimals in _DECIMALS if quantizable else ():
+        scaled = np.round(values * 10 ** decimals)
+        if np.all(np.abs(scaled) < 2 ** 53) and np.array_equal(scaled / 10 ** decimals, values):
+            ints = scaled.astype(np.int64)
+            out += bytes([_QUANTIZED, decimals]) + _pack_ints(np.diff(ints, prepend=0))
+            return bytes(out)
+
+    bits = values.view(np.uint64)
+    xored = bits ^ np.concatenate(([np.uint64(0)], bits[:-1]))
+    # Byte shuffle: agrupa os bytes de mesma posição (os mais significativos repetem muito)
+    out += bytes([_XOR]) + xored.astype('<u8').view(np.uint8).reshape(-1, 8).T.tobytes()
+    return bytes(out)
+
+
+def _decode_floats(data: bytes, count: int) -> np.ndarray:
+    offset = 1
+    nulls = None
+    if data[0]:
+        mask_len = (count + 7) // 8
+        nulls = np.unpackbits(np.frombuffer(data, np.uint8, mask_len, offset), count=count).astype(bool)
+        offset += mask_len
+
+    kind = data[offset]
+    if kind == _QUANTIZED:
+        decimals = data[offset + 1]
+        ints = np.cumsum(_unpack_ints(data[offset + 2:]))
+        values = ints / 10 ** decimals
+    else:
+        shuffled = np.frombuffer(data, np.uint8, count * 8, offset + 1).reshape(8, count)
+        xored = np.ascontiguousarray(shuffled.T).view('<u8').ravel()
+        values = np.bitwise_xor.accumulate(xored).view(np.float64)
+
+    if nulls is not None:
+        values = np.where(nulls, np.nan, values)
+    return values
+
+
+def encode_block(columns: Dict[str, np.ndarray]) -> bytes:
+    """
+    Encode one device-hour. columns: 'id', 'ts' (int64, sorted by ts), the FLOAT_COLUMNS
+    (float64, NaN for NULL) and 'status' (sequence of str/None).
+    """
+    ts = np.asarray(columns['ts'], dtype=np.int64)
+    ids = np.asarray(columns['id'], dtype=np.int64)
+    count = len(ts)
+
+    sections = [
+        _pack_ints(np.diff(np.diff(ts), prepend=0)),
+        _pack_ints(np.diff(ids)),
+    ]
+    for name in FLOAT_COLUMNS:
+        sections.append(_encode_floats(np.asarray(columns[name], dtype=np.float64)))
+
+    index = {}
+    codes = bytes(index.setdefault(s, len(index)) for s in columns['status'])
+    sections.append(json.dumps(list(index)).encode())
+    sections.append(codes)
+
+    payload = bytearray(_HEADER.pack(FORMAT_VERSION, count, int(ts[0]), int(ids[0])))
+    for section in sections:
+        payload += struct.pack('<I', len(section)) + section
+    return zlib.compress(bytes(payload), 6)
+
+
+def decode_block(blob: bytes) -> Dict[str, np.ndarray]:
+    """Inverse of encode_block: dict of NumPy columns (status as an object array)."""
+    payload = zlib.decompress(blob)
+    version, count, ts0, id0 = _HEADER.unpack_from(payload)
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Versão de bloco desconhecida: {version}")
+
+    sections = []
+    offset = _HEADER.size
+    while offset < len(payload):
+        (length,) = struct.unpack_from('<I', payload, offset)
+        offset += 4
+        sections.append(payload[offset:offset + length])
+        offset += length
+
+    deltas = np.cumsum(_unpack_ints(sections[0]))
+    columns = {
+        'ts': ts0 + np.concatenate(([0], np.cumsum(deltas))).astype(np.int64),
+        'id': id0 + np.concatenate(([0], np.cumsum(_unpack_ints(sections[1])))).astype(np.int64),
+    }
+    for i, name in enumerate(FLOAT_COLUMNS):
+        columns[name] = _decode_floats(sections[2 + i], count)
+    names = json.loads(sections[2 + len(FLOAT_COLUMNS)])
+    codes = np.frombuffer(sections[3 + len(FLOAT_COLUMNS)], dtype=np.uint8)
+    columns['status'] = np.array(names, dtype=object)[codes] if count else np.empty(0, dtype=object)
+    return columns
+
+
+def _merge(old: Dict[str, np.ndarray], new: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    merged = {name: np.concatenate((old[name], new[name])) for name in new}
+    order = np.argsort(merged['ts'], kind='stable')
+    return {name: values[order] for name, values in merged.items()}
+
+
+def create_blocks_table(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS reading_blocks (
+            device_id TEXT NOT NULL,
+            bucket_ts INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            data BLOB NOT NULL,
+            PRIMARY KEY (device_id, bucket_ts)
+        )
+    ''')
+
+
+class ColdStorage:
+    """
+    Move partições inteiras mais antigas que after_days para reading_blocks e as apaga
+    (como a retenção). Os blocos continuam acessíveis por DatabaseManager.get_readings_window;
+    a view sensor_readings e as consultas de leituras recentes veem só as partições quentes.
+    """
+
+    def __init__(self, connect: Callable, partitions, after_days: int = 0):
+        self._connect = connect
+        self.partitions = partitions
+        self.after_days = after_days
+
+    def compact(self, now_ms: Optional[int] = None) -> List[str]:
+        """Compact every partition that ended before the cutoff. Returns the compacted tables."""
+        if not self.after_days:
+            return []
+        if now_ms is None:
+            now_ms = int(time.time() * 1000)
+        cutoff = now_ms - self.after_days * DAY_MS
+
+        conn = self._connect()
+        cold = [name for _, end, name in list_partitions(conn.cursor()) if end <= cutoff]
+        for name in cold:
+            self._compact_partition(conn, name)
+        if cold:
+            self.partitions.refresh(force=True)
+            print(f"Armazenamento frio: {len(cold)} partição(ões) compactada(s) em blocos.")
+        return cold
+
+    def _compact_partition(self, conn, table: str):
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                f"SELECT device_id, ts, id, {', '.join(FLOAT_COLUMNS)}, status FROM {table} "
+                "ORDER BY device_id, ts, id"
+            ).fetchall()
+            for (device_id, bucket_ts), columns in self._group(rows).items():
+                existing = conn.execute(
+                    "SELECT data FROM reading_blocks WHERE device_id = ? AND bucket_ts = ?", (device_id, bucket_ts)
+                ).fetchone()
+                if existing:
+                    # Leituras atrasadas para uma hora já compactada
+                    columns = _merge(decode_block(existing[0]), columns)
+                conn.execute(
+                    "INSERT OR REPLACE INTO reading_blocks (device_id, bucket_ts, count, data) VALUES (?, ?, ?, ?)",
+                    (device_id, bucket_ts, len(columns['ts']), encode_block(columns))
+                )
+            conn.execute(f"DROP TABLE IF EXISTS {table}")
+            conn.execute("DELETE FROM reading_partitions WHERE name = ?", (table,))
+            create_readings_view(conn.cursor(), [p[2] for p in list_partitions(conn.cursor())])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    @staticmethod
+    def _group(rows) -> Dict[tuple, Dict[str, np.ndarray]]:
+        groups: Dict[tuple, list] = {}
+        for row in rows:
+            groups.setdefault((row[0], row[1] - row[1] % BLOCK_MS), []).append(row)
+        result = {}
+        for key, group in groups.items():
+            cols = list(zip(*group))
+            columns = {
+                'ts': np.array(cols[1], dtype=np.int64),
+                'id': np.array(cols[2], dtype=np.int64),
+                'status': np.array(cols[-1], dtype=object),
+            }
+            for i, name in enumerate(FLOAT_COLUMNS):
+                columns[name] = np.array(cols[3 + i], dtype=np.float64)  # None -> NaN
+            result[key] = columns
+        return result
+
+    def drop_expired(self, cutoff_ms: int) -> int:
+        """Retention for cold blocks (same cutoff as the partitions)."""
+        conn = self._connect()
+        with conn:
+            return conn.execute("DELETE FROM reading_blocks WHERE bucket_ts + ? <= ?", (BLOCK_MS, cutoff_ms)).rowcount
+
+    @staticmethod
+    def read(conn, device_id: str, start_ts: int, end_ts: int) -> Dict[str, np.ndarray]:
+        """Decoded readings of a device with start_ts <= ts <= end_ts, oldest first."""
+        blobs = conn.execute(
+            "SELECT data FROM reading_blocks WHERE device_id = ? AND bucket_ts BETWEEN ? AND ? ORDER BY bucket_ts",
+            (device_id, start_ts - start_ts % BLOCK_MS, end_ts)
+        ).fetchall()
+        blocks = [decode_block(blob) for (blob,) in blobs]
+        if not blocks:
+            return {}
+        columns = {name: np.concatenate([b[name] for b in blocks]) for name in blocks[0]}
+        keep = (columns['ts'] >= start_ts) & (columns['ts'] <= end_ts)
+        return {name: values[keep] for name, values in columns.items()}
@@ -0,0 +1,94 @@
+import sys
+import os
+import tempfile
+import time
+
+sys.path.append(os.getcwd())
+
+from src.database import DatabaseManager
+from src.ingestion import validate_packet
+from src.processor import DataProcessor
+
+
+def _packet(device_id, ts, **overrides):
+    packet = {'device_id': device_id, 'ts': ts, 'temperature': 60.0, 'vibration': 2.0,
+              'pressure': 10.0, 'power': 550.0, 'status': 'running'}
+    packet.update(overrides)
+    return packet
+
+
+# (nome, pacote inválido) - cada um vai num lote junto com pacotes válidos
+NOW = int(time.time() * 1000)
+INVALID = [
+    ("ts fora da faixa de datetime", _packet("BAD-TS", 1e30)),
+    ("ts infinito", _packet("BAD-TS-INF", float('inf'))),
+    ("timestamp ISO sem ts", {k: v for k, v in _packet("BAD-ISO", None, timestamp="ontem").items() if k != 'ts'}),
+    ("temperatura maior que float", _packet("BAD-TEMP", NOW, temperature=10 ** 400)),
+    ("vibração infinita", _packet("BAD-VIB", NOW, vibration=float('inf'))),
+    ("métrica não numérica", _packet("BAD-STR", NOW, pressure="10")),
+    ("sem status", {k: v for k, v in _packet("BAD-STATUS", NOW).items() if k != 'status'}),
+]
+
+
+def check_validation():
+    failures = 0
+    for name, packet in INVALID:
+        reason = validate_packet(dict(packet))
+        print(f"[{'OK' if reason else 'FALHA'}] rejeita {name}" + (f" ({reason})" if reason else ""))
+        failures += not reason
+
+    # Inteiro grande mas representável: aceito e convertido para float (o SQLite não grava int > 2**63)
+    packet = _packet("BIG-INT", NOW, temperature=2 ** 64)
+    ok = validate_packet(packet) is None and isinstance(packet['temperature'], float)
+    print(f"[{'OK' if ok else 'FALHA'}] temperatura 2**64 normalizada para float")
+    failures += not ok
+    return failures
+
+
+def check_processor(tmp):
+    """Invalid packets never touch the processor state and never cost the valid ones their write."""
+    db = DatabaseManager(os.path.join(tmp, "packets.db"), os.path.join(tmp, "history"))
+    processor = DataProcessor(db)
+    batch = [_packet("GOOD", NOW)]
+    for i, (_, packet) in enumerate(INVALID):
+        batch += [dict(packet), _packet("GOOD", NOW + i + 1)]
+    batch.append(_packet("BIG-INT", NOW, temperature=2 ** 64))
+
+    failures = 0
+    try:
+        processed = processor.process_packets(batch)
+        written = db.flush_readings()
+    except Exception as e:
+        print(f"[FALHA] process_packets/flush levantou {type(e).__name__}: {e}")
+        db.close()
+        return 1
+
+    expected = len(INVALID) + 2
+    ok = len(processed) == expected and written == expected
+    print(f"[{'OK' if ok else 'FALHA'}] {len(processed)} pacotes processados e {written} gravados (esperado {expected})")
+    failures += not ok
+
+    touched = [packet['device_id'] for _, packet in INVALID
+               if processor.get_scores(packet['device_id']) is not None
+               or len(processor.get_window(packet['device_id'])['ts'])]
+    print(f"[{'OK' if not touched else 'FALHA'}] estado intacto para os inválidos" + (f": {touched}" if touched else ""))
+    failures += bool(touched)
+
+    stored = len(db.get_recent_readings("GOOD", 100, result='tuples'))
+    print(f"[{'OK' if stored == len(INVALID) + 1 else 'FALHA'}] {stored} leituras válidas no banco")
+    failures += stored != len(INVALID) + 1
+    db.close()
+    return failures
+
+
+def run_verification():
+    failures = check_validation()
+    with tempfile.TemporaryDirectory() as tmp:
+        failures += check_processor(tmp)
+    return failures
+
+
+if __name__ == "__main__":
+    failed = run_verification()
+    print("Validação de pacotes OK." if not failed else f"{failed} verificação(ões) falharam.")
+    sys.exit(1 if failed else 0)
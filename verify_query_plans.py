@@ -0,0 +1,65 @@
+import sys
+import os
+import tempfile
+
+sys.path.append(os.getcwd())
+
+from src.database import DatabaseManager
+from src import kpi
+
+# Partição usada nas consultas de leituras (criada pelo próprio script)
+PARTITION_TS = 1767225600000
+PARTITION = "readings_p20260101"
+
+# (nome, sql, parâmetros, índice esperado)
+HOT_QUERIES = [
+    ("get_recent_readings", DatabaseManager._RECENT_READINGS_SQL.format(table=PARTITION),
+     ("DEV-100", 20), f"idx_{PARTITION}_device_ts"),
+    ("get_readings_window", DatabaseManager._READINGS_WINDOW_SQL.format(table=PARTITION),
+     ("DEV-100", PARTITION_TS, PARTITION_TS + 3600000), f"idx_{PARTITION}_device_ts"),
+    ("get_alert_history", DatabaseManager._ALERT_HISTORY_SQL,
+     (20,), "idx_alerts_ts"),
+    ("get_alert_history(device)", DatabaseManager._ALERT_HISTORY_DEVICE_SQL,
+     ("DEV-100", 20), "idx_alerts_device_ts"),
+    ("get_active_alerts", DatabaseManager._ACTIVE_ALERTS_SQL,
+     (), "idx_alerts_resolved_ts"),
+    ("get_active_alerts(device)", DatabaseManager._ACTIVE_ALERTS_DEVICE_SQL,
+     ("DEV-100",), "idx_alerts_resolved_device_ts"),
+    ("get_kpis", kpi.TOTALS_SQL,
+     ("DEV-100", PARTITION_TS, PARTITION_TS + 86400000), "PRIMARY KEY"),
+]
+
+
+def check_plan(conn, sql, params, expected_index):
+    """Returns (ok, plan_lines). A plan is ok if it uses the index, never scans
+    the table and never sorts in a temp b-tree."""
+    rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+    plan = [row[-1] for row in rows]
+    uses_index = any(expected_index in line for line in plan)
+    full_scan = any(line.startswith("SCAN") and "INDEX" not in line for line in plan)
+    temp_sort = any("TEMP B-TREE" in line for line in plan)
+    return uses_index and not full_scan and not temp_sort, plan
+
+
+def run_verification():
+    tmp_dir = tempfile.mkdtemp()
+    db = DatabaseManager(os.path.join(tmp_dir, "plans.db"), history_path=os.path.join(tmp_dir, "history"))
+    db.partitions.table_for(PARTITION_TS)
+    conn = db._connect()
+
+    failures = 0
+    for name, sql, params, expected_index in HOT_QUERIES:
+        ok, plan = check_plan(conn, sql, params, expected_index)
+        print(f"[{'OK' if ok else 'FALHA'}] {name} -> {' | '.join(plan)}")
+        if not ok:
+            failures += 1
+            print(f"       esperado: {expected_index}")
+
+    db.close()
+    return failures
+
+
+if __name__ == "__main__":
+    failed = run_verification()
+    print("Query plans OK." if not failed else f"{failed} consulta(s) sem índice.")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,136 @@
+import sys
+import os
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+sys.path.append(os.getcwd())
+
+from src.database import DatabaseManager
+from src.partitions import DAY_MS, list_partitions
+from src.tsblock import FLOAT_COLUMNS, decode_block, encode_block
+
+HOUR_MS = 3_600_000
+
+
+def _block(ts, ids, floats, status):
+    columns = {'ts': np.array(ts, dtype=np.int64), 'id': np.array(ids, dtype=np.int64),
+               'status': np.array(status, dtype=object)}
+    for name in FLOAT_COLUMNS:
+        columns[name] = np.array(floats(name, len(ts)), dtype=np.float64)  # None -> NaN
+    return columns
+
+
+def codec_cases():
+    """(nome, colunas) cobrindo os dois modos de float, NULL/NaN e timestamps fora de ordem."""
+    rng = np.random.default_rng(7)
+    base = 1767225600000
+    regular = [base + i * 1000 for i in range(120)]
+    yield "intervalo regular, 1 casa decimal", _block(
+        regular, range(1, 121),
+        lambda name, n: np.round(rng.normal(50, 5, n), 1), ['running'] * 100 + ['parado'] * 20)
+    yield "floats sem quantização (XOR)", _block(
+        regular, range(1, 121),
+        lambda name, n: rng.normal(50, 5, n), ['running'] * 120)
+
+    def with_nulls(name, n):
+        values = list(np.round(rng.normal(5, 1, n), 2))
+        values[0] = None
+        values[3] = float('nan')
+        if name == 'risk_score':
+            values = [None] * n  # Coluna inteira nula
+        return values
+    yield "None, NaN e coluna toda nula", _block(
+        regular[:10], range(10, 20), with_nulls, ['running', None, 'parado', None] + ['running'] * 6)
+
+    shuffled = [base + 5000, base + 1000, base + 9000, base + 1000, base + 3, base + 86_000, base]
+    yield "timestamps fora de ordem e ids com saltos", _block(
+        shuffled, [7, 3, 9_000_000, 2, 1, 40, 5],
+        lambda name, n: [1.5, -2.25, None, 1e12, float('nan'), 0.0, -0.0], ['a', 'b', 'a', None, 'c', 'b', 'a'])
+    yield "uma leitura", _block([base], [1], lambda name, n: [42.0], ['running'])
+
+
+def _same(a, b):
+    if a.dtype == object:
+        return list(a) == list(b)
+    if a.dtype.kind == 'f':
+        # Bit a bit: distingue -0.0 de 0.0 e compara NaN na mesma posição
+        return a.shape == b.shape and np.array_equal(a.view(np.int64), b.view(np.int64))
+    return np.array_equal(a, b)
+
+
+def check_codec():
+    failures = 0
+    for name, columns in codec_cases():
+        decoded = decode_block(encode_block(columns))
+        bad = [c for c in columns if not _same(np.asarray(columns[c]), decoded[c])]
+        print(f"[{'FALHA' if bad else 'OK'}] codec: {name}" + (f" -> colunas diferentes: {bad}" if bad else ""))
+        failures += bool(bad)
+    return failures
+
+
+def _reading(device_id, ts, i):
+    return {
+        'device_id': device_id, 'ts': ts,
+        'temperature': None if i % 7 == 0 else 60 + (i % 13) * 0.1,
+        'vibration': float('nan') if i % 11 == 0 else 2 + (i % 5) * 0.25,
+        'pressure': 10.0, 'status': None if i % 17 == 0 else ('parado' if i % 9 == 0 else 'running'),
+        'risk_score': i / 1000, 'power': 550 + i,
+    }
+
+
+def _window(db, device_id, center_ms):
+    target = datetime.fromtimestamp(center_ms / 1000).strftime("%d/%m/%Y %H:%M")
+    rows = db.get_readings_window(device_id, target, window_minutes=180, result='tuples')
+    return sorted(rows, key=lambda row: (row[-1], row[0]))  # (ts, id)
+
+
+def check_database(tmp):
+    """Partição -> blocos -> get_readings_window devolve as mesmas linhas; rollover compacta sozinho."""
+    failures = 0
+    db = DatabaseManager(os.path.join(tmp, "tsblock.db"), os.path.join(tmp, "history"))
+    now = int(time.time() * 1000)
+    old = now - 3 * DAY_MS
+    old -= old % HOUR_MS
+
+    # Leituras antigas fora de ordem, com métricas nulas/NaN, em dois dispositivos
+    order = np.random.default_rng(3).permutation(400)
+    db.save_readings_batch([_reading(f"DEV-{i % 2}", old + int(i) * 30_000, int(i)) for i in order])
+    center = old + 100 * 30_000
+    before = {d: _window(db, d, center) for d in ("DEV-0", "DEV-1")}
+
+    db.cold_storage.after_days = 1
+    compacted = db.compact_cold_readings(now)
+    after = {d: _window(db, d, center) for d in ("DEV-0", "DEV-1")}
+    same = compacted and all(before[d] == after[d] and before[d] for d in before)
+    print(f"[{'OK' if same else 'FALHA'}] banco: {len(compacted)} partição(ões) compactada(s), "
+          f"{sum(len(r) for r in after.values())} leituras iguais às originais")
+    failures += not same
+
+    # Leitura atrasada para a hora já compactada: cria a partição antiga de novo (rollover)
+    # e é mesclada no bloco depois do commit
+    late = _reading("DEV-0", old + 45_123, 1)
+    db.save_reading(late)
+    merged = _window(db, "DEV-0", center)
+    partitions = [name for _, end, name in list_partitions(db._connect().cursor()) if end <= now - DAY_MS]
+    ok = len(merged) == len(before["DEV-0"]) + 1 and late['ts'] in [row[-1] for row in merged] and not partitions
+    print(f"[{'OK' if ok else 'FALHA'}] rollover: leitura atrasada mesclada no bloco, partições frias: {partitions}")
+    failures += not ok
+
+    db.close()
+    return failures
+
+
+def run_verification():
+    failures = check_codec()
+    with tempfile.TemporaryDirectory() as tmp:
+        failures += check_database(tmp)
+    return failures
+
+
+if __name__ == "__main__":
+    failed = run_verification()
+    print("TSBlock OK." if not failed else f"{failed} verificação(ões) falharam.")
+    sys.exit(1 if failed else 0)